@@ -0,0 +1,527 @@
+"""Indexed catalog of experiment data files.
+
+Scans data directories for .mpr files and records their metadata (technique,
+channel, start date, number of records, columns, and originating .mps
+settings) in an embedded SQLite index. Scans are incremental: files whose
+modification time and size are unchanged are not re-read. Queries run
+against the index, such that finding files across large campaigns does not
+require opening them.
+
+Example::
+
+    from biocom.catalog import DataCatalog
+
+    catalog = DataCatalog("campaign.sqlite")
+    catalog.scan(["D:/data/2024", "D:/data/2025"])
+    catalog.set_tags("D:/data/2024/cell3/PEIS_C03.mpr", temperature=25)
+
+    files = catalog.query(technique="PEIS", channel=3,
+                          start_after="2024-06-01", tags={"temperature": 25})
+    for file, mpr in catalog.load(technique="PEIS", channel=3):
+        ...
+"""
+
+import sqlite3
+import json
+import os
+import re
+import csv
+import warnings
+from datetime import date, datetime
+from pathlib import Path, PurePath
+from typing import Union, Optional, List, Dict, Iterator, Tuple
+
+from galvani.BioLogic import MPRfile
+
+from .mpr import read_mpr, read_mpr_layout, MPRLayout
+
+
+FilePath = Union[str, Path]
+DateLike = Union[str, date, datetime]
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL,
+    technique TEXT,
+    technique_id INTEGER,
+    channel INTEGER,
+    start_date TEXT,
+    npts INTEGER,
+    mps_file TEXT,
+    mps_techniques TEXT,
+    mps_settings TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_files_technique ON files (technique, channel, start_date);
+CREATE INDEX IF NOT EXISTS idx_files_channel ON files (channel, start_date);
+CREATE INDEX IF NOT EXISTS idx_files_start_date ON files (start_date);
+CREATE INDEX IF NOT EXISTS idx_files_directory ON files (directory);
+
+CREATE TABLE IF NOT EXISTS columns (
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    PRIMARY KEY (file_id, name)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_columns_name ON columns (name, file_id);
+
+CREATE TABLE IF NOT EXISTS tags (
+    file_id INTEGER NOT NULL REFERENCES files (id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    value TEXT,
+    PRIMARY KEY (file_id, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_tags_key_value ON tags (key, value, file_id);
+"""
+
+
+def _load_technique_codes() -> Dict[int, str]:
+    # Map EC-Lab technique IDs to technique codes (e.g. 29 -> 'PEIS')
+    code_file = Path(__file__).parent.joinpath("mps", "techniques", "technique_codes.csv")
+    codes = {}
+    if code_file.exists():
+        with open(code_file, "r") as f:
+            for row in csv.DictReader(f):
+                codes[int(row["ID"])] = row["Code"]
+    return codes
+
+
+_technique_codes = _load_technique_codes()
+
+# EC-Lab data file names: {settings name}_{technique index}_{technique code}_C{channel}.mpr
+# Single-technique files omit the technique index and code
+_channel_pattern = re.compile(r"_C(\d+)$")
+_technique_pattern = re.compile(r"_(\d+)_([A-Za-z][A-Za-z0-9]*)$")
+
+
+def parse_data_filename(file: FilePath) -> Tuple[str, Optional[str], Optional[int]]:
+    """Parse an EC-Lab data file name into its components.
+
+    :param file: Path to .mpr file
+    :type file: str or Path
+    :return: Tuple of (settings file stem, technique code, channel).
+        Technique code and channel are None if not present in the name
+    :rtype: Tuple[str, Optional[str], Optional[int]]
+    """
+    stem = Path(file).stem
+    channel = None
+    technique = None
+
+    match = _channel_pattern.search(stem)
+    if match is not None:
+        channel = int(match.group(1))
+        stem = stem[:match.start()]
+
+    match = _technique_pattern.search(stem)
+    if match is not None:
+        technique = match.group(2)
+        stem = stem[:match.start()]
+
+    return stem, technique, channel
+
+
+def get_file_metadata(file: FilePath, layout: Optional[MPRLayout] = None) -> dict:
+    """Get the technique, channel, and start date of an EC-Lab data file.
+
+    The technique and channel are taken from the file name where available.
+    Otherwise, the technique is determined from the technique ID in the
+    file header.
+
+    :param file: Path to .mpr file
+    :type file: str or Path
+    :param layout: Layout of the file. If None, read from the file. Defaults to None
+    :type layout: MPRLayout, optional
+    :return: Dict with keys 'technique', 'channel', 'start_date', and 'mps_stem'
+    :rtype: dict
+    """
+    if layout is None:
+        layout = read_mpr_layout(file)
+    mps_stem, technique, channel = parse_data_filename(file)
+    if technique is None:
+        technique = _technique_codes.get(layout.technique_id)
+
+    return {
+        "technique": technique,
+        "channel": channel,
+        "start_date": layout.startdate,
+        "mps_stem": mps_stem,
+    }
+
+
+def read_mps_summary(mps_file: FilePath) -> Tuple[Dict[str, str], List[str]]:
+    """Read the header fields and technique names from an .mps settings file.
+
+    :param mps_file: Path to .mps file
+    :type mps_file: str or Path
+    :return: Tuple of (dict of header fields, list of technique names)
+    :rtype: Tuple[Dict[str, str], List[str]]
+    """
+    with open(mps_file, "r", errors="replace") as f:
+        lines = f.read().split("\n")
+
+    header = {}
+    techniques = []
+    in_header = True
+    for i, line in enumerate(lines):
+        if line.startswith("Technique : "):
+            # Technique name is on the following line
+            in_header = False
+            if i + 1 < len(lines):
+                techniques.append(lines[i + 1].strip())
+        elif in_header and " : " in line:
+            key, value = line.split(" : ", 1)
+            header[key.strip()] = value.strip()
+
+    return header, techniques
+
+
+def _to_date_str(value: DateLike) -> str:
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return value.isoformat()
+    # Validate string dates
+    return date.fromisoformat(str(value)).isoformat()
+
+
+class DataCatalog(object):
+    """SQLite-backed index of .mpr data files.
+
+    :param db_file: Path to SQLite database file. Use ':memory:' for a
+        temporary in-memory catalog. Defaults to ':memory:'
+    :type db_file: str or Path
+    """
+    def __init__(self, db_file: FilePath = ":memory:"):
+        self.db_file = db_file
+        self._conn = sqlite3.connect(str(db_file))
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        """Close the database connection."""
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    # ----------
+    # Indexing
+    # ----------
+    def _read_file_record(self, file: Path, stat: os.stat_result) -> Tuple[dict, List[str]]:
+        # Read metadata from file headers only
+        layout = read_mpr_layout(file)
+        file_meta = get_file_metadata(file, layout)
+
+        mps_file = file.parent.joinpath(file_meta["mps_stem"] + ".mps")
+        if mps_file.exists():
+            mps_header, mps_techniques = read_mps_summary(mps_file)
+            mps_file = str(mps_file)
+            mps_settings = json.dumps(mps_header)
+            mps_techniques = json.dumps(mps_techniques)
+        else:
+            mps_file = mps_settings = mps_techniques = None
+
+        record = {
+            "path": str(file),
+            "directory": str(file.parent),
+            "name": file.name,
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "technique": file_meta["technique"],
+            "technique_id": layout.technique_id,
+            "channel": file_meta["channel"],
+            "start_date": None if layout.startdate is None else layout.startdate.isoformat(),
+            "npts": layout.npts,
+            "mps_file": mps_file,
+            "mps_techniques": mps_techniques,
+            "mps_settings": mps_settings,
+        }
+        return record, layout.fieldnames
+
+    def _upsert(self, record: dict, columns: List[str]):
+        keys = list(record.keys())
+        updates = ", ".join(f"{k} = excluded.{k}" for k in keys if k != "path")
+        self._conn.execute(
+            f"INSERT INTO files ({', '.join(keys)}) VALUES ({', '.join('?' * len(keys))}) "
+            f"ON CONFLICT (path) DO UPDATE SET {updates}",
+            [record[k] for k in keys]
+        )
+        file_id = self._conn.execute("SELECT id FROM files WHERE path = ?", (record["path"],)).fetchone()[0]
+        self._conn.execute("DELETE FROM columns WHERE file_id = ?", (file_id,))
+        self._conn.executemany("INSERT INTO columns (file_id, name) VALUES (?, ?)",
+                               [(file_id, c) for c in columns])
+
+    def add_file(self, file: FilePath, force: bool = False) -> bool:
+        """Add or update a single file in the catalog.
+
+        :param file: Path to .mpr file
+        :type file: str or Path
+        :param bool force: If True, re-read the file even if its modification
+            time and size are unchanged. Defaults to False
+        :return: True if the file was (re-)indexed, False if unchanged
+        :rtype: bool
+        """
+        file = Path(file).resolve()
+        stat = file.stat()
+        if not force:
+            row = self._conn.execute("SELECT mtime, size FROM files WHERE path = ?", (str(file),)).fetchone()
+            if row is not None and row[0] == stat.st_mtime and row[1] == stat.st_size:
+                return False
+
+        record, columns = self._read_file_record(file, stat)
+        with self._conn:
+            self._upsert(record, columns)
+        return True
+
+    def scan(
+            self,
+            directories: Union[FilePath, List[FilePath]],
+            pattern: str = "*.mpr",
+            recursive: bool = True,
+            remove_missing: bool = True,
+            errors: str = "warn") -> Dict[str, int]:
+        """Scan directories and incrementally update the catalog.
+
+        Only new files and files whose modification time or size has changed
+        are read.
+
+        :param directories: Directory or list of directories to scan
+        :type directories: str, Path, or list
+        :param str pattern: Glob pattern for data files. Defaults to '*.mpr'
+        :param bool recursive: If True, scan subdirectories. Defaults to True
+        :param bool remove_missing: If True, remove catalog entries for files
+            in the scanned directories that match pattern and no longer exist.
+            Defaults to True
+        :param str errors: How to handle files that cannot be read: 'warn',
+            'ignore', or 'raise'. Defaults to 'warn'
+        :return: Dict with the number of 'added', 'updated', 'unchanged',
+            'removed', and 'failed' files
+        :rtype: Dict[str, int]
+        """
+        if isinstance(directories, (str, Path)):
+            directories = [directories]
+
+        if errors not in ("warn", "ignore", "raise"):
+            raise ValueError(f"Invalid errors argument {errors}. Options: 'warn', 'ignore', 'raise'")
+
+        counts = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0, "failed": 0}
+
+        for directory in directories:
+            directory = Path(directory).resolve()
+
+            # Load existing (mtime, size) for the directory in one query
+            sql, params = self._build_query("f.path, f.mtime, f.size", directory=directory)
+            if not recursive:
+                sql, params = "SELECT path, mtime, size FROM files WHERE directory = ?", [str(directory)]
+            existing = {row[0]: (row[1], row[2]) for row in self._conn.execute(sql, params)}
+
+            files = directory.rglob(pattern) if recursive else directory.glob(pattern)
+            found = set()
+            with self._conn:
+                for file in files:
+                    # Key on resolved paths, as in add_file and remove
+                    file = file.resolve()
+                    path = str(file)
+                    if path in found:
+                        # Symlink to a file that was already scanned
+                        continue
+                    found.add(path)
+                    try:
+                        stat = file.stat()
+                        if path in existing:
+                            prev = existing[path]
+                        else:
+                            # Symlinks may resolve to files outside the directory
+                            prev = self._conn.execute("SELECT mtime, size FROM files WHERE path = ?",
+                                                      (path,)).fetchone()
+                        if prev is not None and tuple(prev) == (stat.st_mtime, stat.st_size):
+                            counts["unchanged"] += 1
+                            continue
+                        record, columns = self._read_file_record(file, stat)
+                    except Exception as err:
+                        if errors == "raise":
+                            raise
+                        elif errors == "warn":
+                            warnings.warn(f"Could not index {file}: {err}")
+                        counts["failed"] += 1
+                        continue
+
+                    self._upsert(record, columns)
+                    counts["added" if prev is None else "updated"] += 1
+
+                if remove_missing:
+                    # Only remove files covered by this scan's pattern that no longer exist
+                    missing = [(p,) for p in existing.keys()
+                               if p not in found and PurePath(p).match(pattern) and not os.path.exists(p)]
+                    self._conn.executemany("DELETE FROM files WHERE path = ?", missing)
+                    counts["removed"] += len(missing)
+
+        return counts
+
+    def remove(self, file: FilePath):
+        """Remove a file from the catalog.
+
+        :param file: Path to .mpr file
+        :type file: str or Path
+        """
+        with self._conn:
+            self._conn.execute("DELETE FROM files WHERE path = ?", (str(Path(file).resolve()),))
+
+    def set_tags(self, file: FilePath, **tags):
+        """Attach user metadata (e.g. temperature) to a catalogued file.
+
+        Tag values are stored as strings and matched as strings in queries.
+
+        :param file: Path to .mpr file
+        :type file: str or Path
+        :param tags: Tag names and values
+        :raises KeyError: If the file is not in the catalog
+        """
+        row = self._conn.execute("SELECT id FROM files WHERE path = ?", (str(Path(file).resolve()),)).fetchone()
+        if row is None:
+            raise KeyError(f"File {file} is not in the catalog")
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO tags (file_id, key, value) VALUES (?, ?, ?) "
+                "ON CONFLICT (file_id, key) DO UPDATE SET value = excluded.value",
+                [(row[0], k, str(v)) for k, v in tags.items()]
+            )
+
+    # ----------
+    # Queries
+    # ----------
+    def _build_query(
+            self,
+            select: str,
+            technique: Optional[Union[str, List[str]]] = None,
+            channel: Optional[Union[int, List[int]]] = None,
+            start_after: Optional[DateLike] = None,
+            start_before: Optional[DateLike] = None,
+            min_records: Optional[int] = None,
+            columns: Optional[List[str]] = None,
+            directory: Optional[FilePath] = None,
+            name_like: Optional[str] = None,
+            tags: Optional[dict] = None,
+            limit: Optional[int] = None):
+        where = []
+        params = []
+
+        def add_in(field, values):
+            if isinstance(values, (str, int)):
+                values = [values]
+            where.append(f"{field} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+
+        if technique is not None:
+            add_in("f.technique", technique)
+        if channel is not None:
+            add_in("f.channel", channel)
+        if start_after is not None:
+            where.append("f.start_date >= ?")
+            params.append(_to_date_str(start_after))
+        if start_before is not None:
+            where.append("f.start_date <= ?")
+            params.append(_to_date_str(start_before))
+        if min_records is not None:
+            where.append("f.npts >= ?")
+            params.append(min_records)
+        if directory is not None:
+            prefix = str(Path(directory).resolve())
+            where.append("(f.directory = ? OR f.directory LIKE ? ESCAPE '\\')")
+            params.extend([prefix, _escape_like(prefix) + os.sep.replace("\\", "\\\\") + "%"])
+        if name_like is not None:
+            where.append("f.name LIKE ?")
+            params.append(name_like)
+        for col in (columns or []):
+            where.append("EXISTS (SELECT 1 FROM columns c WHERE c.name = ? AND c.file_id = f.id)")
+            params.append(col)
+        for key, value in (tags or {}).items():
+            where.append("EXISTS (SELECT 1 FROM tags t WHERE t.key = ? AND t.value = ? AND t.file_id = f.id)")
+            params.extend([key, str(value)])
+
+        sql = f"SELECT {select} FROM files f"
+        if len(where) > 0:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY f.start_date, f.path"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        return sql, params
+
+    def query(self, **filters) -> List[Path]:
+        """Find catalogued files matching the given filters.
+
+        :param technique: Technique code(s), e.g. 'PEIS' or ['CA', 'CP']
+        :type technique: str or List[str], optional
+        :param channel: Channel number(s)
+        :type channel: int or List[int], optional
+        :param start_after: Earliest start date (inclusive)
+        :type start_after: str, date, or datetime, optional
+        :param start_before: Latest start date (inclusive)
+        :type start_before: str, date, or datetime, optional
+        :param int min_records: Minimum number of records
+        :param columns: Columns that must be present in the file
+        :type columns: List[str], optional
+        :param directory: Only include files in this directory or its
+            subdirectories
+        :type directory: str or Path, optional
+        :param str name_like: SQL LIKE pattern for the file name
+        :param dict tags: Tag values that must match (see set_tags)
+        :param int limit: Maximum number of files to return
+        :return: List of matching file paths, ordered by start date
+        :rtype: List[Path]
+        """
+        sql, params = self._build_query("f.path", **filters)
+        return [Path(row[0]) for row in self._conn.execute(sql, params)]
+
+    def query_records(self, **filters) -> List[dict]:
+        """Get the catalog records of files matching the given filters.
+
+        Takes the same filters as query.
+
+        :return: List of dicts containing the indexed metadata for each file
+        :rtype: List[dict]
+        """
+        sql, params = self._build_query("f.*", **filters)
+        cursor = self._conn.execute(sql, params)
+        keys = [d[0] for d in cursor.description]
+        records = []
+        for row in cursor:
+            record = dict(zip(keys, row))
+            for key in ("mps_settings", "mps_techniques"):
+                if record[key] is not None:
+                    record[key] = json.loads(record[key])
+            record["columns"] = [r[0] for r in self._conn.execute(
+                "SELECT name FROM columns WHERE file_id = ?", (record["id"],))]
+            records.append(record)
+        return records
+
+    def load(self, unscale: bool = False, **filters) -> Iterator[Tuple[Path, MPRfile]]:
+        """Load files matching the given filters with read_mpr.
+
+        Takes the same filters as query. Files are loaded one at a time.
+
+        :param bool unscale: If True, convert all scaled units to base units.
+            Defaults to False
+        :return: Iterator of (path, MPRfile) tuples
+        :rtype: Iterator[Tuple[Path, MPRfile]]
+        """
+        for file in self.query(**filters):
+            yield file, read_mpr(file, unscale=unscale)
+
+
+def _escape_like(text: str) -> str:
+    # Escape LIKE wildcards for prefix matching
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
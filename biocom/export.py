@@ -0,0 +1,330 @@
+"""Columnar (Arrow/Parquet) export of .mpr data.
+
+Converts .mpr data to Arrow tables and partitioned columnar datasets that
+can be queried out of core, e.g. with pyarrow.dataset, DuckDB, or Polars.
+Column units are parsed from the field names and stored as field metadata,
+integer-valued counters are stored as integers, and per-file metadata
+(source file, technique, channel, start date) are stored as
+dictionary-encoded columns.
+
+Requires the optional pyarrow package.
+"""
+
+import hashlib
+import numpy as np
+from numpy import ndarray
+from pathlib import Path
+from typing import Union, Optional, List, Dict
+from galvani.BioLogic import VMPdata_colID_dtype_map
+
+from .mpr import read_mpr_layout, iter_mpr_chunks, split_fieldname, unscale_fieldname, _resolve_columns
+from .catalog import get_file_metadata
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    _arrow_available = True
+except ModuleNotFoundError:
+    _arrow_available = False
+
+
+FilePath = Union[str, Path]
+
+# Fields that galvani reads as floats but only hold integer values
+INTEGER_FIELDS = ["cycle number", "I Range", "Ns", "half cycle", "z cycle", "counter inc."]
+
+# Fields that require float64 precision regardless of how they are stored
+FLOAT64_FIELDS = ["time/s", "step time/s"]
+
+
+def _vmp_float32_fields():
+    # Fields that the instrument records as float32, by raw and unscaled name. Names that
+    # are recorded as float64 by any column ID are excluded
+    dtypes = {}
+    for name, dtype in VMPdata_colID_dtype_map.values():
+        for n in (name, unscale_fieldname(name)):
+            dtypes.setdefault(n, set()).add(np.dtype(dtype))
+    return {n for n, d in dtypes.items() if d == {np.dtype(np.float32)} and n not in FLOAT64_FIELDS}
+
+
+# Fields stored as float32 by default, following the instrument resolution
+FLOAT32_FIELDS = _vmp_float32_fields()
+
+# Per-file metadata columns
+METADATA_FIELDS = ["source", "technique", "channel", "start_date"]
+
+
+def _check_arrow():
+    if not _arrow_available:
+        raise RuntimeError("pyarrow must be installed to export data to Arrow")
+
+
+def _metadata_types():
+    return {
+        "source": pa.string(),
+        "technique": pa.string(),
+        "channel": pa.int32(),
+        "start_date": pa.date32(),
+    }
+
+
+def arrow_field(fieldname: str, dtype: np.dtype, float32_columns: Optional[List[str]] = None):
+    """Get the Arrow field for a column of .mpr data.
+
+    Integer-valued counters (see INTEGER_FIELDS) are stored as int32. By
+    default, float columns that the instrument records as float32 (see
+    FLOAT32_FIELDS) are stored as float32, also if they have been converted
+    to float64 in memory, while time columns (see FLOAT64_FIELDS) are kept
+    as float64. Other float columns keep their dtype. Columns in
+    float32_columns are stored as float32 regardless of these defaults
+    (including time columns). The unit is stored in the field metadata.
+
+    :param str fieldname: Field name, formatted as 'name/unit'
+    :param np.dtype dtype: Dtype of the column
+    :param float32_columns: Additional columns to store as float32.
+        Defaults to None
+    :type float32_columns: List[str], optional
+    :return: Arrow field
+    :rtype: pyarrow.Field
+    """
+    _check_arrow()
+    dtype = np.dtype(dtype)
+    if fieldname in INTEGER_FIELDS:
+        arrow_type = pa.int32()
+    elif np.issubdtype(dtype, np.floating):
+        if float32_columns is not None and fieldname in float32_columns:
+            use_float32 = True
+        else:
+            use_float32 = (fieldname in FLOAT32_FIELDS or dtype == np.float32) and fieldname not in FLOAT64_FIELDS
+        arrow_type = pa.float32() if use_float32 else pa.float64()
+    else:
+        arrow_type = pa.from_numpy_dtype(dtype)
+
+    name, unit = split_fieldname(fieldname)
+    metadata = {"name": name}
+    if unit is not None:
+        metadata["unit"] = unit
+
+    return pa.field(fieldname, arrow_type, metadata=metadata)
+
+
+def mpr_arrow_schema(
+        dtype: np.dtype,
+        float32_columns: Optional[List[str]] = None,
+        metadata_fields: Optional[List[str]] = None):
+    """Get the Arrow schema for .mpr data with the given record dtype.
+
+    :param np.dtype dtype: Record dtype of the data (after any unscaling)
+    :param float32_columns: Additional columns to store as float32 (see
+        arrow_field). Defaults to None
+    :type float32_columns: List[str], optional
+    :param metadata_fields: Per-file metadata columns to include (see
+        METADATA_FIELDS). Defaults to None
+    :type metadata_fields: List[str], optional
+    :return: Arrow schema
+    :rtype: pyarrow.Schema
+    """
+    _check_arrow()
+    fields = [arrow_field(name, dtype[name], float32_columns) for name in dtype.names]
+    if metadata_fields is not None:
+        types = _metadata_types()
+        fields += [pa.field(f, pa.dictionary(pa.int32(), types[f])) for f in metadata_fields]
+    return pa.schema(fields)
+
+
+def _constant_dictionary_array(value, length: int, value_type):
+    # Dictionary-encode a constant value: a single dictionary entry and zero indices
+    indices = pa.array(np.zeros(length, dtype=np.int32))
+    if value is None:
+        indices = pa.nulls(length, pa.int32())
+    return pa.DictionaryArray.from_arrays(indices, pa.array([value], type=value_type))
+
+
+def to_record_batch(data: ndarray, schema, metadata: Optional[Dict] = None):
+    """Convert a structured array of .mpr data to an Arrow RecordBatch.
+
+    :param ndarray data: Structured data array (e.g. MPRfile.data or a chunk
+        from iter_mpr_chunks)
+    :param schema: Target schema from mpr_arrow_schema
+    :type schema: pyarrow.Schema
+    :param metadata: Values of the per-file metadata columns in schema
+    :type metadata: dict, optional
+    :return: Arrow RecordBatch
+    :rtype: pyarrow.RecordBatch
+    """
+    _check_arrow()
+    columns = []
+    for field in schema:
+        if field.name in data.dtype.names:
+            values = data[field.name]
+            if pa.types.is_integer(field.type) or pa.types.is_floating(field.type):
+                values = values.astype(field.type.to_pandas_dtype(), copy=False)
+            columns.append(pa.array(values, type=field.type))
+        else:
+            columns.append(_constant_dictionary_array(
+                metadata.get(field.name), len(data), field.type.value_type
+            ))
+    return pa.RecordBatch.from_arrays(columns, schema=schema)
+
+
+def mpr_to_arrow(
+        file: FilePath,
+        unscale: bool = True,
+        columns: Optional[List[str]] = None,
+        float32_columns: Optional[List[str]] = None,
+        include_metadata: bool = True,
+        chunk_size: int = 1000000):
+    """Read a .mpr file into an Arrow table.
+
+    :param file: Path to the .mpr file
+    :type file: str or Path
+    :param bool unscale: If True, convert all scaled units (e.g., mA, mV)
+        to base units (A, V). Defaults to True
+    :param columns: Columns to read. If None, read all columns. Defaults to None
+    :type columns: List[str], optional
+    :param float32_columns: Additional columns to store as float32 (see
+        arrow_field). Defaults to None
+    :type float32_columns: List[str], optional
+    :param bool include_metadata: If True, add dictionary-encoded source,
+        technique, channel, and start_date columns. Defaults to True
+    :param int chunk_size: Number of records to convert at a time.
+        Defaults to 1000000
+    :return: Arrow table
+    :rtype: pyarrow.Table
+    """
+    _check_arrow()
+    file = Path(file)
+    layout = read_mpr_layout(file)
+    schema, metadata = _file_schema(file, layout, unscale, columns, float32_columns, include_metadata)
+    batches = [to_record_batch(chunk, schema, metadata)
+               for chunk in iter_mpr_chunks(layout, chunk_size=chunk_size, unscale=unscale, columns=columns)]
+    return pa.Table.from_batches(batches, schema=schema)
+
+
+def _file_schema(file, layout, unscale, columns, float32_columns, include_metadata):
+    # Determine output dtype after column projection and unscaling
+    names = layout.fieldnames if columns is None else _resolve_columns(layout, columns, unscale)
+    if unscale:
+        dtype = np.dtype([(unscale_fieldname(n), layout.dtype[n]) for n in names])
+    else:
+        dtype = np.dtype([(n, layout.dtype[n]) for n in names])
+
+    if include_metadata:
+        file_meta = get_file_metadata(file, layout)
+        metadata = {
+            "source": file.name,
+            "technique": file_meta["technique"],
+            "channel": file_meta["channel"],
+            "start_date": file_meta["start_date"],
+        }
+        metadata_fields = METADATA_FIELDS
+    else:
+        metadata = None
+        metadata_fields = None
+
+    schema = mpr_arrow_schema(dtype, float32_columns, metadata_fields)
+    return schema, metadata
+
+
+def _export_basename(file: Path) -> str:
+    # Output file name for a source file: file stem plus a hash of the resolved path
+    digest = hashlib.blake2b(str(file.resolve()).encode(), digest_size=6).hexdigest()
+    return f"{file.stem}-{digest}"
+
+
+def export_mpr_dataset(
+        files: List[FilePath],
+        base_dir: FilePath,
+        partitioning: Optional[List[str]] = ("channel", "technique"),
+        unscale: bool = True,
+        columns: Optional[List[str]] = None,
+        float32_columns: Optional[List[str]] = None,
+        chunk_size: int = 1000000,
+        format: str = "parquet",
+        **write_kw) -> List[Path]:
+    """Export .mpr files to a partitioned columnar dataset.
+
+    Files are streamed chunk by chunk (see iter_mpr_chunks), such that memory
+    use is independent of file and campaign size. Each source file is written
+    to its own file(s) within hive-style partition directories, e.g.
+    base_dir/channel=3/technique=PEIS/. Output file names consist of the
+    source file name and a hash of its full path, such that source files
+    with the same name in different directories do not overwrite each
+    other. File lists can be obtained from DataCatalog.query.
+
+    :param files: Paths to .mpr files
+    :type files: List[str or Path]
+    :param base_dir: Root directory of the dataset
+    :type base_dir: str or Path
+    :param partitioning: Metadata columns by which to partition the dataset.
+        Defaults to ('channel', 'technique')
+    :type partitioning: List[str], optional
+    :param bool unscale: If True, convert all scaled units (e.g., mA, mV)
+        to base units (A, V). Defaults to True
+    :param columns: Columns to export. If None, export all columns. Defaults to None
+    :type columns: List[str], optional
+    :param float32_columns: Additional columns to store as float32 (see
+        arrow_field). Defaults to None
+    :type float32_columns: List[str], optional
+    :param int chunk_size: Number of records to convert at a time.
+        Defaults to 1000000
+    :param str format: Dataset file format ('parquet', 'feather', 'csv').
+        Defaults to 'parquet'
+    :param write_kw: Additional keyword arguments for pyarrow.dataset.write_dataset
+    :return: Paths of the written files
+    :rtype: List[Path]
+    """
+    _check_arrow()
+    if partitioning is not None:
+        partitioning = list(partitioning)
+        invalid = [p for p in partitioning if p not in METADATA_FIELDS]
+        if len(invalid) > 0:
+            raise ValueError(f"Invalid partitioning columns {invalid}. Options: {METADATA_FIELDS}")
+
+    written = []
+
+    def file_visitor(written_file):
+        written.append(Path(written_file.path))
+
+    # Files with the same name in different directories may land in the same partition.
+    # Tag output files with a hash of the full source path such that they do not overwrite each other
+    files = [Path(f) for f in files]
+    basenames = [_export_basename(f) for f in files]
+    if len(set(basenames)) < len(basenames):
+        duplicates = sorted({str(f) for f, b in zip(files, basenames) if basenames.count(b) > 1})
+        raise ValueError(f"Files {duplicates} map to the same output file name. "
+                         "Each source file may only be exported once")
+
+    for file, basename in zip(files, basenames):
+        layout = read_mpr_layout(file)
+        schema, metadata = _file_schema(file, layout, unscale, columns, float32_columns, True)
+        batches = (to_record_batch(chunk, schema, metadata)
+                   for chunk in iter_mpr_chunks(layout, chunk_size=chunk_size, unscale=unscale, columns=columns))
+
+        ds.write_dataset(
+            batches,
+            base_dir,
+            schema=schema,
+            format=format,
+            partitioning=partitioning,
+            partitioning_flavor="hive" if partitioning is not None else None,
+            basename_template=f"{basename}-{{i}}.{format}",
+            existing_data_behavior="overwrite_or_ignore",
+            file_visitor=file_visitor,
+            **write_kw
+        )
+
+    return written
+
+
+def open_mpr_dataset(base_dir: FilePath, format: str = "parquet"):
+    """Open a dataset written by export_mpr_dataset for out-of-core queries.
+
+    :param base_dir: Root directory of the dataset
+    :type base_dir: str or Path
+    :param str format: Dataset file format. Defaults to 'parquet'
+    :return: Arrow dataset with hive partitioning
+    :rtype: pyarrow.dataset.Dataset
+    """
+    _check_arrow()
+    return ds.dataset(base_dir, format=format, partitioning="hive")
@@ -4,10 +4,11 @@ This module provides specialized filtering capabilities including:
 - Masked filtering for weighted data
 - NaN-aware filtering
 - Nonuniform Gaussian filtering with spatially-varying smoothing scales
+- Recursive (IIR) Gaussian filtering with cost independent of sigma
 """
 
 import numpy as np
-from scipy import ndimage
+from scipy import ndimage, signal
 
 
 
@@ -70,20 +71,183 @@ def nan_filter(a, filter_func, **filter_kw):
 
 
 
+# Recursive gaussian
+# ------------------
+# Map scipy.ndimage boundary modes to np.pad modes
+_pad_modes = {
+    'reflect': 'symmetric',
+    'grid-mirror': 'symmetric',
+    'mirror': 'reflect',
+    'nearest': 'edge',
+    'constant': 'constant',
+    'grid-constant': 'constant',
+    'wrap': 'wrap',
+    'grid-wrap': 'wrap',
+}
+
+
+def recursive_gaussian_sos(sigma):
+    """Get second-order sections of the Young-van Vliet recursive Gaussian filter.
+    
+    The filter is applied as a causal pass followed by an anti-causal pass, 
+    each with one real pole and one complex-conjugate pair of poles. The poles 
+    are computed directly from the pole positions of the design rather than 
+    from the expanded third-order polynomial, which is ill-conditioned at large 
+    sigma (all poles approach 1).
+    
+    :param sigma: Standard deviation of the Gaussian kernel in samples. Must be >= 0.5
+    :type sigma: float
+    :return: Second-order sections for scipy.signal.sosfilt, each with unit DC gain
+    :rtype: ndarray
+    """
+    if sigma < 0.5:
+        raise ValueError(f'Recursive Gaussian filter requires sigma >= 0.5; got {sigma}')
+    
+    if sigma >= 2.5:
+        q = 0.98711 * sigma - 0.96330
+    else:
+        q = 3.97156 - 4.14554 * np.sqrt(1 - 0.26891 * sigma)
+        
+    # Pole positions of the design: p = q / (q + m)
+    m_real = 1.16680
+    m_complex = 1.10783 + 1.40586j
+    p_real = q / (q + m_real)
+    p_complex = q / (q + m_complex)
+    
+    # Compute 1 - p directly to avoid cancellation
+    gain_real = m_real / (q + m_real)
+    gain_complex = np.abs(m_complex / (q + m_complex)) ** 2
+    
+    return np.array([
+        [gain_real, 0, 0, 1, -p_real, 0],
+        [gain_complex, 0, 0, 1, -2 * p_complex.real, np.abs(p_complex) ** 2]
+    ])
+
+
+def _causal_pass(x, sos, axis):
+    # Initialize at steady state for the first value to minimize the startup transient
+    zi_shape = [1] * (x.ndim + 1)
+    zi_shape[0] = len(sos)
+    zi_shape[axis + 1] = 2
+    zi = signal.sosfilt_zi(sos).reshape(zi_shape) * np.expand_dims(np.take(x, [0], axis=axis), 0)
+    return signal.sosfilt(sos, x, axis=axis, zi=zi)[0]
+
+
+def recursive_gaussian_filter1d(a, sigma, axis=-1, order=0, mode='reflect', cval=0.0, truncate=4.0):
+    """Apply 1D Gaussian filter using a recursive (IIR) approximation.
+    
+    Uses the Young-van Vliet recursive filter, whose cost is O(N) regardless 
+    of sigma. Intended as a drop-in replacement for ndimage.gaussian_filter1d 
+    at large sigma, where the direct convolution costs O(N * sigma). Boundaries 
+    are handled by padding the array by truncate * sigma (plus one sample 
+    for derivatives) according to mode. Derivatives are obtained by central 
+    differences of the smoothed array, which only use padded values on the 
+    same side of the array.
+    
+    The approximation error grows with derivative order and shrinks with sigma.
+    Measured maximum errors relative to the range of the exact result, for 
+    sigma >= 20 (the default threshold for method='auto' in 
+    nonuniform_gaussian_filter1d): order 0: typically 0.3-0.5%, up to 3% 
+    near sharp steps; order 1: typically ~1%, up to 3%; order 2: typically 
+    2-3%, up to 6%. At sigma = 2, order 1 and 2 errors are typically 3% and 9%.
+    
+    :param a: Input array to filter
+    :type a: ndarray
+    :param sigma: Standard deviation of the Gaussian kernel in samples. Must be >= 0.5
+    :type sigma: float
+    :param axis: Axis along which to apply the filter
+    :type axis: int
+    :param order: Order of the derivative (0, 1, or 2)
+    :type order: int
+    :param mode: Mode for handling array borders ('reflect', 'constant', 'nearest', 'mirror', 'wrap')
+    :type mode: str
+    :param cval: Value to fill past edges when mode is 'constant'
+    :type cval: float
+    :param truncate: Width of padding at array borders in standard deviations
+    :type truncate: float
+    :return: Filtered array
+    :rtype: ndarray
+    """
+    if order not in (0, 1, 2):
+        raise ValueError(f'Recursive Gaussian filter supports order 0, 1, or 2; got {order}')
+    if mode not in _pad_modes:
+        raise ValueError(f'Invalid mode {mode}. Options: {list(_pad_modes.keys())}')
+    
+    a = np.asarray(a, dtype=float)
+    axis = axis % a.ndim
+    
+    # Pad according to boundary mode. Central differences use one additional sample on each side
+    pad = max(int(truncate * sigma + 0.5), 1) + (order > 0)
+    pad_width = [(0, 0)] * a.ndim
+    pad_width[axis] = (pad, pad)
+    pad_kw = {'constant_values': cval} if _pad_modes[mode] == 'constant' else {}
+    x = np.pad(a, pad_width, mode=_pad_modes[mode], **pad_kw)
+    
+    # Causal and anti-causal passes
+    sos = recursive_gaussian_sos(sigma)
+    x = _causal_pass(x, sos, axis)
+    x = np.flip(_causal_pass(np.flip(x, axis=axis), sos, axis), axis=axis)
+    
+    # Central differences for derivatives. Neighbors of the output samples are taken from 
+    # the padded array, such that no values wrap around
+    n = a.shape[axis]
+    center = np.take(x, np.arange(pad, pad + n), axis=axis)
+    if order == 0:
+        return center
+    
+    x_prev = np.take(x, np.arange(pad - 1, pad - 1 + n), axis=axis)
+    x_next = np.take(x, np.arange(pad + 1, pad + 1 + n), axis=axis)
+    if order == 1:
+        return (x_next - x_prev) / 2
+    return x_next - 2 * center + x_prev
+
+
 # Nonuniform gaussian
 # -------------------
+# Filtered ranges separated by fewer samples than this are filtered together
+_min_run_gap = 256
+
+
+def _dilate(mask, width):
+    # Dilate a 1D mask by width on each side
+    n = len(mask)
+    csum = np.concatenate(([0], np.cumsum(mask)))
+    index = np.arange(n)
+    return csum[np.minimum(index + width + 1, n)] - csum[np.maximum(index - width, 0)] > 0
+
+
+def _dilated_runs(mask, width, min_gap=0):
+    # Get (start, stop) of contiguous runs of a 1D mask after dilating by width on each side.
+    # Runs separated by less than 2 * width are merged, as are runs separated by less than min_gap
+    dilated = _dilate(mask, width)
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], dilated.astype(np.int8), [0]))))
+    runs = edges.reshape(-1, 2)
+    if min_gap > 0 and len(runs) > 1:
+        keep = runs[1:, 0] - runs[:-1, 1] >= min_gap
+        runs = np.stack([runs[np.concatenate(([True], keep)), 0], runs[np.concatenate((keep, [True])), 1]], axis=1)
+    return runs
+
+
 def nonuniform_gaussian_filter1d(a, sigma, axis=-1,
                                  mode='reflect', cval=0.0, truncate=4, order=0,
-                                 sigma_node_factor=1.5, min_sigma=0.25):
+                                 sigma_node_factor=1.5, min_sigma=0.25,
+                                 method='auto', recursive_min_sigma=20.0):
     """Apply 1D Gaussian filter with varying length scale.
     
     Performs Gaussian filtering where the smoothing lengthscale (sigma) can vary
     along the array. This is accomplished by filtering at multiple discrete sigma
     values and averaging the results using weights based on the local sigma value.
+    Each node is only applied to the ranges whose sigma falls in its bracket
+    (plus the kernel radius), such that memory use is O(N) regardless of the
+    number of nodes. Nodes with large sigma may be filtered with the recursive 
+    Gaussian filter (see recursive_gaussian_filter1d), whose cost does not 
+    depend on sigma. If sigma is 1D, node ranges and weights are computed 
+    once and shared by all 1D slices along axis.
     
     :param a: Input array to filter
     :type a: ndarray
-    :param sigma: Smoothing scale for each position (same shape as a)
+    :param sigma: Smoothing scale for each position (same shape as a). If a is multidimensional 
+        and sigma is 1D, the same smoothing scales are applied to all 1D slices along axis
     :type sigma: ndarray
     :param axis: Axis along which to apply the filter
     :type axis: int
@@ -99,89 +263,153 @@ def nonuniform_gaussian_filter1d(a, sigma, axis=-1,
     :type sigma_node_factor: float
     :param min_sigma: Minimum effective sigma value (below this, no filtering applied)
     :type min_sigma: float
+    :param method: Gaussian filter method: 'direct' for ndimage.gaussian_filter1d, 'recursive' for 
+        recursive_gaussian_filter1d, or 'auto' to use the recursive filter for nodes with 
+        sigma >= recursive_min_sigma. Nodes with sigma < 0.5 always use the direct filter. 
+        The recursive filter is approximate; see recursive_gaussian_filter1d for the 
+        error at each derivative order. With the default 'auto', filter_chrono_signals and 
+        downsample_data output can differ from 'direct' by about 0.5-3% of the signal range 
+        (0.7% measured on chrono data); on smooth signals the difference is much smaller. 
+        Use 'direct' for exact results. Defaults to 'auto'
+    :type method: str
+    :param recursive_min_sigma: Minimum node sigma for which the recursive filter is used 
+        when method='auto'. Defaults to 20
+    :type recursive_min_sigma: float
     :return: Filtered array
     :rtype: ndarray
     """
-    if np.max(sigma) > 0:
-        sigma = np.maximum(sigma, 1e-8)
-        # Get sigma nodes
-        min_ls = max(np.min(np.log10(sigma)), np.log10(min_sigma))  # Don't go below min effective value
-        max_ls = max(np.max(np.log10(sigma)), np.log10(min_sigma))
-        num_nodes = int(np.ceil((max_ls - min_ls) / np.log10(sigma_node_factor))) + 1
-        sigma_nodes = np.logspace(min_ls, max_ls, num_nodes)
-
-        if np.min(sigma) < min_sigma:
-            # If smallest sigma is below min effective value, insert dummy node at lowest value
-            # This node will simply return the original array
-
-            # Determine factor for uniform node spacing
-            if len(sigma_nodes) > 1:
-                factor = sigma_nodes[-1] / sigma_nodes[-2]
-            else:
-                factor = sigma_node_factor
+    sigma = np.asarray(sigma, dtype=float)
+    if sigma.ndim > 1:
+        sigma = np.moveaxis(sigma, axis, -1)
+    
+    plan = _nonuniform_filter_plan(sigma, mode=mode, cval=cval, truncate=truncate, order=order,
+                                   sigma_node_factor=sigma_node_factor, min_sigma=min_sigma, method=method,
+                                   recursive_min_sigma=recursive_min_sigma)
+    if plan is None:
+        # No filtering to perform on this axis
+        return a
+    
+    # Work along last axis
+    out = _apply_filter_plan(np.moveaxis(np.asarray(a), axis, -1), plan)
+    return np.moveaxis(out, -1, axis)
+
 
-            # Limit requested sigma values to 2 increments below min effective sigma
-            # This will ensure that any sigma values well below min_sigma will not be filtered, while those
-            # close to min_sigma will receive mixed-lengthscale filtering as intended
-            sigma[sigma < min_sigma / (factor ** 2)] = min_sigma / (factor ** 2)
+def _nonuniform_filter_plan(sigma, mode='reflect', cval=0.0, truncate=4, order=0, sigma_node_factor=1.5,
+                            min_sigma=0.25, method='auto', recursive_min_sigma=20.0):
+    # Precompute the node ranges and weights of nonuniform_gaussian_filter1d for sigma, with the
+    # filtered axis last. A 1D sigma is shared by all 1D slices of the filtered array. The plan
+    # can be applied to any number of arrays with _apply_filter_plan. Returns None if no
+    # filtering is performed
+    if method not in ('auto', 'direct', 'recursive'):
+        raise ValueError(f"Invalid method {method}. Options: 'auto', 'direct', 'recursive'")
+    
+    if np.max(sigma) <= 0:
+        return None
+    
+    sigma = np.maximum(sigma, 1e-8)
+    # Get sigma nodes
+    min_ls = max(np.min(np.log10(sigma)), np.log10(min_sigma))  # Don't go below min effective value
+    max_ls = max(np.max(np.log10(sigma)), np.log10(min_sigma))
+    num_nodes = int(np.ceil((max_ls - min_ls) / np.log10(sigma_node_factor))) + 1
+    sigma_nodes = np.logspace(min_ls, max_ls, num_nodes)
 
-            # Insert as many sigma values as needed to get to lowest requested value (max 2 inserts)
-            while sigma_nodes[0] > np.min(sigma) * 1.001:
-                sigma_nodes = np.insert(sigma_nodes, 0, sigma_nodes[0] / factor)
+    if np.min(sigma) < min_sigma:
+        # If smallest sigma is below min effective value, insert dummy node at lowest value
+        # This node will simply return the original array
 
-        # print(sigma_nodes)
+        # Determine factor for uniform node spacing
         if len(sigma_nodes) > 1:
-            node_delta = np.log(sigma_nodes[-1] / sigma_nodes[-2])
+            factor = sigma_nodes[-1] / sigma_nodes[-2]
         else:
-            node_delta = 1
-
-        def get_node_weights(x):
-            # Tile x and nodes to same shape with extra axis
-            tile_shape = np.ones(np.ndim(x) + 1, dtype=int)
-            tile_shape[0] = len(sigma_nodes)
-            # print('x:', x)
-            x_tile = np.tile(x, tile_shape)
-            node_tile = np.tile(sigma_nodes, (*x.shape, 1))
-            node_tile = np.moveaxis(node_tile, -1, 0)
-
-            nw = np.abs(np.log(x_tile / node_tile)) / node_delta
-            nw[nw >= 1] = 1
-            nw = 1 - nw
-            # print('min weight:', np.min(nw))
-            # print('max weight:', np.max(nw))
-            # print('min weight sum:', np.min(np.sum(nw, axis=0)))
-            # print('max weight sum:', np.max(np.sum(nw, axis=0)))
-            return nw
-
-        node_outputs = np.empty((len(sigma_nodes), *a.shape))
-
-        for i in range(len(sigma_nodes)):
-            if sigma_nodes[i] < min_sigma:
-                # Sigma is below minimum effective value
-                # if empty:
-                #     # For empty filter, still need to apply filter to determine central value
-                #     node_outputs[i] = empty_gaussian_filter1d(a, sigma=min_sigma, axis=axis, mode=mode, cval=cval,
-                #                                               truncate=truncate, order=order)
-                # else:
-                # For standard filter, reduces to original array
-                node_outputs[i] = a
-            else:
-                # if empty:
-                #     node_outputs[i] = empty_gaussian_filter1d(a, sigma=sigma_nodes[i], axis=axis, mode=mode, cval=cval,
-                #                                               truncate=truncate, order=order)
-                # else:
-                node_outputs[i] = ndimage.gaussian_filter1d(a, sigma=sigma_nodes[i], axis=axis, mode=mode,
-                                                                cval=cval,
-                                                                truncate=truncate, order=order)
+            factor = sigma_node_factor
 
-        node_weights = get_node_weights(sigma)
-        # print(node_weights.shape, node_outputs.shape)
-        # print(np.sum(node_weights, axis=0))
+        # Limit requested sigma values to 2 increments below min effective sigma
+        # This will ensure that any sigma values well below min_sigma will not be filtered, while those
+        # close to min_sigma will receive mixed-lengthscale filtering as intended
+        sigma[sigma < min_sigma / (factor ** 2)] = min_sigma / (factor ** 2)
 
-        out = node_outputs * node_weights
-        return np.sum(out, axis=0)
+        # Insert as many sigma values as needed to get to lowest requested value (max 2 inserts)
+        while sigma_nodes[0] > np.min(sigma) * 1.001:
+            sigma_nodes = np.insert(sigma_nodes, 0, sigma_nodes[0] / factor)
 
+    num_nodes = len(sigma_nodes)
+    if num_nodes > 1:
+        node_delta = np.log(sigma_nodes[-1] / sigma_nodes[-2])
     else:
-        # No filtering to perform on this axis
-        return a
+        node_delta = 1
+
+    def get_node_weights(x, node):
+        nw = np.abs(np.log(x / node)) / node_delta
+        nw[nw >= 1] = 1
+        return 1 - nw
+
+    shared_sigma = sigma.ndim == 1
+    length = sigma.shape[-1]
+
+    # Nodes are evenly spaced in log space, so each value only receives weight from
+    # the two nodes that bracket its sigma
+    if num_nodes > 1:
+        bracket = np.searchsorted(sigma_nodes, sigma, side='right') - 1
+        bracket = np.clip(bracket, 0, num_nodes - 2)
+    else:
+        bracket = np.zeros(sigma.shape, dtype=int)
+
+    # For each node: filter function (None for nodes that return the input), filter keyword
+    # arguments, and (start, stop, index, weights) of each filtered range
+    plan = []
+    for i in range(num_nodes):
+        # Values that receive weight from this node
+        node_mask = (bracket == i) | (bracket == i - 1)
+        if not np.any(node_mask):
+            continue
+
+        if sigma_nodes[i] < min_sigma:
+            # Sigma is below minimum effective value
+            # For standard filter, reduces to original array
+            runs = [(0, length)]
+            filter_func, filter_kw = None, {}
+        else:
+            # Select filter method. Recursive filter requires sigma >= 0.5 and order <= 2
+            if method == 'auto':
+                use_recursive = sigma_nodes[i] >= max(recursive_min_sigma, 0.5) and order <= 2
+            else:
+                use_recursive = method == 'recursive' and sigma_nodes[i] >= 0.5
+            filter_func = recursive_gaussian_filter1d if use_recursive else ndimage.gaussian_filter1d
+            filter_kw = dict(sigma=sigma_nodes[i], mode=mode, cval=cval, truncate=truncate, order=order)
+
+            # Only filter the ranges that use this node, plus the kernel radius on each side
+            radius = int(truncate * float(sigma_nodes[i]) + 0.5)
+            axis_mask = node_mask if shared_sigma else np.any(node_mask.reshape(-1, length), axis=0)
+            # Filtering short gaps costs less than a separate call per run
+            runs = _dilated_runs(axis_mask, radius, min_gap=_min_run_gap)
+            if mode in ('wrap', 'grid-wrap') and len(runs) > 0 and (runs[0, 0] == 0 or runs[-1, 1] == length):
+                # Wrapped boundaries require the full array
+                runs = [(0, length)]
+
+        node_runs = []
+        for start, stop in runs:
+            seg_mask = node_mask[..., start:stop]
+            seg_weights = get_node_weights(sigma[..., start:stop][seg_mask], sigma_nodes[i])
+            if shared_sigma:
+                seg_index = (Ellipsis, np.flatnonzero(seg_mask))
+            else:
+                seg_index = seg_mask
+            node_runs.append((start, stop, seg_index, seg_weights))
+        plan.append((filter_func, filter_kw, node_runs))
+
+    return plan
+
 
+def _apply_filter_plan(a, plan, skip_zero=False):
+    # Apply a plan from _nonuniform_filter_plan along the last axis of a. If skip_zero, ranges
+    # in which a is zero are skipped (the filter is linear, such that their output is zero)
+    out = np.zeros(np.shape(a))
+    for filter_func, filter_kw, node_runs in plan:
+        for start, stop, seg_index, seg_weights in node_runs:
+            seg = a[..., start:stop]
+            if skip_zero and not np.any(seg):
+                continue
+            if filter_func is not None:
+                seg = filter_func(seg, axis=-1, **filter_kw)
+            out[..., start:stop][seg_index] += seg_weights * seg[seg_index]
+    return out
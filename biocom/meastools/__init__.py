@@ -2,5 +2,6 @@
 
 Provides high-level functions for running and reading common electrochemical 
 utility measurements including OCV, current amplitude determination, 
-current range determination, and stability monitoring.
+current range determination, stability monitoring, and combined 
+pre-characterization in a single run.
 """
@@ -12,7 +12,7 @@ from ..mps.techniques.sequence import TechniqueSequence
 from ..mps.techniques.ocv import OCVParameters
 from ..mps.common import SampleType
 from ..mps import config as cfg
-from ..mpr import read_mpr
+from ..mpr import read_mpr_tail
 
 
 def run_ocv(
@@ -64,14 +64,13 @@ def read_ocv(mpr_file: Path, n_points: Union[int, None] = 10, agg='mean') -> flo
 
     :param Path mpr_file: Path to mpr file.
     :param int n_points: Number of points to aggregate, starting from 
-        the end of the file and moving back. If None, use all points in 
-        the file. Defaults to 10.
+        the end of the file and moving back. If None or not positive, 
+        use all points in the file. Defaults to 10.
     :param str agg: Aggregation function to use. Any numpy function
         is allowed (e.g. 'mean', 'median', 'max'). 
         Defaults to 'mean'.
     :return float: Aggregated OCV.
     """
-    mpr = read_mpr(Path(mpr_file), unscale=True)
-    if n_points is None:
-        n_points = len(mpr.data)
-    return getattr(np, agg)(mpr.data['Ewe/V'][-n_points:])
+    # Only read the last n_points records of the Ewe column
+    data = read_mpr_tail(Path(mpr_file), n_points, unscale=True, columns=['Ewe/V'])
+    return getattr(np, agg)(data['Ewe/V'])
@@ -13,7 +13,7 @@ from ..mps.techniques.sequence import TechniqueSequence
 from ..mps.techniques.chrono import CAParameters
 from ..mps.common import  SampleType, get_i_range
 from ..mps import config as cfg
-from ..mpr import read_mpr
+from ..mpr import reduce_mpr_column
 from ..mps.write import write_techniques
 
 from ..processing.chrono import ControlMode, process_ivt_simple
@@ -99,7 +99,6 @@ def read_irange_test(mpr_file: Path):
     :return: Tuple of (maximum current in A, recommended IRange)
     :rtype: Tuple[float, IRange]
     """
-    mpr = read_mpr(Path(mpr_file), unscale=True)
-    i = mpr.data["I/A"]
-    i_max = np.max(np.abs(i))
+    # Streaming reduction: only the current column is held in memory
+    i_max = reduce_mpr_column(Path(mpr_file), "I/A", "absmax", unscale=True)
     return i_max, get_i_range(i_max)
\ No newline at end of file
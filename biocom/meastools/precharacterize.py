@@ -0,0 +1,403 @@
+"""Combined pre-characterization of samples prior to EIS or chrono measurements.
+
+Fuses the OCV, current range, and AC current amplitude tests into a single
+technique sequence, such that each channel requires only one load/run cycle.
+Results of each technique are read as soon as the channel moves on to the
+next technique, and are used to determine the parameters of subsequent
+measurements.
+"""
+
+from pathlib import Path
+import time
+import asyncio
+from typing import Optional, List, Dict, Tuple
+
+from ..com.server import OLECOM, DeviceChannel
+from ..mps.techniques.sequence import TechniqueSequence
+from ..mps.techniques.ocv import OCVParameters
+from ..mps.techniques.chrono import CAParameters
+from ..mps.techniques.eis import PEISParameters, GEISParameters
+from ..mps.techniques.duration import estimate_sequence_duration
+from ..mps.common import EweVs, IVs, Bandwidth, SampleType, IRange, get_i_range
+from ..mps import config as cfg
+from ..processing.chrono import LinearIV
+
+from .ocv import read_ocv
+from .pot import read_irange_test
+from .galv import process_iac_chrono_test
+
+
+# Technique indices in the pre-characterization sequence
+OCV_INDEX = 0
+IRANGE_INDEX = 1
+IAC_INDEX = 2
+
+
+def build_precharacterization_sequence(
+        device_channel: DeviceChannel,
+        v_ac: float,
+        v_dc: float = 0.0,
+        ocv_duration: float = 5.0,
+        ocv_dt: float = 0.1,
+        irange_step_duration: float = 0.5,
+        irange_dt: float = 1e-3,
+        iac_step_duration: float = 1.0,
+        iac_dt: float = 1e-3,
+        bandwidth: Optional[Bandwidth] = None,
+        **kwargs) -> TechniqueSequence:
+    """Build a technique sequence for OCV, current range, and AC current tests.
+
+    The sequence consists of an OCV measurement, followed by the current
+    range test (see pot.load_irange_test) and the AC current amplitude test
+    (see galv.run_iac_chrono_test). Voltage steps of both tests are applied
+    relative to the open circuit voltage, such that the tests do not need to
+    wait for the OCV result.
+
+    :param device_channel: Target device channel
+    :type device_channel: DeviceChannel
+    :param v_ac: AC voltage amplitude in V
+    :type v_ac: float
+    :param v_dc: DC voltage in V relative to the open circuit voltage
+    :type v_dc: float
+    :param ocv_duration: OCV measurement duration in seconds
+    :type ocv_duration: float
+    :param ocv_dt: OCV sampling interval in seconds
+    :type ocv_dt: float
+    :param irange_step_duration: Duration of current range test AC steps in seconds
+    :type irange_step_duration: float
+    :param irange_dt: Current range test sampling interval in seconds
+    :type irange_dt: float
+    :param iac_step_duration: Duration of AC current test AC steps in seconds
+    :type iac_step_duration: float
+    :param iac_dt: AC current test sampling interval in seconds
+    :type iac_dt: float
+    :param bandwidth: Amplifier bandwidth setting (defaults to highest available)
+    :type bandwidth: Optional[Bandwidth]
+    :param kwargs: Additional parameters for CAParameters
+    :return: Technique sequence
+    :rtype: TechniqueSequence
+    """
+    if bandwidth is None:
+        # Use highest available bandwidth
+        bandwidth = Bandwidth(device_channel.model.max_bandwidth)
+
+    ocv = OCVParameters(ocv_duration, ocv_dt)
+
+    # Current range test: as in pot.load_irange_test
+    t_dc = max(0.1, irange_step_duration * 0.1)
+    irange = CAParameters(
+        [v_dc, v_dc + v_ac, v_dc - v_ac, v_dc + v_ac, v_dc - v_ac, v_dc],
+        [t_dc] + [irange_step_duration] * 4 + [t_dc],
+        irange_dt,
+        v_vs=EweVs.EOC,
+        bandwidth=bandwidth,
+        **kwargs
+    )
+
+    # AC current test: as in galv.run_iac_chrono_test
+    t_dc = max(0.1, iac_step_duration * 0.1)
+    iac = CAParameters(
+        [v_dc, v_dc + v_ac, v_dc - v_ac, v_dc],
+        [t_dc, iac_step_duration, iac_step_duration, iac_step_duration],
+        iac_dt,
+        v_vs=EweVs.EOC,
+        bandwidth=bandwidth,
+        **kwargs
+    )
+
+    return TechniqueSequence([ocv, irange, iac])
+
+
+def load_precharacterization(
+        server: OLECOM,
+        device_channel: DeviceChannel,
+        mps_file: Path,
+        v_ac: float,
+        v_dc: float = 0.0,
+        **kwargs):
+    """Load the combined pre-characterization sequence.
+
+    :param server: EC-Lab COM server instance
+    :type server: OLECOM
+    :param device_channel: Target device channel
+    :type device_channel: DeviceChannel
+    :param mps_file: Path for MPS settings file
+    :type mps_file: Path
+    :param v_ac: AC voltage amplitude in V
+    :type v_ac: float
+    :param v_dc: DC voltage in V relative to the open circuit voltage
+    :type v_dc: float
+    :param kwargs: Additional parameters for build_precharacterization_sequence
+    :return: Success code (1 = success)
+    :rtype: int
+    """
+    seq = build_precharacterization_sequence(device_channel, v_ac, v_dc, **kwargs)
+    config = cfg.set_defaults(device_channel.model, seq,
+                              SampleType.CORROSION)
+
+    return server.load_techniques(device_channel, seq, config, mps_file)
+
+
+class PrecharacterizationResult(object):
+    """Results of the pre-characterization tests for a single channel.
+
+    Fields are None until the corresponding technique has been read.
+
+    :param v_ac: AC voltage amplitude in V
+    :type v_ac: float
+    :param v_dc: DC voltage in V relative to the open circuit voltage
+    :type v_dc: float
+
+    :ivar v_oc: Open circuit voltage in V
+    :ivar i_max: Maximum absolute current in the current range test in A
+    :ivar i_range: Current range determined from the current range test
+    :ivar iv: Linear I-V relationship from the AC current test
+    """
+    def __init__(self, v_ac: float, v_dc: float = 0.0):
+        self.v_ac = v_ac
+        self.v_dc = v_dc
+
+        self.v_oc: Optional[float] = None
+        self.i_max: Optional[float] = None
+        self.i_range: Optional[IRange] = None
+        self.iv: Optional[LinearIV] = None
+
+    @property
+    def complete(self) -> bool:
+        """True if all tests have been read."""
+        return not any(x is None for x in (self.v_oc, self.i_range, self.iv))
+
+    @property
+    def v_dc_abs(self) -> float:
+        """Absolute DC voltage in V."""
+        return self.v_oc + self.v_dc
+
+    def eval_iac(self) -> Tuple[float, float]:
+        """Evaluate the DC current and AC current amplitude at the test
+        voltage amplitude.
+
+        :return: Tuple of (i_dc, i_ac) in A
+        :rtype: Tuple[float, float]
+        """
+        return self.iv.eval_iac(self.v_dc_abs, self.v_ac)
+
+    def get_peis_parameters(self, f_max: float, f_min: float, **kwargs) -> PEISParameters:
+        """Get PEIS parameters at the tested DC voltage and AC amplitude.
+
+        :param f_max: Maximum frequency in Hz
+        :type f_max: float
+        :param f_min: Minimum frequency in Hz
+        :type f_min: float
+        :param kwargs: Additional parameters for PEISParameters
+        :return: PEIS parameters with current range from the current range test
+        :rtype: PEISParameters
+        """
+        kwargs.setdefault("i_range", self.i_range)
+        return PEISParameters(self.v_dc_abs, self.v_ac, EweVs.REF, f_max, f_min, **kwargs)
+
+    def get_geis_parameters(self, f_max: float, f_min: float, v_ac: Optional[float] = None,
+                            **kwargs) -> GEISParameters:
+        """Get GEIS parameters that produce the target AC voltage amplitude
+        at the tested DC voltage.
+
+        :param f_max: Maximum frequency in Hz
+        :type f_max: float
+        :param f_min: Minimum frequency in Hz
+        :type f_min: float
+        :param v_ac: Target AC voltage amplitude in V (defaults to the tested amplitude)
+        :type v_ac: Optional[float]
+        :param kwargs: Additional parameters for GEISParameters
+        :return: GEIS parameters
+        :rtype: GEISParameters
+        """
+        if v_ac is None:
+            v_ac = self.v_ac
+        i_dc, i_ac = self.iv.eval_iac(self.v_dc_abs, v_ac)
+        kwargs.setdefault("i_range", get_i_range(abs(i_dc) + i_ac))
+        return GEISParameters(i_dc, i_ac, IVs.NONE, f_max, f_min, **kwargs)
+
+
+class PrecharacterizationPipeline(object):
+    """Combined OCV, current range, and AC current tests for many channels.
+
+    Loads and runs the sequence from build_precharacterization_sequence
+    once per channel. All channels are handled by a single status poller.
+    Each technique's data file is read as soon as the channel has moved on
+    to the next technique (or finished), such that processing overlaps with
+    measurement. When all tests for a channel are read, the AC and DC
+    currents of the channel are stored in device_channel.i_ac and
+    device_channel.i_dc.
+
+    :param server: EC-Lab COM server instance
+    :type server: OLECOM
+    :param device_channels: Device channels to test
+    :type device_channels: List[DeviceChannel]
+    :param mps_files: Path for the MPS settings file of each channel. Data
+        files are written with the same name and the .mpr extension
+    :type mps_files: List[Path]
+    :param v_ac: AC voltage amplitude in V
+    :type v_ac: float
+    :param v_dc: DC voltage in V relative to the open circuit voltage
+    :type v_dc: float
+    :param sequence_kw: Additional parameters for build_precharacterization_sequence
+    :type sequence_kw: Optional[dict]
+    :param use_drt: Whether to use DRT-based processing for the AC current test
+    :type use_drt: bool
+    :param ocv_points: Number of points at the end of the OCV measurement to
+        aggregate (see read_ocv)
+    :type ocv_points: int
+    :param timeout: Maximum wait time per channel in seconds. If None,
+        determined from the estimated sequence duration
+    :type timeout: Optional[float]
+    :param poll_interval: Status check interval in seconds
+    :type poll_interval: float
+
+    :ivar results: Mapping of channel keys to PrecharacterizationResult instances
+    """
+    def __init__(
+            self,
+            server: OLECOM,
+            device_channels: List[DeviceChannel],
+            mps_files: List[Path],
+            v_ac: float,
+            v_dc: float = 0.0,
+            sequence_kw: Optional[dict] = None,
+            use_drt: bool = False,
+            ocv_points: int = 10,
+            timeout: Optional[float] = None,
+            poll_interval: float = 0.5):
+
+        if len(mps_files) != len(device_channels):
+            raise ValueError(f"Length of mps_files ({len(mps_files)}) does not match length of "
+                             f"device_channels ({len(device_channels)})")
+
+        if sequence_kw is None:
+            sequence_kw = {}
+
+        self.server = server
+        self.device_channels = list(device_channels)
+        self.mps_files = {dc.key: Path(f) for dc, f in zip(self.device_channels, mps_files)}
+        self.v_ac = v_ac
+        self.v_dc = v_dc
+        self.sequence_kw = sequence_kw
+        self.use_drt = use_drt
+        self.ocv_points = ocv_points
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+        self.results = {}
+
+    def load(self):
+        """Load the pre-characterization sequence on all channels.
+
+        :return: Mapping of channel keys to load success codes (1 = success)
+        :rtype: Dict[Tuple[int, int], int]
+        """
+        return {
+            dc.key: load_precharacterization(self.server, dc, self.mps_files[dc.key], self.v_ac, self.v_dc,
+                                             **self.sequence_kw)
+            for dc in self.device_channels
+        }
+
+    def _read_techniques(self, device_channel: DeviceChannel, indices):
+        # Read and process the data files of finished techniques
+        result: PrecharacterizationResult = self.results[device_channel.key]
+
+        for index in indices:
+            data_file = self.server.get_data_filename(device_channel, index)
+
+            if index == OCV_INDEX:
+                result.v_oc = read_ocv(data_file, self.ocv_points)
+            elif index == IRANGE_INDEX:
+                result.i_max, result.i_range = read_irange_test(data_file)
+            elif index == IAC_INDEX:
+                result.iv = process_iac_chrono_test(data_file, use_drt=self.use_drt)
+
+                # The OCV is read before the AC current test
+                device_channel.i_dc, device_channel.i_ac = result.eval_iac()
+
+    async def run_async(self) -> Dict[Tuple[int, int], PrecharacterizationResult]:
+        """Load and run the pre-characterization sequence on all channels.
+
+        :return: Mapping of channel keys to results. Results of channels
+            that failed to load, timed out, or could not be processed are
+            incomplete
+        :rtype: Dict[Tuple[int, int], PrecharacterizationResult]
+        """
+        self.results = {dc.key: PrecharacterizationResult(self.v_ac, self.v_dc) for dc in self.device_channels}
+
+        timeout = self.timeout
+        if timeout is None:
+            seq = build_precharacterization_sequence(self.device_channels[0], self.v_ac, self.v_dc,
+                                                     **self.sequence_kw)
+            timeout = estimate_sequence_duration(seq).timeout()
+
+        # Load and launch all channels
+        running = {}
+        for dc, code in zip(self.device_channels, self.load().values()):
+            if code != 1:
+                if self.server.print_messages:
+                    print(f"WARNING: Could not load settings for Device {dc.key[0]} Channel {dc.key[1]}")
+                continue
+            self.server.run_channel(dc, self.mps_files[dc.key].with_suffix(".mpr"))
+            # Channel, launch time, number of techniques submitted for reading, read task
+            running[dc.key] = (dc, time.monotonic(), 0, None)
+
+        while running:
+            await asyncio.sleep(self.poll_interval)
+
+            for key, (device_channel, launch_time, num_read, task) in list(running.items()):
+                if task is not None:
+                    if not task.done():
+                        continue
+                    error = task.exception()
+                    task = None
+                    if error is not None:
+                        # Leave the result of this channel incomplete and keep polling the others
+                        del running[key]
+                        if self.server.print_messages:
+                            print(f"WARNING: Could not process data for Device {key[0]} Channel {key[1]}: "
+                                  f"{error!r}")
+                        self.server.stop_channel(device_channel)
+                        continue
+
+                if num_read > IAC_INDEX:
+                    del running[key]
+                    continue
+
+                if self.server.channel_is_done(device_channel):
+                    num_ready = IAC_INDEX + 1
+                else:
+                    # Techniques before the current technique (0-indexed, as in 
+                    # get_data_filename) are finished
+                    status = self.server.check_measure_status(device_channel)
+                    num_ready = int(status["Technique number"])
+
+                if num_ready > num_read:
+                    # Process finished techniques in a worker thread while polling continues
+                    task = asyncio.create_task(
+                        asyncio.to_thread(self._read_techniques, device_channel, range(num_read, num_ready))
+                    )
+                    num_read = num_ready
+                elif time.monotonic() - launch_time > timeout:
+                    del running[key]
+                    if self.server.print_messages:
+                        print(f"WARNING: Device {key[0]} Channel {key[1]} timed out")
+                    self.server.stop_channel(device_channel)
+                    continue
+
+                running[key] = (device_channel, launch_time, num_read, task)
+
+        if self.server.print_messages:
+            num_complete = sum(r.complete for r in self.results.values())
+            print(f"Pre-characterization complete for {num_complete} of {len(self.results)} channels")
+
+        return self.results
+
+    def run(self) -> Dict[Tuple[int, int], PrecharacterizationResult]:
+        """Load and run the pre-characterization sequence on all channels (blocking).
+
+        :return: Mapping of channel keys to results
+        :rtype: Dict[Tuple[int, int], PrecharacterizationResult]
+        """
+        return asyncio.run(self.run_async())
@@ -8,9 +8,10 @@ import numpy as np
 from numpy import ndarray
 import scipy.ndimage as ndi
 from pathlib import Path
-from collections import deque
 import time
-from typing import Callable, Optional, Union
+import asyncio
+from collections import deque
+from typing import Callable, Optional, Union, Tuple, List, Dict
 
 from ..com.server import OLECOM, DeviceChannel
 from ..mps.common import EweVs, Bandwidth, SampleType
@@ -84,7 +85,8 @@ async def run_z_stability_test_async(
     """Run impedance stability test asynchronously.
     
     Repeatedly measures impedance until stable or timeout. Stability is determined
-    by monitoring the rate of change of impedance magnitude.
+    by monitoring the rate of change of impedance magnitude. To monitor 
+    many channels at once, use ZStabilityMonitor.
     
     :param server: EC-Lab COM server instance
     :type server: OLECOM
@@ -102,34 +104,9 @@ async def run_z_stability_test_async(
     :rtype: bool
     """
     # assume that settings are already loaded
-    z_log = deque()
-    
-    # Write to a single mpr file and overwrite at each iteration
-    mpr_file = server.get_settings(device_channel).replace(".mps", ".mpr")
-
-    start_time = time.monotonic()
-    elapsed = 0
-    stable = False
-    while not (stable and elapsed > min_wait):
-        # Launch z measurement
-        output_file = server.run_channel(device_channel, output_file=mpr_file)
-        
-        await server.wait_for_channel_async(device_channel, min_wait=1.0, timeout=120.0)
-        
-        elapsed = time.monotonic() - start_time
-        data = server.get_eis_value(output_file, 0)
-        z_log.append([elapsed, data['Re(Z)/Ohm'], data['-Im(Z)/Ohm']])
-        
-        if len(z_log >= window):
-            z_arr = np.array(z_log)[-window:]
-            z_mod = np.sum(z_arr[:, 1:] **2, axis=1) ** 0.5
-            # Calculate rate of change as % of |Z| per minute
-            stable = value_is_stable(z_arr[:, 0], z_arr[:, 1:], z_mod * rate_thresh)
-
-        if elapsed > timeout:
-            break
-        
-    return stable
+    monitor = ZStabilityMonitor(server, [device_channel], min_wait, timeout, window, rate_thresh)
+    results = await monitor.run_async()
+    return results[device_channel.key]
     
     
 
@@ -138,7 +115,7 @@ def value_is_stable(
         values: Union[ndarray, list], 
         rate_thresh: float, 
         filter_values: bool = True, 
-        filter_func: Optional[Callable[[ndarray]]] = None,
+        filter_func: Optional[Callable[[ndarray], ndarray]] = None,
         relative: bool = False):
     """Determine if a time-series value has stabilized.
     
@@ -154,7 +131,7 @@ def value_is_stable(
     :param filter_values: Whether to apply Gaussian smoothing to reduce noise
     :type filter_values: bool
     :param filter_func: Custom filter function (defaults to Gaussian with sigma=1)
-    :type filter_func: Optional[Callable[[ndarray]]]
+    :type filter_func: Optional[Callable[[ndarray], ndarray]]
     :param relative: Whether to normalize values by median before analysis
     :type relative: bool
     :return: True if rate of change is below threshold
@@ -166,7 +143,8 @@ def value_is_stable(
     if np.ndim(values) > 1:
         # Vector of values
         # Ensure that all entries are stable
-        return all([value_is_stable(v) for v in values.T])
+        return all([value_is_stable(times, v, rate_thresh, filter_values, filter_func, relative) 
+                    for v in values.T])
     
     if relative:
         # Analyze changes relative to median value
@@ -188,4 +166,324 @@ def value_is_stable(
         return True
     else:
         return False
+
+
+class StabilityTracker(object):
+    """Streaming estimator of the rate of change of measured values.
+    
+    Incremental equivalent of value_is_stable for live monitoring. Keeps 
+    running sums for a linear regression over a sliding window of the most 
+    recent measurements, such that the slope and stability of each value 
+    are updated in constant time per measurement. Values may be arrays of 
+    any shape (e.g. one entry per channel), and are tracked element-wise. 
+    With vector=True, the last axis holds the components of a vector 
+    value (e.g. Re(Z) and -Im(Z)), which is stable only if all components 
+    are stable.
+    
+    :param int window: Number of measurements in the regression window
+    :param rate_thresh: Maximum acceptable rate of change per minute, in 
+        absolute units or as a fraction of the value if relative is True
+    :type rate_thresh: Union[float, ndarray]
+    :param shape: Shape of the measured values. Defaults to () (scalar)
+    :type shape: Tuple[int]
+    :param bool vector: If True, the last axis of the values holds vector 
+        components. Defaults to False
+    :param bool relative: If True, compare rates relative to the mean value 
+        in the window (or the norm of the mean vector if vector is True) to 
+        rate_thresh. Defaults to False
+    :param smoothing: Weight of the newest measurement for exponentially 
+        weighted smoothing of the values, between 0 and 1. If None, values 
+        are not smoothed. Defaults to None
+    :type smoothing: Optional[float]
+    """
+    def __init__(
+            self, 
+            window: int, 
+            rate_thresh: Union[float, ndarray],
+            shape: Tuple[int] = (),
+            vector: bool = False,
+            relative: bool = False,
+            smoothing: Optional[float] = None):
+        
+        if window < 2:
+            raise ValueError("window must be at least 2")
+        if smoothing is not None and not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be between 0 and 1")
+        
+        self.window = window
+        self.rate_thresh = rate_thresh
+        self.shape = tuple(shape)
+        self.vector = vector
+        self.relative = relative
+        self.smoothing = smoothing
+        
+        self.reset()
+        
+    def reset(self):
+        """Clear all measurements."""
+        self._t_buf = np.zeros(self.window)
+        self._y_buf = np.zeros((self.window,) + self.shape)
+        self._y_smooth = None
+        self._count = 0
+        self._updates_since_refresh = 0
+        self._refresh(0.0)
+        
+    @property
+    def num_points(self) -> int:
+        """Number of measurements in the window."""
+        return min(self._count, self.window)
+        
+    @property
+    def ready(self) -> bool:
+        """True if the window is full."""
+        return self._count >= self.window
+        
+    def _refresh(self, t_ref: float):
+        # Recompute running sums from the buffer with a new time origin to avoid 
+        # accumulating round-off error
+        self._t_ref = t_ref
+        n = self.num_points
+        t = self._t_buf[:n] - t_ref if self._count <= self.window else self._t_buf - t_ref
+        y = self._y_buf[:n] if self._count <= self.window else self._y_buf
+        self._s_t = np.sum(t)
+        self._s_tt = np.sum(t ** 2)
+        self._s_y = np.sum(y, axis=0)
+        self._s_ty = np.tensordot(t, y, axes=1)
+        self._updates_since_refresh = 0
+        
+    def update(self, time: float, value: Union[float, ndarray]):
+        """Add a measurement.
+        
+        :param float time: Measurement time in seconds
+        :param value: Measured value(s) with shape self.shape
+        :type value: Union[float, ndarray]
+        """
+        t = time / 60
+        y = np.asarray(value, dtype=float).reshape(self.shape)
+        
+        if self.smoothing is not None:
+            if self._y_smooth is None:
+                self._y_smooth = y
+            else:
+                self._y_smooth = self.smoothing * y + (1 - self.smoothing) * self._y_smooth
+            y = self._y_smooth
+        
+        pos = self._count % self.window
+        if self._count >= self.window:
+            # Remove oldest measurement from sums
+            t_old = self._t_buf[pos] - self._t_ref
+            y_old = self._y_buf[pos]
+            self._s_t -= t_old
+            self._s_tt -= t_old ** 2
+            self._s_y = self._s_y - y_old
+            self._s_ty = self._s_ty - t_old * y_old
+            
+        self._t_buf[pos] = t
+        self._y_buf[pos] = y
+        self._count += 1
+        
+        t_new = t - self._t_ref
+        self._s_t += t_new
+        self._s_tt += t_new ** 2
+        self._s_y = self._s_y + y
+        self._s_ty = self._s_ty + t_new * y
+        
+        self._updates_since_refresh += 1
+        if self._updates_since_refresh >= self.window:
+            # Amortized O(1): shift the time origin to the oldest point in the window
+            self._refresh(self._t_buf[self._count % self.window] if self.ready else self._t_buf[0])
+        
+    @property
+    def slope(self) -> ndarray:
+        """Slope of the values in the window, in units per minute."""
+        n = self.num_points
+        denom = n * self._s_tt - self._s_t ** 2
+        if n < 2 or denom <= 0:
+            return np.full(self.shape, np.nan)
+        return (n * self._s_ty - self._s_t * self._s_y) / denom
     
+    @property
+    def mean(self) -> ndarray:
+        """Mean of the values in the window."""
+        return self._s_y / max(self.num_points, 1)
+    
+    @property
+    def relative_rate(self) -> ndarray:
+        """Slope relative to the mean value (or mean vector norm), per minute."""
+        if self.vector:
+            scale = np.sqrt(np.sum(self.mean ** 2, axis=-1, keepdims=True))
+        else:
+            scale = np.abs(self.mean)
+        return self.slope / scale
+    
+    @property
+    def stable(self) -> Union[bool, ndarray]:
+        """Stability flag. Array with shape self.shape (or self.shape[:-1] if 
+        vector is True). False until the window is full."""
+        rate = self.relative_rate if self.relative else self.slope
+        is_stable = np.abs(rate) <= self.rate_thresh
+        if self.vector:
+            is_stable = np.all(is_stable, axis=-1)
+        if not self.ready:
+            is_stable = np.zeros_like(is_stable)
+        return is_stable
+
+
+
+class ZStabilityMonitor(object):
+    """Concurrent impedance stability test for many channels.
+    
+    Repeatedly measures single-frequency impedance on each channel until 
+    the channel is stable or times out. All channels are handled by a 
+    single status poller, and measurement launches are staggered by 
+    launch_interval to limit the load on the EC-Lab server. Stability is 
+    tracked incrementally for each channel with a StabilityTracker, and 
+    each channel stops being measured as soon as it is stable.
+    
+    Settings must be pre-loaded on each channel (see load_z_stability_test).
+    
+    :param server: EC-Lab COM server instance
+    :type server: OLECOM
+    :param device_channels: Device channels to test
+    :type device_channels: List[DeviceChannel]
+    :param min_wait: Minimum wait time in seconds before a channel can be 
+        considered stable
+    :type min_wait: float
+    :param timeout: Maximum wait time in seconds
+    :type timeout: float
+    :param window: Number of measurements to use for stability analysis
+    :type window: int
+    :param rate_thresh: Threshold for rate of change (fraction of |Z| per minute)
+    :type rate_thresh: float
+    :param smoothing: Exponential smoothing weight for impedance values 
+        (see StabilityTracker)
+    :type smoothing: Optional[float]
+    :param launch_interval: Minimum time between measurement launches in seconds
+    :type launch_interval: float
+    :param poll_interval: Status check interval in seconds
+    :type poll_interval: float
+    :param measure_min_wait: Minimum time after launch before checking 
+        whether a measurement is done, in seconds
+    :type measure_min_wait: float
+    :param measure_timeout: Maximum time for a single measurement in 
+        seconds. Measurements that exceed this are stopped and relaunched
+    :type measure_timeout: float
+    
+    :ivar trackers: Mapping of channel keys to StabilityTracker instances
+    :ivar results: Mapping of channel keys to stability results (True if 
+        stable, False if timed out) for finished channels
+    """
+    def __init__(
+            self,
+            server: OLECOM, 
+            device_channels: List[DeviceChannel],
+            min_wait: float,
+            timeout: float, 
+            window: int = 10,
+            rate_thresh: float = 0.01,
+            smoothing: Optional[float] = 0.5,
+            launch_interval: float = 1.0,
+            poll_interval: float = 0.5,
+            measure_min_wait: float = 1.0,
+            measure_timeout: float = 120.0):
+        
+        self.server = server
+        self.device_channels = list(device_channels)
+        self.min_wait = min_wait
+        self.timeout = timeout
+        self.launch_interval = launch_interval
+        self.poll_interval = poll_interval
+        self.measure_min_wait = measure_min_wait
+        self.measure_timeout = measure_timeout
+        
+        # Track rate of change of Re(Z) and -Im(Z) relative to |Z|
+        self.trackers = {
+            dc.key: StabilityTracker(window, rate_thresh, shape=(2,), vector=True, relative=True,
+                                     smoothing=smoothing)
+            for dc in self.device_channels
+        }
+        self.results = {}
+        
+    def _finish_measurement(self, device_channel: DeviceChannel, elapsed: float):
+        # Read the new impedance value and determine whether the channel is finished
+        data_file = self.server.get_data_filename(device_channel, 0)
+        data = self.server.get_eis_value(data_file, 0)
+        
+        tracker = self.trackers[device_channel.key]
+        tracker.update(elapsed, [data['Re(Z)/Ohm'], data['-Im(Z)/Ohm']])
+        
+        stable = tracker.ready and bool(tracker.stable)
+        if stable and elapsed > self.min_wait:
+            self.results[device_channel.key] = True
+        elif elapsed > self.timeout:
+            self.results[device_channel.key] = stable
+            
+        return device_channel.key in self.results
+        
+    async def run_async(self) -> Dict[Tuple[int, int], bool]:
+        """Run the stability test on all channels.
+        
+        :return: Mapping of channel keys to True if stable within timeout, 
+            False otherwise
+        :rtype: Dict[Tuple[int, int], bool]
+        """
+        # Write to a single mpr file per channel and overwrite at each iteration
+        mpr_files = {dc.key: self.server.get_settings(dc).with_suffix(".mpr") for dc in self.device_channels}
+        
+        start_time = time.monotonic()
+        self.results = {}
+        to_launch = deque(self.device_channels)
+        running = {}
+        last_launch = -np.inf
+        
+        while to_launch or running:
+            now = time.monotonic()
+            
+            # Launch next channel if launch interval has passed
+            if to_launch and now - last_launch >= self.launch_interval:
+                device_channel = to_launch.popleft()
+                self.server.run_channel(device_channel, mpr_files[device_channel.key])
+                running[device_channel.key] = (device_channel, now)
+                last_launch = now
+                
+            # Check status of all running channels
+            for key, (device_channel, launch_time) in list(running.items()):
+                measure_time = time.monotonic() - launch_time
+                if measure_time < self.measure_min_wait:
+                    continue
+                
+                if self.server.channel_is_done(device_channel):
+                    del running[key]
+                    if not self._finish_measurement(device_channel, time.monotonic() - start_time):
+                        to_launch.append(device_channel)
+                elif measure_time > self.measure_timeout:
+                    del running[key]
+                    if self.server.print_messages:
+                        print(f"WARNING: Device {key[0]} Channel {key[1]} measurement timed out")
+                    self.server.stop_channel(device_channel)
+                    if time.monotonic() - start_time > self.timeout:
+                        self.results[key] = False
+                    else:
+                        to_launch.append(device_channel)
+                        
+            if to_launch:
+                wait = min(self.poll_interval, max(last_launch + self.launch_interval - time.monotonic(), 0))
+            else:
+                wait = self.poll_interval
+            await asyncio.sleep(wait)
+            
+        if self.server.print_messages:
+            elapsed = time.monotonic() - start_time
+            num_stable = sum(self.results.values())
+            print(f"{num_stable} of {len(self.results)} channels stable after {elapsed:.1f} s")
+            
+        return self.results
+    
+    def run(self) -> Dict[Tuple[int, int], bool]:
+        """Run the stability test on all channels (blocking).
+        
+        :return: Mapping of channel keys to True if stable within timeout, 
+            False otherwise
+        :rtype: Dict[Tuple[int, int], bool]
+        """
+        return asyncio.run(self.run_async())
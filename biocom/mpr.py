@@ -1,9 +1,14 @@
 import numpy as np
 from numpy import ndarray
 from pathlib import Path
-from galvani.BioLogic import MPRfile
+from numpy.lib import recfunctions as rfn
+from dataclasses import dataclass
+from datetime import date
+from galvani.BioLogic import (
+    MPRfile, MPR_MAGIC, read_VMP_modules, VMPdata_dtype_from_colIDs, parse_BioLogic_date
+)
 import pandas as pd
-from typing import Union
+from typing import Union, Optional, List, Dict, Iterator
 
 from . import units
 from .utils import split_list
@@ -104,6 +109,522 @@ def unscale_data(data: ndarray):
     scaled.dtype = new_dtype
     return scaled
 
+
+# ==================
+# Chunked file access
+# ==================
+@dataclass
+class MPRLayout:
+    """Location and record format of the main data array in a .mpr file.
+    
+    Obtained from the module headers only, so that records can be read 
+    directly from disk without loading the full file into memory.
+    
+    :ivar Path file: Path to the .mpr file
+    :ivar np.dtype dtype: Record dtype of the data array
+    :ivar dict flags_dict: Bit masks for columns packed into the flags byte
+    :ivar int data_offset: Byte offset of the first record in the file
+    :ivar int npts: Number of records in the file
+    :ivar int version: Version of the data module
+    :ivar date startdate: Date on which the experiment started
+    :ivar int technique_id: EC-Lab ID of the (first) technique, as listed in 
+        mps/techniques/technique_codes.csv
+    """
+    file: Path
+    dtype: np.dtype
+    flags_dict: dict
+    data_offset: int
+    npts: int
+    version: int
+    startdate: Optional[date] = None
+    technique_id: Optional[int] = None
+    
+    @property
+    def record_size(self) -> int:
+        """Size of a single record in bytes."""
+        return self.dtype.itemsize
+    
+    @property
+    def fieldnames(self) -> List[str]:
+        """Names of the fields in the data array."""
+        return list(self.dtype.names)
+    
+    
+# Max size of the data module header (version 0 files with EC-Lab >= 11.50)
+_DATA_HEADER_SIZE = 1007
+
+
+def read_mpr_layout(file: Union[str, Path], error_on_unknown_column: bool = False) -> MPRLayout:
+    """Read the data layout of a .mpr file without loading its data.
+    
+    Only the module headers and the header of the data module are read,
+    such that the cost is independent of the number of records in the file.
+    
+    :param file: Path to the .mpr file
+    :type file: str or Path
+    :param bool error_on_unknown_column: If True, raise an error for 
+        unrecognized column IDs. Defaults to False
+    :return: Data layout of the file
+    :rtype: MPRLayout
+    :raises ValueError: If the file is not a valid .mpr file
+    """
+    file = Path(file)
+    with open(file, "rb") as f:
+        magic = f.read(len(MPR_MAGIC))
+        if magic != MPR_MAGIC:
+            raise ValueError(f"Invalid magic for .mpr file: {magic}")
+        
+        modules = list(read_VMP_modules(f, read_module_data=False))
+        data_module = [m for m in modules if m["shortname"] == b"VMP data  "]
+        if len(data_module) != 1:
+            raise ValueError(f"Expected one data module in {file}, found {len(data_module)}")
+        data_module = data_module[0]
+        
+        f.seek(data_module["offset"])
+        header = f.read(min(data_module["length"], _DATA_HEADER_SIZE))
+        
+        # First byte of the settings module is the technique ID
+        settings_module = [m for m in modules if m["shortname"] == b"VMP Set   "]
+        if len(settings_module) > 0 and settings_module[0]["length"] > 0:
+            f.seek(settings_module[0]["offset"])
+            technique_id = f.read(1)[0]
+        else:
+            technique_id = None
+    
+    # Same header logic as galvani.BioLogic.MPRfile
+    version = int(data_module["version"])
+    npts = int(np.frombuffer(header[:4], dtype="<u4")[0])
+    n_columns = header[4]
+    if version == 0:
+        if header[5]:
+            column_types = np.frombuffer(header[5:], dtype="u1", count=n_columns)
+            num_bytes_before = 100
+        else:
+            # EC-Lab >= 11.50: column types are interleaved with zeros
+            column_types = np.frombuffer(header[5:], dtype="u1", count=n_columns * 2)[1::2]
+            num_bytes_before = 1007
+    elif version in [2, 3]:
+        column_types = np.frombuffer(header[5:], dtype="<u2", count=n_columns)
+        num_bytes_before = 406 if version == 3 else 405
+    else:
+        raise ValueError(f"Unrecognized version for data module: {version}")
+        
+    dtype, flags_dict = VMPdata_dtype_from_colIDs(column_types, error_on_unknown_column=error_on_unknown_column)
+    
+    if len(settings_module) > 0:
+        startdate = parse_BioLogic_date(settings_module[0]["date"])
+    else:
+        startdate = None
+    
+    return MPRLayout(
+        file=file,
+        dtype=dtype,
+        flags_dict=flags_dict,
+        data_offset=int(data_module["offset"]) + num_bytes_before,
+        npts=npts,
+        version=version,
+        startdate=startdate,
+        technique_id=technique_id
+    )
+    
+    
+def unscale_fieldname(fieldname: str) -> str:
+    """Get the name of a field after conversion to base units.
+    
+    :param str fieldname: Field name, formatted as 'name/unit'
+    :return: Field name with the unit prefix removed (e.g. 'I/mA' -> 'I/A')
+    :rtype: str
+    """
+    name, unit = split_fieldname(fieldname)
+    prefix, base_unit = split_unit(unit)
+    if prefix is None:
+        return fieldname
+    return f'{name}/{base_unit}'
+    
+    
+def _resolve_columns(layout: MPRLayout, columns: List[str], unscale: bool) -> List[str]:
+    # Map requested column names to raw field names in the file.
+    # When unscaling, columns may be requested by either their raw or unscaled names
+    if unscale:
+        name_map = {unscale_fieldname(fn): fn for fn in layout.fieldnames}
+    else:
+        name_map = {}
+        
+    fields = []
+    for col in columns:
+        if col in layout.dtype.names:
+            fields.append(col)
+        elif col in name_map:
+            fields.append(name_map[col])
+        else:
+            raise ValueError(f"Column {col} not found in {layout.file.name}. "
+                             f"Available columns: {layout.fieldnames}")
+    return fields
+
+
+def iter_mpr_chunks(
+        file: Union[str, Path, MPRLayout], 
+        chunk_size: int = 100000, 
+        unscale: bool = False,
+        columns: Optional[List[str]] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+        error_on_unknown_column: bool = False) -> Iterator[ndarray]:
+    """Iterate over the records of a .mpr file in fixed-size chunks.
+    
+    Records are read directly from disk, such that peak memory is set by
+    chunk_size rather than by the size of the file.
+    
+    :param file: Path to the .mpr file or its layout from read_mpr_layout
+    :type file: str, Path, or MPRLayout
+    :param int chunk_size: Number of records per chunk. Defaults to 100000
+    :param bool unscale: If True, convert all scaled units (e.g., mA, mV)
+        to base units (A, V). Defaults to False
+    :param columns: Columns to read. When unscale is True, columns may be 
+        given by either their raw or unscaled names. If None, read all columns. 
+        Defaults to None
+    :type columns: List[str], optional
+    :param int start: Index of first record to read. Defaults to 0
+    :param int stop: Index after last record to read. If None, read through 
+        the end of the file. Defaults to None
+    :param bool error_on_unknown_column: If True, raise an error for 
+        unrecognized column IDs. Defaults to False
+    :return: Iterator of structured arrays with at most chunk_size records
+    :rtype: Iterator[ndarray]
+    """
+    if isinstance(file, MPRLayout):
+        layout = file
+    else:
+        layout = read_mpr_layout(file, error_on_unknown_column=error_on_unknown_column)
+    
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be a positive integer, got {chunk_size}")
+        
+    read_dtype = _read_dtype(layout, columns, unscale)
+    
+    if stop is None or stop > layout.npts:
+        stop = layout.npts
+    start = max(start, 0)
+        
+    with open(layout.file, "rb") as f:
+        for chunk_start in range(start, stop, chunk_size):
+            count = min(chunk_size, stop - chunk_start)
+            f.seek(layout.data_offset + chunk_start * layout.record_size)
+            chunk = np.fromfile(f, dtype=read_dtype, count=count)
+            yield _convert_chunk(chunk, columns, unscale)
+
+
+def _read_dtype(layout: MPRLayout, columns: Optional[List[str]], unscale: bool) -> np.dtype:
+    # Dtype for reading records from the file
+    if columns is not None:
+        # Read only the requested fields. The projected dtype keeps the
+        # full record size so that it can be read directly from the file
+        return layout.dtype[_resolve_columns(layout, columns, unscale)]
+    return layout.dtype
+
+
+def _convert_chunk(chunk: ndarray, columns: Optional[List[str]], unscale: bool) -> ndarray:
+    # Convert records read with _read_dtype to the output format
+    if columns is not None:
+        # Drop unused bytes from each record
+        chunk = rfn.repack_fields(chunk)
+    
+    if unscale:
+        chunk = unscale_data(chunk)
+        
+    return chunk
+            
+            
+class ChunkAggregator(object):
+    """Compute running aggregates over chunks of records in a single pass.
+    
+    Aggregates are accumulated per group (e.g., per cycle) and only one 
+    value per group and aggregate is stored, such that memory does not 
+    grow with the number of records.
+    
+    Available aggregates are 'min', 'max', 'sum', 'absmax', 'first', 'last', 
+    'range' (max - min), and 'mean'. The number of records in each group is 
+    always reported in the 'count' column.
+    
+    :param aggs: Mapping of column name to list of aggregate names
+    :type aggs: Dict[str, List[str]]
+    :param group_by: Column by which to group records. If None, aggregate
+        all records together. Defaults to None
+    :type group_by: str, optional
+    
+    Example::
+    
+        # Per-cycle capacity and potential limits
+        agg = ChunkAggregator(
+            {'Ewe/V': ['min', 'max'], 'Q charge/discharge/A.h': ['absmax']},
+            group_by='cycle number'
+        )
+        for chunk in iter_mpr_chunks(file, unscale=True, columns=agg.columns):
+            agg.update(chunk)
+        df = agg.to_frame()
+    """
+    # Base aggregates: (ufunc used to combine values, initial value)
+    _base_aggs = {
+        'min': (np.minimum, np.inf),
+        'max': (np.maximum, -np.inf),
+        'sum': (np.add, 0.0),
+        'absmax': (np.maximum, 0.0),
+    }
+    # Aggregates derived from base aggregates
+    _derived_aggs = {
+        'range': ('min', 'max'),
+        'mean': ('sum',),
+    }
+    _order_aggs = ['first', 'last']
+    
+    def __init__(self, aggs: Dict[str, List[str]], group_by: Optional[str] = None):
+        for col, col_aggs in aggs.items():
+            for agg in col_aggs:
+                if agg not in (list(self._base_aggs) + list(self._derived_aggs) + self._order_aggs):
+                    raise ValueError(f"Invalid aggregate {agg} for column {col}. Options: "
+                                     f"{list(self._base_aggs) + list(self._derived_aggs) + self._order_aggs}")
+        self.aggs = aggs
+        self.group_by = group_by
+        
+        # Aggregates that must be tracked for each column
+        self._tracked = {}
+        for col, col_aggs in aggs.items():
+            tracked = []
+            for agg in col_aggs:
+                for a in self._derived_aggs.get(agg, (agg,)):
+                    if a not in tracked:
+                        tracked.append(a)
+            self._tracked[col] = tracked
+        
+        self._group_rows = {}
+        self._keys = []
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._values = {(col, agg): np.zeros(0) for col, aggs in self._tracked.items() for agg in aggs}
+        
+    @property
+    def columns(self) -> List[str]:
+        """Columns required to compute the aggregates."""
+        columns = list(self.aggs.keys())
+        if self.group_by is not None and self.group_by not in columns:
+            columns.append(self.group_by)
+        return columns
+    
+    @property
+    def num_groups(self) -> int:
+        """Number of groups encountered so far."""
+        return len(self._keys)
+    
+    def _grow(self, num_groups: int):
+        # Extend state arrays to accommodate new groups
+        n_new = num_groups - len(self._counts)
+        self._counts = np.concatenate((self._counts, np.zeros(n_new, dtype=np.int64)))
+        for (col, agg), val in self._values.items():
+            init = self._base_aggs[agg][1] if agg in self._base_aggs else np.nan
+            self._values[col, agg] = np.concatenate((val, np.full(n_new, init)))
+        
+    def update(self, chunk: ndarray):
+        """Add a chunk of records to the running aggregates.
+        
+        :param ndarray chunk: Structured array containing the required columns
+        """
+        if len(chunk) == 0:
+            return
+        
+        if self.group_by is None:
+            chunk_keys = np.zeros(1)
+            inverse = np.zeros(len(chunk), dtype=int)
+            first_index = np.array([0])
+            last_index = np.array([len(chunk) - 1])
+        else:
+            chunk_keys, first_index, inverse = np.unique(chunk[self.group_by], return_index=True,
+                                                         return_inverse=True)
+            inverse = inverse.ravel()
+            last_index = len(chunk) - 1 - np.unique(chunk[self.group_by][::-1], return_index=True)[1]
+            
+        # Map chunk groups to rows of the running state
+        is_new = np.zeros(len(chunk_keys), dtype=bool)
+        rows = np.empty(len(chunk_keys), dtype=int)
+        for k, key in enumerate(chunk_keys.tolist()):
+            row = self._group_rows.get(key)
+            if row is None:
+                row = len(self._keys)
+                self._group_rows[key] = row
+                self._keys.append(key)
+                is_new[k] = True
+            rows[k] = row
+        if len(self._keys) > len(self._counts):
+            self._grow(len(self._keys))
+            
+        self._counts[rows] += np.bincount(inverse, minlength=len(chunk_keys))
+        
+        for col, aggs in self._tracked.items():
+            x = chunk[col].astype(float)
+            for agg in aggs:
+                if agg == 'first':
+                    # Only set for groups that start in this chunk
+                    self._values[col, agg][rows[is_new]] = x[first_index[is_new]]
+                elif agg == 'last':
+                    self._values[col, agg][rows] = x[last_index]
+                else:
+                    ufunc, init = self._base_aggs[agg]
+                    xa = np.abs(x) if agg == 'absmax' else x
+                    # Reduce within the chunk, then combine with running values
+                    chunk_vals = np.full(len(chunk_keys), init)
+                    ufunc.at(chunk_vals, inverse, xa)
+                    self._values[col, agg][rows] = ufunc(self._values[col, agg][rows], chunk_vals)
+                    
+    def result(self) -> Dict[str, ndarray]:
+        """Get the current aggregates.
+        
+        :return: Dict of arrays with one entry per group. Keys are 
+            the group_by column (if grouped), 'count', and '{column}_{agg}'
+            for each requested aggregate
+        :rtype: Dict[str, ndarray]
+        """
+        out = {}
+        if self.group_by is not None:
+            out[self.group_by] = np.array(self._keys)
+        out['count'] = self._counts.copy()
+        
+        for col, aggs in self.aggs.items():
+            for agg in aggs:
+                if agg == 'range':
+                    value = self._values[col, 'max'] - self._values[col, 'min']
+                elif agg == 'mean':
+                    value = self._values[col, 'sum'] / self._counts
+                else:
+                    value = self._values[col, agg].copy()
+                out[f'{col}_{agg}'] = value
+                
+        return out
+    
+    def to_frame(self) -> pd.DataFrame:
+        """Get the current aggregates as a DataFrame.
+        
+        :return: DataFrame with one row per group
+        :rtype: pd.DataFrame
+        """
+        df = pd.DataFrame(self.result())
+        if self.group_by is not None:
+            df = df.set_index(self.group_by)
+        return df
+    
+    
+def aggregate_mpr(
+        file: Union[str, Path, MPRLayout], 
+        aggs: Dict[str, List[str]],
+        group_by: Optional[str] = None,
+        chunk_size: int = 100000,
+        unscale: bool = False,
+        error_on_unknown_column: bool = False) -> pd.DataFrame:
+    """Compute aggregates of .mpr data in a single streaming pass.
+    
+    Only the required columns are read, chunk by chunk, such that peak 
+    memory is independent of the file size. See ChunkAggregator for 
+    available aggregates.
+    
+    :param file: Path to the .mpr file or its layout from read_mpr_layout
+    :type file: str, Path, or MPRLayout
+    :param aggs: Mapping of column name to list of aggregate names, 
+        e.g. {'Ewe/V': ['min', 'max']}
+    :type aggs: Dict[str, List[str]]
+    :param group_by: Column by which to group records, e.g. 'cycle number'.
+        If None, aggregate all records together. Defaults to None
+    :type group_by: str, optional
+    :param int chunk_size: Number of records per chunk. Defaults to 100000
+    :param bool unscale: If True, convert all scaled units (e.g., mA, mV)
+        to base units (A, V) before aggregating. Defaults to False
+    :param bool error_on_unknown_column: If True, raise an error for 
+        unrecognized column IDs. Defaults to False
+    :return: DataFrame of aggregates with one row per group
+    :rtype: pd.DataFrame
+    """
+    aggregator = ChunkAggregator(aggs, group_by=group_by)
+    for chunk in iter_mpr_chunks(file, chunk_size=chunk_size, unscale=unscale, 
+                                 columns=aggregator.columns, 
+                                 error_on_unknown_column=error_on_unknown_column):
+        aggregator.update(chunk)
+        
+    return aggregator.to_frame()
+    
+
+def read_mpr_tail(
+        file: Union[str, Path, MPRLayout], 
+        n_points: Optional[int],
+        unscale: bool = False,
+        columns: Optional[List[str]] = None,
+        error_on_unknown_column: bool = False) -> ndarray:
+    """Read the last n_points records of a .mpr file.
+    
+    Seeks directly to the first requested record, such that the cost 
+    depends only on n_points and not on the length of the file.
+    
+    :param file: Path to the .mpr file or its layout from read_mpr_layout
+    :type file: str, Path, or MPRLayout
+    :param n_points: Number of records to read. If None or not positive, 
+        read all records
+    :type n_points: int or None
+    :param bool unscale: If True, convert all scaled units (e.g., mA, mV)
+        to base units (A, V). Defaults to False
+    :param columns: Columns to read. If None, read all columns. Defaults to None
+    :type columns: List[str], optional
+    :param bool error_on_unknown_column: If True, raise an error for 
+        unrecognized column IDs. Defaults to False
+    :return: Structured array with the last n_points records
+    :rtype: ndarray
+    """
+    if isinstance(file, MPRLayout):
+        layout = file
+    else:
+        layout = read_mpr_layout(file, error_on_unknown_column=error_on_unknown_column)
+        
+    if n_points is None or n_points <= 0:
+        start = 0
+    else:
+        start = max(layout.npts - n_points, 0)
+    count = max(layout.npts - start, 1)
+    
+    chunks = list(iter_mpr_chunks(layout, chunk_size=count, unscale=unscale, columns=columns, start=start))
+    if len(chunks) == 0:
+        # Empty file: return an empty array with the same dtype as for non-empty files
+        return _convert_chunk(np.empty(0, dtype=_read_dtype(layout, columns, unscale)), columns, unscale)
+    return chunks[0]
+
+
+def reduce_mpr_column(
+        file: Union[str, Path, MPRLayout], 
+        column: str,
+        agg: str,
+        unscale: bool = False,
+        chunk_size: int = 100000,
+        error_on_unknown_column: bool = False) -> float:
+    """Reduce a single column of a .mpr file to a scalar in a streaming pass.
+    
+    Only the requested column is kept in memory, one chunk at a time.
+    See ChunkAggregator for available aggregates.
+    
+    :param file: Path to the .mpr file or its layout from read_mpr_layout
+    :type file: str, Path, or MPRLayout
+    :param str column: Column to reduce
+    :param str agg: Aggregate to compute, e.g. 'max' or 'absmax'
+    :param bool unscale: If True, convert all scaled units (e.g., mA, mV)
+        to base units (A, V). Defaults to False
+    :param int chunk_size: Number of records per chunk. Defaults to 100000
+    :param bool error_on_unknown_column: If True, raise an error for 
+        unrecognized column IDs. Defaults to False
+    :return: Aggregated value
+    :rtype: float
+    """
+    aggregator = ChunkAggregator({column: [agg]})
+    for chunk in iter_mpr_chunks(file, chunk_size=chunk_size, unscale=unscale, columns=[column],
+                                 error_on_unknown_column=error_on_unknown_column):
+        aggregator.update(chunk)
+    
+    if aggregator.num_groups == 0:
+        raise ValueError(f"Cannot reduce column {column}: file contains no records")
+    return aggregator.result()[f'{column}_{agg}'][0]
+
+
 # dd = Path(r'J:\Home\AK_Zeier\User\jhuang2\data\echem\240702_NCM_SymIonBlock_50mg')
 
 # mpr = read_mpr(dd.joinpath('CA_10s_C01.mpr'))
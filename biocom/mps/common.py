@@ -4,7 +4,10 @@ This module defines enums and utility functions used throughout the MPS module
 for configuring BioLogic electrochemical devices. It includes control modes,
 voltage/current ranges, device models, and sample types.
 """
+import numpy as np
+from bisect import bisect_right
 from enum import Enum, StrEnum, auto
+from typing import List
 
 
 def to_sentence_case(x: str):
@@ -301,6 +304,14 @@ class BLDeviceModel(StrEnum):
             raise ValueError(f"Filtering is not available for model {self.value}.")
     
     
+# Upper current limit of each current range, from smallest to largest
+_I_RANGE_LIMITS = (1e-8, 1e-7, 1e-6, 10e-6, 100e-6, 1e-3, 1e-2, 1e-1)
+_I_RANGE_OPTIONS = (
+    IRange.n10, IRange.n100, IRange.u1, IRange.u10, IRange.u100, 
+    IRange.m1, IRange.m10, IRange.m100, IRange.a1
+)
+
+
 def get_i_range(i_max: float):
     """Select appropriate current range based on maximum current.
     
@@ -312,26 +323,21 @@ def get_i_range(i_max: float):
     :return: Appropriate current range setting
     :rtype: IRange
     """
-    i_max = abs(i_max)
-    
-    if i_max < 1e-8:
-        return IRange.n10
-    elif i_max < 1e-7:
-        return IRange.n100
-    elif i_max < 1e-6:
-        return IRange.u1
-    elif i_max < 10e-6:
-        return IRange.u10
-    elif i_max < 100e-6:
-        return IRange.u100
-    elif i_max < 1e-3:
-        return IRange.m1
-    elif i_max < 1e-2:
-        return IRange.m10
-    elif i_max < 1e-1:
-        return IRange.m100
-    else:
-        return IRange.a1
+    return _I_RANGE_OPTIONS[bisect_right(_I_RANGE_LIMITS, abs(i_max))]
+
+
+def get_i_ranges(i_max) -> List[IRange]:
+    """Select appropriate current ranges for an array of maximum currents.
+    
+    Vectorized equivalent of get_i_range.
+    
+    :param i_max: Maximum absolute current expected for each entry (A)
+    :type i_max: array-like
+    :return: Appropriate current range setting for each entry
+    :rtype: List[IRange]
+    """
+    index = np.searchsorted(_I_RANGE_LIMITS, np.abs(np.asarray(i_max, dtype=float)), side="right")
+    return [_I_RANGE_OPTIONS[k] for k in np.ravel(index)]
 
 
 class DQUnits(Enum):
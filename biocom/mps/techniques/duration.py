@@ -0,0 +1,256 @@
+"""Runtime estimation for techniques and technique sequences.
+
+This module estimates the expected runtime of techniques and full technique
+sequences, together with lower and upper bounds. Bounds account for limits
+that may end steps early (e.g. voltage limits, dE/dt limits) and for steps
+whose duration is not known in advance (e.g. MB steps without time limits,
+trigger inputs). Step durations are computed as arrays and loops are applied
+as multiplicities, such that sequences with many steps are estimated
+quickly.
+"""
+import numpy as np
+from numpy import ndarray
+import pandas as pd
+from typing import List, Tuple
+
+from ... import units
+from .technique import TechniqueParameters
+from .chrono import CAParameters, CPParameters
+from .eis import _EISParameters
+from .gcpl import GCPLParameters
+from .loop import LoopParameters
+from .mb import MBSequence, MBEISBase, MBLimitType, MBTriggerOut
+from .ocv import OCVParameters
+
+
+class DurationEstimate(object):
+    """Expected runtimes with lower and upper bounds.
+
+    :param names: Name of each entry (e.g. technique abbreviation)
+    :type names: List[str]
+    :param expected: Expected duration of each entry in seconds
+    :type expected: ndarray
+    :param lower: Lower bound of each duration in seconds
+    :type lower: ndarray
+    :param upper: Upper bound of each duration in seconds (may be inf)
+    :type upper: ndarray
+    """
+    def __init__(self, names: List[str], expected: ndarray, lower: ndarray, upper: ndarray):
+        self.names = list(names)
+        self.expected = np.asarray(expected, dtype=float)
+        self.lower = np.asarray(lower, dtype=float)
+        self.upper = np.asarray(upper, dtype=float)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def total_expected(self) -> float:
+        """Total expected duration in seconds."""
+        return float(np.sum(self.expected))
+
+    @property
+    def total_lower(self) -> float:
+        """Lower bound of total duration in seconds."""
+        return float(np.sum(self.lower))
+
+    @property
+    def total_upper(self) -> float:
+        """Upper bound of total duration in seconds (may be inf)."""
+        return float(np.sum(self.upper))
+
+    def timeout(self, rel_margin: float = 0.2, abs_margin: float = 60.0) -> float:
+        """Get a timeout for waiting on the measurement (e.g. for wait_for_channel).
+
+        :param float rel_margin: Relative margin added to the duration. Defaults to 0.2
+        :param float abs_margin: Absolute margin in seconds. Defaults to 60.0
+        :return: Upper bound (or expected duration, if the upper bound is
+            infinite) plus margins
+        :rtype: float
+        """
+        duration = self.total_upper
+        if not np.isfinite(duration):
+            duration = self.total_expected
+        return duration * (1 + rel_margin) + abs_margin
+
+    def to_frame(self) -> pd.DataFrame:
+        """Convert to a table with one row per entry.
+
+        :return: Table with columns name, expected, lower, upper
+        :rtype: pd.DataFrame
+        """
+        return pd.DataFrame({
+            "name": self.names,
+            "expected": self.expected,
+            "lower": self.lower,
+            "upper": self.upper
+        })
+
+
+def _loop_multiplicity(num_steps: int, starts: ndarray, ends: ndarray, repeats: ndarray) -> ndarray:
+    # Number of times each step is run, given loops that repeat steps start:end (exclusive)
+    # an additional `repeats` times. Nested loops multiply, such that log-multiplicities
+    # can be accumulated with a difference array
+    starts = np.asarray(starts, dtype=int)
+    ends = np.asarray(ends, dtype=int)
+    repeats = np.asarray(repeats, dtype=float)
+    valid = (ends > starts) & (repeats > 0)
+
+    log_mult = np.zeros(num_steps + 1)
+    np.add.at(log_mult, starts[valid], np.log1p(repeats[valid]))
+    np.add.at(log_mult, ends[valid], -np.log1p(repeats[valid]))
+    return np.rint(np.exp(np.cumsum(log_mult[:-1])))
+
+
+def _has_limit(values, inactive) -> ndarray:
+    # Steps with an active limit (limit value not in inactive)
+    return np.array([v is not None and v not in inactive for v in values], dtype=bool)
+
+
+def _stepwise_durations(technique) -> Tuple[ndarray, ndarray, ndarray]:
+    # CA, CP, and GCPL: step durations with loop from the last step to goto_ns
+    if isinstance(technique, GCPLParameters):
+        expected = np.asarray(technique.step_durations, dtype=float)
+        for name in ["t_M", "t_R"]:
+            values = getattr(technique, name)
+            if values is not None:
+                expected = expected + np.asarray(values, dtype=float)
+        # Potential limit E_M may end each step early
+        early_stop = np.ones(len(expected), dtype=bool)
+    else:
+        expected = np.asarray(technique.step_durations, dtype=float)
+        if isinstance(technique, CPParameters):
+            early_stop = _has_limit(technique.v_limits, ("pass",)) \
+                | _has_limit(technique.dq_limits, ("pass", 0, 0.0))
+        else:
+            early_stop = _has_limit(technique.i_limits_min, ("pass",)) \
+                | _has_limit(technique.i_limits_max, ("pass",)) \
+                | _has_limit(technique.dq_limits, ("pass", 0, 0.0))
+
+    lower = np.where(early_stop, 0.0, expected)
+
+    mult = _loop_multiplicity(len(expected), [technique.goto_ns], [len(expected)], [technique.nc_cycles])
+    return expected * mult, lower * mult, expected * mult
+
+
+def _mb_time_limit(step, n: int) -> float:
+    # Time limit n of an MB step in seconds
+    value = getattr(step, f"lim{n}_value")
+    unit = getattr(step, f"lim{n}_value_unit")
+    return value * units.TimeUnit.unit_values[unit]
+
+
+def _mb_step_durations(sequence: MBSequence) -> Tuple[ndarray, ndarray, ndarray]:
+    num_steps = len(sequence.mb_list)
+    expected = np.zeros(num_steps)
+    lower = np.zeros(num_steps)
+    upper = np.zeros(num_steps)
+    loop_starts, loop_ends, loop_repeats = [], [], []
+
+    for i, step in enumerate(sequence.mb_list):
+        if step.ctrl_type == "Loop":
+            loop_starts.append(step.ctrl_seq)
+            loop_ends.append(i)
+            loop_repeats.append(step.ctrl_repeat)
+            continue
+
+        if isinstance(step, MBTriggerOut):
+            duration = step.ctrl_TO_t * units.TimeUnit.unit_values[step.ctrl_TO_t_unit]
+            expected[i] = lower[i] = upper[i] = duration
+            continue
+
+        # Limits: time limits bound the step duration; other limits may end it early
+        time_limits = [_mb_time_limit(step, n) for n in range(1, step.lim_nb + 1)
+                       if getattr(step, f"lim{n}_type") == MBLimitType.TIME]
+        other_limits = step.lim_nb > len(time_limits)
+
+        if isinstance(step, MBEISBase):
+            upper[i] = step.expected_duration
+            if len(time_limits) > 0:
+                upper[i] = min(upper[i], min(time_limits))
+            lower[i] = 0 if step.lim_nb > 0 else upper[i]
+        else:
+            # Steps without time limits (or trigger in) run for an unknown duration
+            upper[i] = min(time_limits) if len(time_limits) > 0 else np.inf
+            lower[i] = 0 if other_limits or len(time_limits) == 0 else upper[i]
+        expected[i] = upper[i] if np.isfinite(upper[i]) else lower[i]
+
+    mult = _loop_multiplicity(num_steps, loop_starts, loop_ends, loop_repeats)
+    # Avoid inf * 0 for steps that are never run
+    upper = np.where(mult > 0, upper * mult, 0)
+    return expected * mult, lower * mult, upper
+
+
+def estimate_step_durations(technique: TechniqueParameters) -> Tuple[ndarray, ndarray, ndarray]:
+    """Estimate the duration of each step of a technique, including loops
+    within the technique.
+
+    :param technique: Technique parameters
+    :type technique: TechniqueParameters
+    :return: Tuple of (expected, lower, upper) arrays of step durations in
+        seconds. Techniques without steps are treated as a single step
+    :rtype: Tuple[ndarray, ndarray, ndarray]
+    """
+    if isinstance(technique, (CAParameters, CPParameters, GCPLParameters)):
+        return _stepwise_durations(technique)
+
+    if isinstance(technique, MBSequence):
+        return _mb_step_durations(technique)
+
+    if isinstance(technique, OCVParameters):
+        expected = technique.duration
+        # dE/dt limit may end the rest early
+        lower = 0.0 if technique.dvdt_limit > 0 else expected
+        upper = expected
+    elif isinstance(technique, _EISParameters):
+        expected = technique.condition_time + technique.expected_duration * (technique.repeat + 1)
+        lower = upper = expected
+    elif isinstance(technique, LoopParameters):
+        expected = lower = upper = 0.0
+    elif hasattr(technique, "expected_duration"):
+        expected = lower = upper = technique.expected_duration
+    else:
+        # Unknown duration
+        expected, lower, upper = 0.0, 0.0, np.inf
+
+    return np.array([expected]), np.array([lower]), np.array([upper])
+
+
+def estimate_technique_duration(technique: TechniqueParameters) -> Tuple[float, float, float]:
+    """Estimate the total duration of a technique.
+
+    :param technique: Technique parameters
+    :type technique: TechniqueParameters
+    :return: Tuple of (expected, lower, upper) durations in seconds
+    :rtype: Tuple[float, float, float]
+    """
+    expected, lower, upper = estimate_step_durations(technique)
+    return float(np.sum(expected)), float(np.sum(lower)), float(np.sum(upper))
+
+
+def estimate_sequence_duration(sequence: List[TechniqueParameters]) -> DurationEstimate:
+    """Estimate the duration of each technique in a technique sequence.
+
+    Loop techniques repeat the preceding techniques back to technique
+    goto_Ne (1-indexed) nt additional times. Durations of repeated
+    techniques are multiplied accordingly.
+
+    :param sequence: Technique sequence (e.g. TechniqueSequence)
+    :type sequence: List[TechniqueParameters]
+    :return: Duration estimate for each technique (including repeats)
+    :rtype: DurationEstimate
+    """
+    durations = np.array([estimate_technique_duration(t) for t in sequence], dtype=float).reshape(-1, 3)
+
+    loop_index = [i for i, t in enumerate(sequence) if isinstance(t, LoopParameters)]
+    mult = _loop_multiplicity(
+        len(sequence),
+        [sequence[i].goto_Ne - 1 for i in loop_index],
+        loop_index,
+        [sequence[i].nt for i in loop_index]
+    )
+
+    expected, lower, upper = durations.T * mult
+    upper = np.where(mult > 0, upper, 0)
+    names = [t.abbreviation for t in sequence]
+    return DurationEstimate(names, expected, lower, upper)
@@ -42,6 +42,12 @@ def parse_frequency(f: float):
 
 
 
+# Frequency above which measurement duration is fixed
+_F_CUT = 5
+# Minimum period for frequencies above _F_CUT
+_P_MIN = 0.3
+
+
 def get_freq_duration_scalar(f: float):
     """Get measurement duration for a single frequency.
     
@@ -53,18 +59,53 @@ def get_freq_duration_scalar(f: float):
     :return: Duration in seconds
     :rtype: float
     """
-    # Frequency above which duration is fixed
-    f_cut = 5
-    # Minimum period for frequencies above f_cut
-    p_min = 0.3
     # Effective period
-    return p_min if f > f_cut else 1 / f
+    return _P_MIN if f > _F_CUT else 1 / f
     
 
-get_freq_duration = np.vectorize(get_freq_duration_scalar)
+def get_freq_duration(f):
+    """Get measurement duration for each frequency (vectorized).
+    
+    See get_freq_duration_scalar.
 
+    :param f: Frequencies in Hz
+    :type f: ndarray
+    :return: Durations in seconds
+    :rtype: ndarray
+    """
+    f = np.asarray(f, dtype=float)
+    return np.where(f > _F_CUT, _P_MIN, 1 / f)
 
-def estimate_duration(f_min: float, f_max: float, points: int, average: int, wait: float, point_density: PointDensity = PointDensity.PPD) -> float:
+
+def get_frequencies(f_min: float, f_max: float, points: int, point_density: PointDensity = PointDensity.PPD,
+                    spacing: FrequencySpacing = FrequencySpacing.LOG):
+    """Get the measured frequencies of an EIS sweep.
+
+    :param f_min: Minimum frequency (Hz)
+    :type f_min: float
+    :param f_max: Maximum frequency (Hz)
+    :type f_max: float
+    :param points: Number of points (per decade if PPD, total if TOT)
+    :type points: int
+    :param point_density: Point density mode (default: PPD)
+    :type point_density: PointDensity
+    :param spacing: Frequency spacing (default: LOG)
+    :type spacing: FrequencySpacing
+    :return: Frequencies in Hz, from f_max to f_min
+    :rtype: ndarray
+    """
+    if point_density == PointDensity.PPD:
+        n_decades = np.log10(f_max / f_min)
+        points = int(n_decades * points) + 1
+        
+    if spacing == FrequencySpacing.LIN:
+        return np.linspace(f_max, f_min, points)
+    return np.logspace(np.log10(f_max), np.log10(f_min), points)
+
+
+def estimate_duration(f_min: float, f_max: float, points: int, average: int, wait: float, 
+                      point_density: PointDensity = PointDensity.PPD, 
+                      spacing: FrequencySpacing = FrequencySpacing.LOG) -> float:
     """Estimate the duration of an EIS measurement.
 
     :param f_min: Minimum frequency (Hz)
@@ -79,16 +120,12 @@ def estimate_duration(f_min: float, f_max: float, points: int, average: int, wai
     :type wait: float
     :param point_density: Point density mode (default: PPD)
     :type point_density: PointDensity
+    :param spacing: Frequency spacing (default: LOG)
+    :type spacing: FrequencySpacing
     :return: Total duration in seconds
     :rtype: float
     """
-    if point_density == PointDensity.PPD:
-        n_decades = np.log10(f_max / f_min)
-        points = int(n_decades * points) + 1
-    
-    freq = np.logspace(f_max, f_min, points)
-        
-    
+    freq = get_frequencies(f_min, f_max, points, point_density, spacing)
     durations = get_freq_duration(freq) * (average + wait)
     return np.sum(durations)
     
@@ -180,7 +217,8 @@ class _EISParameters(TechniqueParameters):
     # @staticmethod
     @property
     def expected_duration(self):
-        return estimate_duration(self.f_min, self.f_max, self.points, self.average, self.wait, point_density=self.point_density)
+        return estimate_duration(self.f_min, self.f_max, self.points, self.average, self.wait, 
+                                 point_density=self.point_density, spacing=self.spacing)
     
     @property
     def _condition_time_formatted(self):
@@ -13,7 +13,7 @@ from typing import Union, Optional, List
 from .stepwise import StepwiseTechniqueParameters
 
 from ..common import (
-    IVs, get_i_range, DQUnits
+    IVs, get_i_ranges, DQUnits
 )
 from ..config import FullConfiguration, BatteryCharacteristics
 from .technique import (
@@ -206,7 +206,7 @@ class GCPLParameters(HardwareParameters, _GCPLParameters, StepwiseTechniqueParam
         
         # Set IRange automatically
         if self.i_range is None:
-            self.i_range = [get_i_range(abs(i)) for i in self.step_i_A]
+            self.i_range = get_i_ranges(self.step_i_A)
     
     
     def __post_init__(self):
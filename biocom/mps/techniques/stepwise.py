@@ -28,8 +28,8 @@ def process_list_values(vals: list, base_unit: Optional[str], replace_none=None)
     :return: Tuple of (scaled_values, unit_strings)
     :rtype: Tuple[list, list]
     """
-    scaled_vals = [units.get_scaled_value(v) for v in vals]
-    unit = [units.get_prefix_char(v) + base_unit for v in vals]
+    scaled_vals, prefixes = units.get_scaled_values_and_prefixes(vals)
+    unit = [p + base_unit for p in prefixes]
     
     if replace_none is not None:
         # Replace Nones with specified value
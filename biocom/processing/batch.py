@@ -0,0 +1,253 @@
+"""Parallel batch processing of chrono data files.
+
+Runs the read_mpr -> downsample_data -> process_ivt_simple pipeline over
+many .mpr files using a process pool. Files are scheduled in chunks, and
+decimated arrays are returned to the parent process through shared memory
+rather than by pickling.
+"""
+
+import os
+import warnings
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from typing import Union, Optional, List
+
+from ..mpr import read_mpr
+from .chrono import ControlMode, downsample_data, process_ivt_simple
+
+
+FilePath = Union[str, Path]
+
+# Rows of the shared output block for each file
+_OUTPUT_ROWS = ["time/s", "I/A", "Ewe/V", "sample_index"]
+
+
+def read_ivt(file: FilePath):
+    """Read time, current, and voltage arrays from a .mpr file.
+
+    :param file: Path to the .mpr file
+    :type file: str or Path
+    :return: Tuple of (times, i_signal, v_signal)
+    :rtype: Tuple[ndarray, ndarray, ndarray]
+    """
+    mpr = read_mpr(Path(file), unscale=True)
+
+    if "<I>/A" in mpr.data.dtype.fields.keys():
+        i_field = "<I>/A"
+    else:
+        i_field = "I/A"
+
+    return mpr.data["time/s"], mpr.data[i_field], mpr.data["Ewe/V"]
+
+
+def process_chrono_file(
+        file: FilePath,
+        mode: ControlMode,
+        downsample_kw: Optional[dict] = None,
+        ivt_kw: Optional[dict] = None):
+    """Downsample and process a single chrono data file.
+
+    :param file: Path to the .mpr file
+    :type file: str or Path
+    :param mode: Control mode
+    :type mode: ControlMode
+    :param downsample_kw: Keyword arguments for downsample_data. Defaults to None
+    :type downsample_kw: dict, optional
+    :param ivt_kw: Keyword arguments for process_ivt_simple. Defaults to None
+    :type ivt_kw: dict, optional
+    :return: Tuple of ((times, i, v), sample_index, LinearIV)
+    :rtype: tuple
+    """
+    if downsample_kw is None:
+        downsample_kw = {}
+    if ivt_kw is None:
+        ivt_kw = {}
+
+    times, i_signal, v_signal = read_ivt(file)
+    sample_data, sample_index = downsample_data(times, i_signal, v_signal, mode, **downsample_kw)
+    iv = process_ivt_simple(times, i_signal, v_signal, mode, **ivt_kw)
+
+    return sample_data, sample_index, iv
+
+
+def _process_chunk(files, modes, shm_name, capacity, downsample_kw, ivt_kw):
+    # Worker: process a chunk of files and write decimated arrays to the shared output block.
+    # Returns per-file summaries. Output that exceeds capacity is returned directly
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray((len(files), len(_OUTPUT_ROWS), capacity), dtype=float, buffer=shm.buf)
+        results = []
+        for k, (file, mode) in enumerate(zip(files, modes)):
+            try:
+                (times, i_signal, v_signal), sample_index, iv = process_chrono_file(
+                    file, mode, downsample_kw, ivt_kw
+                )
+            except Exception as err:
+                results.append({"error": f"{type(err).__name__}: {err}"})
+                continue
+
+            arrays = np.array([times, i_signal, v_signal, sample_index], dtype=float)
+            result = {"n": arrays.shape[1], "iv": (iv.i_mid, iv.v_mid, iv.dvdi)}
+            if arrays.shape[1] <= capacity:
+                out[k, :, :arrays.shape[1]] = arrays
+            else:
+                result["arrays"] = arrays
+            results.append(result)
+        del out
+    finally:
+        shm.close()
+
+    return results
+
+
+def process_chrono_files(
+        files: List[FilePath],
+        modes: Union[ControlMode, List[ControlMode]],
+        max_workers: Optional[int] = None,
+        chunk_size: int = 8,
+        capacity: Optional[int] = None,
+        downsample_kw: Optional[dict] = None,
+        ivt_kw: Optional[dict] = None,
+        errors: str = "warn") -> pd.DataFrame:
+    """Downsample and process many chrono data files in parallel.
+
+    Each file is read with read_mpr, downsampled with downsample_data, and
+    processed with process_ivt_simple. Files are distributed to a process pool
+    in chunks of chunk_size files. For each chunk, the parent process allocates
+    a shared memory block in which workers write the decimated arrays, such
+    that only small summaries are pickled.
+
+    :param files: Paths to .mpr files
+    :type files: List[str or Path]
+    :param modes: Control mode for all files, or for each file
+    :type modes: ControlMode or List[ControlMode]
+    :param max_workers: Number of worker processes. If None, use the number of CPUs.
+        If 1, process files serially in the current process. Defaults to None
+    :type max_workers: Optional[int]
+    :param int chunk_size: Number of files per task. Defaults to 8
+    :param capacity: Number of decimated samples reserved per file in shared
+        memory. Larger outputs are returned by pickling. If None, set to twice the
+        target_size of downsample_data. Defaults to None
+    :type capacity: Optional[int]
+    :param downsample_kw: Keyword arguments for downsample_data. Defaults to None
+    :type downsample_kw: dict, optional
+    :param ivt_kw: Keyword arguments for process_ivt_simple. Defaults to None
+    :type ivt_kw: dict, optional
+    :param str errors: How to handle files that cannot be processed: 'warn',
+        'ignore', or 'raise'. Defaults to 'warn'
+    :return: Table with one row per decimated sample. Columns: file, time/s, I/A,
+        Ewe/V, sample_index, and the LinearIV parameters i_mid, v_mid, and dvdi of
+        the file
+    :rtype: pd.DataFrame
+    """
+    if errors not in ("warn", "ignore", "raise"):
+        raise ValueError(f"Invalid errors argument {errors}. Options: 'warn', 'ignore', 'raise'")
+
+    files = [str(f) for f in files]
+    if isinstance(modes, ControlMode):
+        modes = [modes] * len(files)
+    if len(modes) != len(files):
+        raise ValueError(f"Length of modes ({len(modes)}) does not match length of files ({len(files)})")
+
+    if downsample_kw is None:
+        downsample_kw = {}
+    if ivt_kw is None:
+        ivt_kw = {}
+    if capacity is None:
+        capacity = 2 * downsample_kw.get("target_size", 1000)
+
+    file_results = {}
+
+    if max_workers == 1:
+        for file, mode in zip(files, modes):
+            try:
+                (times, i_signal, v_signal), sample_index, iv = process_chrono_file(
+                    file, mode, downsample_kw, ivt_kw
+                )
+                arrays = np.array([times, i_signal, v_signal, sample_index], dtype=float)
+                file_results[file] = {"iv": (iv.i_mid, iv.v_mid, iv.dvdi), "arrays": arrays}
+            except Exception as err:
+                file_results[file] = {"error": f"{type(err).__name__}: {err}"}
+    else:
+        chunks = iter([(files[k:k + chunk_size], modes[k:k + chunk_size])
+                       for k in range(0, len(files), chunk_size)])
+        # Limit the number of chunks in flight, such that shared memory use scales
+        # with the number of workers rather than the number of files
+        max_in_flight = max_workers if max_workers is not None else (os.cpu_count() or 1)
+
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {}
+
+            def submit_next():
+                # Allocate the shared output block and submit the next chunk
+                for chunk_files, chunk_modes in chunks:
+                    shm = shared_memory.SharedMemory(
+                        create=True, size=len(chunk_files) * len(_OUTPUT_ROWS) * capacity * 8
+                    )
+                    try:
+                        future = executor.submit(_process_chunk, chunk_files, chunk_modes, shm.name, capacity,
+                                                 downsample_kw, ivt_kw)
+                    except Exception as err:
+                        # Pool is broken: record the error for each file in the chunk
+                        shm.close()
+                        shm.unlink()
+                        for file in chunk_files:
+                            file_results[file] = {"error": f"{type(err).__name__}: {err}"}
+                        continue
+                    futures[future] = (chunk_files, shm)
+                    return
+
+            try:
+                for _ in range(max_in_flight):
+                    submit_next()
+
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        chunk_files, shm = futures.pop(future)
+                        try:
+                            results = future.result()
+                            out = np.ndarray((len(chunk_files), len(_OUTPUT_ROWS), capacity), dtype=float,
+                                             buffer=shm.buf)
+                            for k, (file, result) in enumerate(zip(chunk_files, results)):
+                                if "n" in result and "arrays" not in result:
+                                    result["arrays"] = out[k, :, :result["n"]].copy()
+                                file_results[file] = result
+                            del out
+                        except Exception as err:
+                            # Worker failure (e.g. crashed process): record the error for each file in the chunk
+                            for file in chunk_files:
+                                file_results[file] = {"error": f"{type(err).__name__}: {err}"}
+                        finally:
+                            shm.close()
+                            shm.unlink()
+                        submit_next()
+            finally:
+                for _, shm in futures.values():
+                    shm.close()
+                    shm.unlink()
+
+    # Collect results in input order
+    frames = []
+    for file in files:
+        result = file_results[file]
+        if "error" in result:
+            if errors == "raise":
+                raise RuntimeError(f"Could not process {file}: {result['error']}")
+            elif errors == "warn":
+                warnings.warn(f"Could not process {file}: {result['error']}")
+            continue
+
+        df = pd.DataFrame(dict(zip(_OUTPUT_ROWS, result["arrays"])))
+        df["sample_index"] = df["sample_index"].astype(int)
+        df.insert(0, "file", file)
+        df["i_mid"], df["v_mid"], df["dvdi"] = result["iv"]
+        frames.append(df)
+
+    if len(frames) == 0:
+        return pd.DataFrame(columns=["file"] + _OUTPUT_ROWS + ["i_mid", "v_mid", "dvdi"])
+
+    return pd.concat(frames, ignore_index=True)
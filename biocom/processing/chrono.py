@@ -5,26 +5,31 @@ chrono techniques, including step detection, impedance extraction, and
 downsampling with anti-aliasing.
 """
 
+import threading
+import warnings
 import numpy as np
 from numpy import ndarray
 from enum import Enum, StrEnum
-from typing import Optional, Union, Tuple
+from typing import Optional, Union, Tuple, List
 
 from .sampling import (
-    find_steps, split_steps, step_times2index, segment_step_values,
+    find_steps, step_times2index, segment_step_values,
     remove_short_samples, select_decimation_interval,
-    get_decimation_index, filter_chrono_signals
+    get_decimation_index, filter_chrono_signals, segment_reduce, _step_bounds
 )
 
-from .iv import LinearIV
+from .iv import LinearIV, LinearIVArray
+from .relaxation import get_step_sizes, fit_step_relaxation
 
 try:
     from hybdrt.models import DRT
     _drt_available = True
-    _drt = None
 except ModuleNotFoundError:
     _drt_available = False
 
+# DRT instances hold fit state and are not thread-safe. Keep one instance per thread
+_drt_local = threading.local()
+
 
 class ControlMode(StrEnum):
     """Electrochemical control mode.
@@ -100,32 +105,27 @@ def get_dc_step_values(
     else:
         step_index = step_times2index(times, step_times)
         
+    bounds = _step_bounds(len(times), step_index)
+    starts, ends = bounds[:-1], bounds[1:]
+        
     if use_longest_step:
-        step_durations = np.array([ts[-1] - ts[0] for ts in split_steps(times, step_index)])
+        step_durations = times[ends - 1] - times[starts]
         # Get unique input signal values
         sin_rnd_vals = segment_step_values(s_in, step_index)
-        sin_unique = np.unique(sin_rnd_vals)
-        # Find the longest step for each input signal value
-        long_step_index = []
-        for si in sin_unique:
-            index = np.where(sin_rnd_vals == si)[0]
-            long_step_index.append(index[np.argmax(step_durations[index])])
-    else:
-        long_step_index = None
+        # Find the longest step for each input signal value.
+        # Sort by value, then by descending duration; stable sort selects the first step in case of ties
+        order = np.lexsort((-step_durations, sin_rnd_vals))
+        is_first = np.concatenate(([True], sin_rnd_vals[order][1:] != sin_rnd_vals[order][:-1]))
+        long_step_index = order[is_first]
+        # Only use the longest step at each value
+        starts, ends = starts[long_step_index], ends[long_step_index]
         
-    def agg_window(x):
-        # Aggregate points from the end of the data segment
-        n_agg = max(min_agg_points, int(len(x) * window_fraction))
-        return getattr(np, agg)(x[-n_agg:])
+    # Aggregate points from the end of each step
+    n_agg = np.maximum(min_agg_points, ((ends - starts) * window_fraction).astype(int))
+    window_starts = np.maximum(ends - n_agg, starts)
     
     # Estimate steady-state i and v values from the end of each step
-    step_agg_vals = []
-    for sig in (i_signal, v_signal):
-        s_split = split_steps(sig, step_index)
-        if long_step_index is not None:
-            # Only use the longest step at each value
-            s_split = [s_split[i] for i in long_step_index]
-        step_agg_vals.append(np.array([agg_window(s) for s in s_split]))
+    step_agg_vals = list(segment_reduce(np.array([i_signal, v_signal]), window_starts, ends, agg))
         
     return step_agg_vals
     
@@ -184,6 +184,147 @@ def process_ivt_simple(
     return LinearIV(i_mid, v_mid, dvdi)
 
 
+def process_ivt_simple_batch(
+        times: Union[ndarray, List[ndarray]], 
+        i_signals: Union[ndarray, List[ndarray]], 
+        v_signals: Union[ndarray, List[ndarray]],
+        mode: ControlMode,
+        step_times: Optional[Union[list, ndarray]] = None,
+        window_fraction: float = 0.1,
+        min_agg_points: int = 5,
+        agg: str = 'median',
+        use_longest_step: bool = True,
+        rel_precision: float = 0.05
+        ) -> LinearIVArray:
+    """Process many I-V-t datasets using simple steady-state extraction.
+    
+    Batch equivalent of process_ivt_simple. Datasets may be given as 2D 
+    stacks of signals on a common time base, or as lists of arrays. For a 
+    common time base, step indices are determined once for all datasets 
+    (from step_times, or detected in the input signal of the first dataset). 
+    For lists, steps are located in each dataset separately, using 
+    step_times if given. Step aggregation and linear fits are performed 
+    for all datasets at once.
+    
+    :param times: Common time array, or list of time arrays for each dataset
+    :type times: Union[ndarray, List[ndarray]]
+    :param i_signals: 2D array (datasets x samples) or list of current signal arrays
+    :type i_signals: Union[ndarray, List[ndarray]]
+    :param v_signals: 2D array (datasets x samples) or list of voltage signal arrays
+    :type v_signals: Union[ndarray, List[ndarray]]
+    :param mode: Control mode
+    :type mode: ControlMode
+    :param step_times: Explicit step times shared by all datasets (if None, auto-detect)
+    :type step_times: Optional[Union[list, ndarray]]
+    :param window_fraction: Fraction of step to use for aggregation
+    :type window_fraction: float
+    :param min_agg_points: Minimum points to aggregate per step
+    :type min_agg_points: int
+    :param agg: Aggregation function name
+    :type agg: str
+    :param use_longest_step: Use only the longest step at each control value
+    :type use_longest_step: bool
+    :param rel_precision: Relative precision for grouping steps by control 
+        value (see segment_step_values)
+    :type rel_precision: float
+    :return: Linear I-V model for each dataset
+    :rtype: LinearIVArray
+    """
+    common_time = isinstance(times, ndarray) and times.ndim == 1
+    if common_time:
+        times = [times] * len(i_signals)
+    if not (len(times) == len(i_signals) == len(v_signals)):
+        raise ValueError("times, i_signals, and v_signals must have the same number of datasets")
+    
+    num_datasets = len(times)
+    lengths = np.array([len(t) for t in times])
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+    
+    # Concatenate all datasets such that segments from all datasets can be reduced at once
+    t_cat = np.concatenate(times)
+    i_cat = np.concatenate([np.asarray(i, dtype=float) for i in i_signals])
+    v_cat = np.concatenate([np.asarray(v, dtype=float) for v in v_signals])
+    s_in_cat, _ = get_io_signals(i_cat, v_cat, mode)
+    
+    # Identify steps in the input signal
+    def get_step_index(k):
+        if step_times is None:
+            return find_steps(s_in_cat[offsets[k]:offsets[k + 1]], allow_consecutive=False)
+        return step_times2index(times[k], step_times)
+    
+    if common_time:
+        shared_bounds = _step_bounds(lengths[0], get_step_index(0))
+        bounds = [shared_bounds] * num_datasets
+    else:
+        bounds = [_step_bounds(lengths[k], get_step_index(k)) for k in range(num_datasets)]
+        
+    starts = np.concatenate([b[:-1] + offsets[k] for k, b in enumerate(bounds)])
+    ends = np.concatenate([b[1:] + offsets[k] for k, b in enumerate(bounds)])
+    dataset_index = np.repeat(np.arange(num_datasets), [len(b) - 1 for b in bounds])
+    
+    if use_longest_step:
+        step_durations = t_cat[ends - 1] - t_cat[starts]
+        # Round step values to a fraction of the smallest step in each dataset
+        step_vals = segment_reduce(s_in_cat, starts, ends, "median")
+        same_dataset = dataset_index[1:] == dataset_index[:-1]
+        abs_prec = np.full(num_datasets, np.inf)
+        np.minimum.at(abs_prec, dataset_index[1:][same_dataset], np.abs(np.diff(step_vals))[same_dataset])
+        abs_prec = rel_precision * abs_prec[dataset_index]
+        sin_rnd_vals = np.floor(np.abs(step_vals) / abs_prec) * abs_prec * np.sign(step_vals)
+        
+        # Find the longest step for each input signal value in each dataset
+        order = np.lexsort((-step_durations, sin_rnd_vals, dataset_index))
+        is_first = np.concatenate(([True], 
+                                   (sin_rnd_vals[order][1:] != sin_rnd_vals[order][:-1]) 
+                                   | (dataset_index[order][1:] != dataset_index[order][:-1])))
+        long_step_index = order[is_first]
+        starts, ends, dataset_index = starts[long_step_index], ends[long_step_index], dataset_index[long_step_index]
+        
+    # Aggregate points from the end of each step
+    n_agg = np.maximum(min_agg_points, ((ends - starts) * window_fraction).astype(int))
+    window_starts = np.maximum(ends - n_agg, starts)
+    i_vals, v_vals = segment_reduce(np.array([i_cat, v_cat]), window_starts, ends, agg)
+    
+    # Batched linear least-squares fit of v vs. i
+    counts = np.bincount(dataset_index, minlength=num_datasets)
+    i_mean = np.bincount(dataset_index, i_vals, num_datasets) / counts
+    v_mean = np.bincount(dataset_index, v_vals, num_datasets) / counts
+    i_dev = i_vals - i_mean[dataset_index]
+    v_dev = v_vals - v_mean[dataset_index]
+    dvdi = np.bincount(dataset_index, i_dev * v_dev, num_datasets) \
+        / np.bincount(dataset_index, i_dev ** 2, num_datasets)
+    
+    # Estimate midpoint (i, v) coordinates
+    if common_time:
+        i_mid = getattr(np, agg)(i_cat.reshape(num_datasets, -1), axis=-1)
+    else:
+        i_mid = segment_reduce(i_cat, offsets[:-1], offsets[1:], agg)
+    v_mid = v_mean + (i_mid - i_mean) * dvdi
+    
+    return LinearIVArray(i_mid, v_mid, dvdi)
+
+
+
+def get_thread_drt():
+    """Get the DRT instance for the current thread.
+    
+    The instance is created on first use in each thread and reused for 
+    subsequent fits in that thread.
+    
+    :return: DRT instance
+    :rtype: hybdrt.models.DRT
+    :raises RuntimeError: If hybrid-drt package is not installed
+    """
+    if not _drt_available:
+        raise RuntimeError("hybrid-drt must be installed to create a DRT instance")
+    
+    drt = getattr(_drt_local, "drt", None)
+    if drt is None:
+        # Initialize DRT instance for data processing
+        drt = DRT()
+        _drt_local.drt = drt
+    return drt
+
 
 def process_ivt_drt(times, 
         i_signal, 
@@ -191,11 +332,17 @@ def process_ivt_drt(times,
         mode: ControlMode,
         remove_short: bool = False,
         fit_kw = None,
+        drt = None,
+        solver: str = "auto",
         ) -> LinearIV:
     """Process I-V-t data using Distribution of Relaxation Times (DRT) analysis.
     
-    Uses hybrid-drt package to fit transient response and extract impedance
-    at the lowest frequency (longest time scale).
+    Fits the transient response and extracts impedance at the lowest 
+    frequency (longest time scale). With solver='hybdrt', the hybrid-drt 
+    package is used. With solver='native', a lightweight regularized 
+    least-squares fit on a fixed tau grid is used (see 
+    relaxation.fit_step_relaxation), which is much faster and does not 
+    require hybrid-drt.
     
     :param times: Time array
     :type times: ndarray
@@ -209,22 +356,43 @@ def process_ivt_drt(times,
     :type remove_short: bool
     :param fit_kw: Keyword arguments for DRT fitting
     :type fit_kw: dict, optional
+    :param drt: DRT instance to use for fitting. If None, use an instance 
+        local to the current thread, such that concurrent calls from 
+        different threads do not share fit state
+    :type drt: hybdrt.models.DRT, optional
+    :param solver: Fitting backend: 'hybdrt', 'native', or 'auto'. If 
+        'auto', use hybrid-drt if installed, otherwise warn and use the
+        native solver. 
+        For the native solver, fit_kw may contain 'downsample' (bool), 
+        'downsample_kw' (keyword arguments for downsample_data), and keyword 
+        arguments for relaxation.fit_step_relaxation
+    :type solver: str
     :return: Linear I-V model with impedance from DRT
     :rtype: LinearIV
-    :raises RuntimeError: If hybrid-drt package is not installed
+    :raises RuntimeError: If solver is 'hybdrt' and hybrid-drt package is not installed
     """
+    if solver == "auto":
+        if _drt_available:
+            solver = "hybdrt"
+        else:
+            warnings.warn("hybrid-drt is not installed. Falling back to the native DRT solver")
+            solver = "native"
     
-    if not _drt_available:
-        raise RuntimeError("hybrid-drt must be installed to call process_ivt_drt")
+    if solver not in ("hybdrt", "native"):
+        raise ValueError(f"Invalid solver {solver}. Options: 'hybdrt', 'native', 'auto'")
     
-    global _drt
-    if _drt is None:
-        # Initialize DRT instance for data processing
-        _drt = DRT()
+    if solver == "hybdrt" and not _drt_available:
+        raise RuntimeError("hybrid-drt must be installed to call process_ivt_drt")
         
     # Remove short time steps
     if remove_short:
         times, i_signal, v_signal = remove_short_samples(times, np.array([times, i_signal, v_signal]).T).T
+        
+    if solver == "native":
+        return _process_ivt_relaxation(times, i_signal, v_signal, mode, fit_kw)
+    
+    if drt is None:
+        drt = get_thread_drt()
     
     if fit_kw is None:
         fit_kw = {
@@ -243,15 +411,15 @@ def process_ivt_drt(times,
     
     f_long = (2 * np.pi * (times[-1] - times[0])) ** -1
     if mode == ControlMode.POT:
-        _drt.fit_chrono(times, v_signal, i_signal, nonneg=False, **fit_kw)
-        z_tot = _drt.predict_z(np.array([f_long]))[0] ** -1
-        iv.i_mid = _drt.fit_parameters["v_baseline"]
+        drt.fit_chrono(times, v_signal, i_signal, nonneg=False, **fit_kw)
+        z_tot = drt.predict_z(np.array([f_long]))[0] ** -1
+        iv.i_mid = drt.fit_parameters["v_baseline"]
         # print("Updated i_mid: {:.2e}".format(iv.i_mid))
         
     else:
-        _drt.fit_chrono(times, i_signal, v_signal, **fit_kw)
-        z_tot = _drt.predict_z(np.array([f_long]))[0]
-        iv.v_mid = _drt.fit_parameters["v_baseline"]
+        drt.fit_chrono(times, i_signal, v_signal, **fit_kw)
+        z_tot = drt.predict_z(np.array([f_long]))[0]
+        iv.v_mid = drt.fit_parameters["v_baseline"]
         # print("Updated v_mid: {:.2e}".format(iv.v_mid))
         
     # _drt.plot_results()
@@ -263,6 +431,44 @@ def process_ivt_drt(times,
     return iv
 
 
+def _process_ivt_relaxation(times, i_signal, v_signal, mode: ControlMode, fit_kw=None) -> LinearIV:
+    # Native fast path for process_ivt_drt
+    fit_kw = {} if fit_kw is None else dict(fit_kw)
+    downsample = fit_kw.pop("downsample", True)
+    # The least-squares fit averages out noise, such that anti-aliasing is not needed
+    downsample_kw = {"target_size": 200, "antialiased": False, "remove_outliers": False}
+    downsample_kw.update(fit_kw.pop("downsample_kw", {}))
+    
+    iv = process_ivt_simple(times, i_signal, v_signal, mode)
+    
+    # Step sizes are determined from the full input signal
+    s_in, _ = get_io_signals(i_signal, v_signal, mode)
+    step_index = find_steps(s_in, allow_consecutive=False)
+    step_sizes, x_ref = get_step_sizes(s_in, step_index)
+    step_times = times[step_index]
+    
+    if downsample:
+        (times, i_signal, v_signal), _ = downsample_data(
+            times, i_signal, v_signal, mode, step_index=step_index, **downsample_kw
+        )
+    
+    s_in, s_out = get_io_signals(i_signal, v_signal, mode)
+    # Admittance distribution is not constrained to be non-negative
+    fit_kw.setdefault("nonneg", mode == ControlMode.GALV)
+    fit = fit_step_relaxation(times, s_in, s_out, step_times, step_sizes, x_ref, **fit_kw)
+    
+    f_long = (2 * np.pi * (times[-1] - times[0])) ** -1
+    z_tot = fit.predict_z(f_long)[0]
+    if mode == ControlMode.POT:
+        z_tot = z_tot ** -1
+        iv.i_mid = fit.predict_steady_state(iv.v_mid)
+    else:
+        iv.v_mid = fit.predict_steady_state(iv.i_mid)
+    
+    iv.dvdi = np.abs(z_tot)
+    return iv
+
+
 def downsample_data(
         times: ndarray, 
         i_signal: ndarray, 
@@ -342,11 +548,9 @@ def downsample_data(
     t_sample = np.median(np.diff(times))
     
     if target_size is not None:
-        decimation_interval = -1
-        while decimation_interval == -1:
-            decimation_interval = select_decimation_interval(times, step_index, t_sample, init_samples,
-                                                                decimation_factor, max_interval,
-                                                                target_size)
+        decimation_interval = select_decimation_interval(times, step_index, t_sample, init_samples,
+                                                         decimation_factor, max_interval,
+                                                         target_size)
     # print(decimation_interval)
     sample_index = get_decimation_index(times, step_index, t_sample, init_samples, decimation_interval,
                                         decimation_factor, max_interval)
@@ -0,0 +1,239 @@
+"""Parallel DRT fitting with result memoization.
+
+Provides a pool of DRT fitters for running process_ivt_drt on many
+datasets concurrently (e.g. one per channel), and an LRU cache keyed by a
+hash of the data content and fit settings, such that repeated analyses of
+the same data are not re-fit.
+"""
+
+import hashlib
+import json
+import threading
+import numpy as np
+from numpy import ndarray
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, List, Tuple
+
+from .chrono import ControlMode, process_ivt_drt
+from .iv import LinearIV
+
+
+def hash_ivt_data(times: ndarray, i_signal: ndarray, v_signal: ndarray, **params) -> str:
+    """Get a content hash of I-V-t data and processing parameters.
+
+    :param times: Time array
+    :type times: ndarray
+    :param i_signal: Current signal array
+    :type i_signal: ndarray
+    :param v_signal: Voltage signal array
+    :type v_signal: ndarray
+    :param params: Processing parameters. Must be JSON-serializable or have a stable repr
+    :return: Hex digest
+    :rtype: str
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    for arr in (times, i_signal, v_signal):
+        arr = np.ascontiguousarray(arr)
+        hasher.update(str((arr.dtype.str, arr.shape)).encode())
+        hasher.update(arr)
+    hasher.update(json.dumps(params, sort_keys=True, default=repr).encode())
+    return hasher.hexdigest()
+
+
+def _copy_iv(iv: LinearIV) -> LinearIV:
+    return LinearIV(iv.i_mid, iv.v_mid, iv.dvdi)
+
+
+class LRUResultCache(object):
+    """Thread-safe least-recently-used cache of LinearIV results.
+
+    :param int maxsize: Maximum number of results to store. Defaults to 128
+    """
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key: str) -> Optional[LinearIV]:
+        """Get a cached result.
+
+        :param str key: Result key
+        :return: Copy of the cached result, or None if not cached
+        :rtype: Optional[LinearIV]
+        """
+        with self._lock:
+            iv = self._data.get(key)
+            if iv is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return _copy_iv(iv)
+
+    def put(self, key: str, iv: LinearIV):
+        """Store a result, evicting the least recently used result if full.
+
+        :param str key: Result key
+        :param LinearIV iv: Result to store
+        """
+        with self._lock:
+            self._data[key] = _copy_iv(iv)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Remove all cached results."""
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def _fit_ivt_drt(times, i_signal, v_signal, mode, remove_short, fit_kw):
+    # Worker function. Each worker thread or process uses its own DRT instance
+    return process_ivt_drt(times, i_signal, v_signal, mode, remove_short=remove_short, fit_kw=fit_kw)
+
+
+class DRTFitterPool(object):
+    """Pool of DRT fitters for concurrent process_ivt_drt calls.
+
+    Each worker uses its own DRT instance (see chrono.get_thread_drt). With
+    use_processes=True, fits run in separate processes for true parallelism;
+    otherwise, fits run in threads. Results are cached by a hash of the data
+    and fit settings, and identical requests that are already running share
+    a single fit.
+
+    :param max_workers: Number of workers. If None, use the executor default. Defaults to None
+    :type max_workers: Optional[int]
+    :param bool use_processes: If True, use a process pool. Defaults to False
+    :param cache: Result cache. If None, a new LRUResultCache is created. Defaults to None
+    :type cache: Optional[LRUResultCache]
+    :param int cache_size: Size of the new cache if cache is None. Defaults to 128
+    """
+    def __init__(
+            self,
+            max_workers: Optional[int] = None,
+            use_processes: bool = False,
+            cache: Optional[LRUResultCache] = None,
+            cache_size: int = 128):
+
+        if use_processes:
+            self._executor = ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="drt")
+
+        if cache is None:
+            cache = LRUResultCache(cache_size)
+        self.cache = cache
+
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def shutdown(self, wait: bool = True):
+        """Shut down the worker pool.
+
+        :param bool wait: Wait for running fits to finish. Defaults to True
+        """
+        self._executor.shutdown(wait=wait)
+
+    def submit(
+            self,
+            times: ndarray,
+            i_signal: ndarray,
+            v_signal: ndarray,
+            mode: ControlMode,
+            remove_short: bool = False,
+            fit_kw: Optional[dict] = None) -> Future:
+        """Submit data for processing with process_ivt_drt.
+
+        :param times: Time array
+        :type times: ndarray
+        :param i_signal: Current signal array
+        :type i_signal: ndarray
+        :param v_signal: Voltage signal array
+        :type v_signal: ndarray
+        :param mode: Control mode
+        :type mode: ControlMode
+        :param bool remove_short: Remove short time steps before processing
+        :param fit_kw: Keyword arguments for DRT fitting
+        :type fit_kw: dict, optional
+        :return: Future whose result is a LinearIV
+        :rtype: Future
+        """
+        key = hash_ivt_data(times, i_signal, v_signal, mode=str(mode), remove_short=remove_short,
+                            fit_kw=fit_kw)
+
+        iv = self.cache.get(key)
+        if iv is not None:
+            future = Future()
+            future.set_result(iv)
+            return future
+
+        with self._lock:
+            if key in self._pending:
+                # Identical fit already running
+                return self._chain(self._pending[key])
+
+            future = self._executor.submit(_fit_ivt_drt, times, i_signal, v_signal, mode, remove_short, fit_kw)
+            self._pending[key] = future
+
+        def store(f):
+            with self._lock:
+                self._pending.pop(key, None)
+            if f.exception() is None:
+                self.cache.put(key, f.result())
+
+        future.add_done_callback(store)
+        return self._chain(future)
+
+    @staticmethod
+    def _chain(future: Future) -> Future:
+        # Return a future that resolves to a copy of the result, such that callers
+        # modifying their LinearIV do not affect each other
+        out = Future()
+
+        def copy_result(f):
+            if f.exception() is not None:
+                out.set_exception(f.exception())
+            else:
+                out.set_result(_copy_iv(f.result()))
+
+        future.add_done_callback(copy_result)
+        return out
+
+    def map(
+            self,
+            datasets: List[Tuple[ndarray, ndarray, ndarray]],
+            mode: ControlMode,
+            remove_short: bool = False,
+            fit_kw: Optional[dict] = None) -> List[LinearIV]:
+        """Process several datasets concurrently.
+
+        :param datasets: List of (times, i_signal, v_signal) tuples
+        :type datasets: List[Tuple[ndarray, ndarray, ndarray]]
+        :param mode: Control mode
+        :type mode: ControlMode
+        :param bool remove_short: Remove short time steps before processing
+        :param fit_kw: Keyword arguments for DRT fitting
+        :type fit_kw: dict, optional
+        :return: LinearIV for each dataset
+        :rtype: List[LinearIV]
+        """
+        futures = [self.submit(t, i, v, mode, remove_short, fit_kw) for t, i, v in datasets]
+        return [f.result() for f in futures]
@@ -6,7 +6,7 @@ an operating point.
 
 import numpy as np
 from numpy import ndarray
-from typing import Union
+from typing import Union, List
 
 class LinearIV(object):
     """Linear current-voltage relationship model.
@@ -86,4 +86,133 @@ class LinearIV(object):
         :rtype: Tuple[float, float]
         """
         return self._eval_ac(i_dc, i_ac, 'v')
-        
\ No newline at end of file
+        
+
+class LinearIVArray(object):
+    """Array of linear current-voltage relationship models.
+    
+    Stores the parameters of many LinearIV models (e.g. one per channel) as 
+    arrays, such that models can be evaluated for many operating points in 
+    a single vectorized call. Inputs to the eval methods are broadcast 
+    against the parameter arrays. With outer=True, each model is evaluated 
+    at every input value, and the output shape is 
+    (*self.shape, *input_shape).
+    
+    :param i_mid: Operating point currents in A
+    :type i_mid: ndarray
+    :param v_mid: Operating point voltages in V
+    :type v_mid: ndarray
+    :param dvdi: Differential resistances (dV/dI) in Ohm
+    :type dvdi: ndarray
+    
+    :ivar i_mid: Operating point currents
+    :ivar v_mid: Operating point voltages
+    :ivar dvdi: Differential resistances
+    """
+    def __init__(self, i_mid: ndarray, v_mid: ndarray, dvdi: ndarray):
+        self.i_mid, self.v_mid, self.dvdi = np.broadcast_arrays(
+            np.asarray(i_mid, dtype=float), 
+            np.asarray(v_mid, dtype=float), 
+            np.asarray(dvdi, dtype=float)
+        )
+        
+    @classmethod
+    def from_list(cls, ivs: List[LinearIV]):
+        """Create from a list of LinearIV instances.
+        
+        :param ivs: LinearIV instances
+        :type ivs: List[LinearIV]
+        :return: LinearIVArray with one model per instance
+        :rtype: LinearIVArray
+        """
+        params = np.array([[iv.i_mid, iv.v_mid, iv.dvdi] for iv in ivs], dtype=float).reshape(-1, 3)
+        return cls(*params.T)
+    
+    def to_list(self) -> List[LinearIV]:
+        """Convert to a list of LinearIV instances.
+        
+        :return: LinearIV instance for each model (flattened)
+        :rtype: List[LinearIV]
+        """
+        return [LinearIV(*params) for params in 
+                zip(self.i_mid.ravel(), self.v_mid.ravel(), self.dvdi.ravel())]
+        
+    @property
+    def shape(self):
+        """Shape of the model array."""
+        return self.i_mid.shape
+        
+    def __len__(self):
+        return len(self.i_mid)
+    
+    def __getitem__(self, index):
+        i_mid, v_mid, dvdi = self.i_mid[index], self.v_mid[index], self.dvdi[index]
+        if np.ndim(i_mid) == 0:
+            return LinearIV(i_mid, v_mid, dvdi)
+        return LinearIVArray(i_mid, v_mid, dvdi)
+    
+    def _params(self, x, outer: bool):
+        # Get parameters shaped to broadcast against x
+        x = np.asarray(x, dtype=float)
+        if outer:
+            expand = (...,) + (None,) * x.ndim
+            return x, self.i_mid[expand], self.v_mid[expand], self.dvdi[expand]
+        return x, self.i_mid, self.v_mid, self.dvdi
+    
+    def eval_v(self, i: Union[float, ndarray], outer: bool = False) -> ndarray:
+        """Evaluate voltage for given current.
+        
+        :param i: Current value(s) in A
+        :type i: Union[float, ndarray]
+        :param bool outer: If True, evaluate each model at every current value
+        :return: Voltage values in V
+        :rtype: ndarray
+        """
+        i, i_mid, v_mid, dvdi = self._params(i, outer)
+        return v_mid + (i - i_mid) * dvdi
+    
+    def eval_i(self, v: Union[float, ndarray], outer: bool = False) -> ndarray:
+        """Evaluate current for given voltage.
+        
+        :param v: Voltage value(s) in V
+        :type v: Union[float, ndarray]
+        :param bool outer: If True, evaluate each model at every voltage value
+        :return: Current values in A
+        :rtype: ndarray
+        """
+        v, i_mid, v_mid, dvdi = self._params(v, outer)
+        return i_mid + (v - v_mid) / dvdi
+    
+    def eval_iac(self, v_dc: Union[float, ndarray], v_ac: Union[float, ndarray], outer: bool = False):
+        """Evaluate AC current response to AC voltage perturbation.
+        
+        :param v_dc: DC voltage(s) in V
+        :type v_dc: Union[float, ndarray]
+        :param v_ac: AC voltage amplitude(s) in V
+        :type v_ac: Union[float, ndarray]
+        :param bool outer: If True, evaluate each model at every (broadcast)
+            pair of v_dc and v_ac
+        :return: Tuple of (i_dc, i_ac) arrays in A
+        :rtype: Tuple[ndarray, ndarray]
+        """
+        v_dc, v_ac = np.broadcast_arrays(np.asarray(v_dc, dtype=float), np.asarray(v_ac, dtype=float))
+        i_dc = self.eval_i(v_dc, outer)
+        _, _, _, dvdi = self._params(v_ac, outer)
+        return i_dc, np.abs(v_ac / dvdi)
+    
+    def eval_vac(self, i_dc: Union[float, ndarray], i_ac: Union[float, ndarray], outer: bool = False):
+        """Evaluate AC voltage response to AC current perturbation.
+        
+        :param i_dc: DC current(s) in A
+        :type i_dc: Union[float, ndarray]
+        :param i_ac: AC current amplitude(s) in A
+        :type i_ac: Union[float, ndarray]
+        :param bool outer: If True, evaluate each model at every (broadcast)
+            pair of i_dc and i_ac
+        :return: Tuple of (v_dc, v_ac) arrays in V
+        :rtype: Tuple[ndarray, ndarray]
+        """
+        i_dc, i_ac = np.broadcast_arrays(np.asarray(i_dc, dtype=float), np.asarray(i_ac, dtype=float))
+        v_dc = self.eval_v(i_dc, outer)
+        _, _, _, dvdi = self._params(i_ac, outer)
+        return v_dc, np.abs(i_ac * dvdi)
@@ -0,0 +1,168 @@
+"""Optional JIT-compiled kernels for sampling hot loops.
+
+Provides single-pass numba implementations of routines in
+biocom.processing.sampling. The kernels produce results identical to the
+NumPy implementations, but avoid intermediate arrays and sorting. If numba
+is not installed, the NumPy implementations are used.
+"""
+
+import numpy as np
+from numpy import ndarray
+from typing import Optional
+
+try:
+    from numba import njit
+    _numba_available = True
+except ModuleNotFoundError:
+    _numba_available = False
+
+
+def jit_available() -> bool:
+    """Check if JIT-compiled kernels are available.
+
+    :return: True if numba is installed
+    :rtype: bool
+    """
+    return _numba_available
+
+
+def resolve_use_jit(use_jit: Optional[bool] = None) -> bool:
+    """Determine whether to use JIT-compiled kernels.
+
+    :param use_jit: If True, require JIT kernels. If False, use NumPy
+        implementations. If None, use JIT kernels if numba is installed.
+        Defaults to None
+    :type use_jit: Optional[bool]
+    :return: True if JIT kernels should be used
+    :rtype: bool
+    """
+    if use_jit is None:
+        return _numba_available
+    if use_jit and not _numba_available:
+        raise RuntimeError("numba must be installed to use JIT-compiled kernels")
+    return bool(use_jit)
+
+
+if _numba_available:
+    @njit(cache=True)
+    def _find_steps(abs_dy, thresh, athresh, allow_consecutive):
+        out = np.empty(len(abs_dy), dtype=np.int64)
+        n = 0
+        prev = -2
+        for i in range(len(abs_dy)):
+            if abs_dy[i] >= thresh and abs_dy[i] >= athresh:
+                # Consecutive steps are combined into the first step
+                if allow_consecutive or i != prev + 1:
+                    out[n] = i + 1
+                    n += 1
+                prev = i
+        return out[:n]
+
+    @njit(cache=True)
+    def _emit_decimation_index(out, write, init_index, starts, ends, last_undec, decimation_interval,
+                               intervals, block_start, block_end):
+        # Write (if write is True) and count decimation indices in order. Indices are emitted
+        # step by step; returns -1 if they are not increasing across steps
+        n = 0
+        last = -1
+        for k in range(len(init_index)):
+            if write:
+                out[n] = init_index[k]
+            n += 1
+            last = init_index[k]
+
+        for s in range(len(starts)):
+            # Undecimated samples at start of step
+            for idx in range(starts[s], last_undec[s] + 1):
+                if idx < last:
+                    return -1
+                if idx > last:
+                    if write:
+                        out[n] = idx
+                    n += 1
+                    last = idx
+
+            remaining = ends[s] - 1 - last_undec[s]
+            if remaining <= 0:
+                continue
+
+            for j in range(len(intervals)):
+                interval = intervals[j]
+                block_base = last_undec[s] + block_start[j]
+                if remaining <= block_end[j]:
+                    # Final block: continue at the block interval through the end of the step
+                    count = (ends[s] - 1 - block_base) // interval
+                else:
+                    count = decimation_interval
+                for i in range(1, count + 1):
+                    idx = block_base + interval * i
+                    if idx < last:
+                        return -1
+                    if idx > last:
+                        if write:
+                            out[n] = idx
+                        n += 1
+                        last = idx
+                if remaining <= block_end[j]:
+                    break
+
+            # Ensure that last point before next step is included
+            idx = ends[s] - 1
+            if idx < last:
+                return -1
+            if idx > last:
+                if write:
+                    out[n] = idx
+                n += 1
+                last = idx
+
+        return n
+
+
+def find_steps(y: ndarray, allow_consecutive: bool = True, rthresh: float = 20, athresh: float = 1e-10) -> ndarray:
+    """JIT-compiled equivalent of sampling.find_steps.
+
+    :param y: Signal array
+    :type y: ndarray
+    :param allow_consecutive: If False, combine detected steps at
+        consecutive indices into a single step. Defaults to True.
+    :type allow_consecutive: bool
+    :param rthresh: Relative threshold as multiple of median derivative
+    :type rthresh: float
+    :param athresh: Absolute threshold for step size
+    :type athresh: float
+    :return: Array of step indices
+    :rtype: ndarray
+    """
+    resolve_use_jit(True)
+    abs_dy = np.abs(np.diff(y))
+    return _find_steps(abs_dy, np.median(abs_dy) * rthresh, athresh, allow_consecutive)
+
+
+def decimation_index(plan: dict, decimation_interval: int) -> Optional[ndarray]:
+    """JIT-compiled construction of the decimation index from a decimation plan.
+
+    :param dict plan: Decimation plan from sampling._decimation_plan
+    :param int decimation_interval: Number of samples per decimation block
+    :return: Sorted, unique decimation indices, or None if steps overlap such
+        that indices cannot be generated in order
+    :rtype: Optional[ndarray]
+    """
+    resolve_use_jit(True)
+    empty = np.zeros(0, dtype=np.int64)
+    args = (
+        np.asarray(plan["init_index"], dtype=np.int64),
+        np.asarray(plan["starts"], dtype=np.int64),
+        np.asarray(plan["ends"], dtype=np.int64),
+        np.asarray(plan["last_undec"], dtype=np.int64),
+        int(decimation_interval),
+        np.asarray(plan.get("intervals", empty), dtype=np.int64),
+        np.asarray(plan.get("block_start", empty), dtype=np.int64),
+        np.asarray(plan.get("block_end", empty), dtype=np.int64),
+    )
+    size = _emit_decimation_index(empty, False, *args)
+    if size < 0:
+        return None
+    out = np.empty(size, dtype=np.int64)
+    _emit_decimation_index(out, True, *args)
+    return out
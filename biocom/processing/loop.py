@@ -5,9 +5,12 @@ individual cycles.
 """
 
 import numpy as np
+from numpy import ndarray
 from pathlib import Path
+from typing import Union, Optional, List
 
-from ..mpr import read_mpr
+from ..mpr import read_mpr, read_mpr_layout, unscale_data, unscale_fieldname, split_fieldname, split_unit
+from .. import units
 
 def read_loop_file(file: Path):
     """Read loop split indices from EC-Lab LOOP file.
@@ -37,6 +40,9 @@ def path_to_loop_file(mpr_file: Path):
 def split_cycles(mpr_file: Path, unscale=True):
     """Split loop experiment data into individual cycles.
     
+    Loads the full file. For random access to individual cycles or 
+    per-cycle statistics on large files, use CycleDataset.from_mpr.
+    
     :param mpr_file: Path to MPR data file
     :type mpr_file: Path
     :param unscale: Whether to unscale data values
@@ -48,4 +54,210 @@ def split_cycles(mpr_file: Path, unscale=True):
     loop_file = path_to_loop_file(mpr_file)
     split_index = read_loop_file(loop_file)
     # First and last indices are unnecesary (0 and len(mpr.data))
-    return np.split(mpr.data, split_index[1:-1])
\ No newline at end of file
+    return np.split(mpr.data, split_index[1:-1])
+
+
+class CycleDataset(object):
+    """Cycle-indexed view of loop experiment data.
+    
+    Provides random access to individual cycles as zero-copy views of a 
+    single data array, which is memory-mapped from the .mpr file when 
+    created with from_mpr. Per-cycle statistics are computed with 
+    vectorized segment reductions rather than by splitting the data
+    into one array per cycle.
+    
+    :param data: Structured data array (e.g. MPRfile.data or a memmap)
+    :type data: ndarray
+    :param split_index: Data indices marking cycle boundaries, as returned
+        by read_loop_file. Must include the first (0) and last (len(data)) 
+        indices
+    :type split_index: List[int] or ndarray
+    :param unscale: If True, convert scaled units (e.g., mA, mV) to base 
+        units (A, V) on access. Defaults to False
+    :type unscale: bool
+    
+    Example::
+    
+        cycles = CycleDataset.from_mpr(mpr_file)
+        last_cycle = cycles[-1]
+        v_max = cycles.reduce('Ewe/V', 'max')
+    """
+    _reducers = {
+        'sum': np.add,
+        'min': np.minimum,
+        'max': np.maximum,
+    }
+    
+    def __init__(self, data: ndarray, split_index: Union[List[int], ndarray], unscale: bool = False):
+        split_index = np.asarray(split_index, dtype=np.int64)
+        if len(split_index) < 2 or split_index[0] != 0 or split_index[-1] != len(data):
+            raise ValueError("split_index must start at 0 and end at the length of the data")
+        if np.any(np.diff(split_index) < 0):
+            raise ValueError("split_index must be non-decreasing")
+        
+        self.data = data
+        self.split_index = split_index
+        self.unscale = unscale
+        
+        # Map unscaled field names to raw field names and scale factors
+        self._fields = {}
+        for fieldname in data.dtype.names:
+            prefix, _ = split_unit(split_fieldname(fieldname)[1])
+            scale = 1.0 if prefix is None else units.UnitPrefix(prefix).scale
+            self._fields[fieldname] = (fieldname, 1.0)
+            if unscale:
+                self._fields[unscale_fieldname(fieldname)] = (fieldname, scale)
+        
+    @classmethod
+    def from_mpr(cls, mpr_file: Path, loop_file: Optional[Path] = None, unscale: bool = True):
+        """Create a CycleDataset from a .mpr file and its LOOP file.
+        
+        The data array is memory-mapped, such that only the records that 
+        are accessed are read from disk.
+        
+        :param mpr_file: Path to MPR data file
+        :type mpr_file: Path
+        :param loop_file: Path to LOOP file. If None, determined from mpr_file. 
+            Defaults to None
+        :type loop_file: Optional[Path]
+        :param unscale: Whether to unscale data values on access
+        :type unscale: bool
+        :return: CycleDataset instance
+        :rtype: CycleDataset
+        """
+        mpr_file = Path(mpr_file)
+        layout = read_mpr_layout(mpr_file)
+        data = np.memmap(mpr_file, dtype=layout.dtype, mode="r", offset=layout.data_offset, 
+                         shape=(layout.npts,))
+        
+        if loop_file is None:
+            loop_file = path_to_loop_file(mpr_file)
+        split_index = read_loop_file(loop_file)
+        
+        return cls(data, split_index, unscale=unscale)
+    
+    @property
+    def num_cycles(self) -> int:
+        """Number of cycles."""
+        return len(self.split_index) - 1
+    
+    @property
+    def starts(self) -> ndarray:
+        """Data index of the first record of each cycle."""
+        return self.split_index[:-1]
+    
+    @property
+    def ends(self) -> ndarray:
+        """Data index after the last record of each cycle."""
+        return self.split_index[1:]
+    
+    @property
+    def lengths(self) -> ndarray:
+        """Number of records in each cycle."""
+        return np.diff(self.split_index)
+    
+    @property
+    def columns(self) -> List[str]:
+        """Available column names."""
+        if self.unscale:
+            return [unscale_fieldname(fn) for fn in self.data.dtype.names]
+        return list(self.data.dtype.names)
+    
+    def __len__(self) -> int:
+        return self.num_cycles
+    
+    def _cycle_slice(self, k: int) -> slice:
+        if k < 0:
+            k += self.num_cycles
+        if k < 0 or k >= self.num_cycles:
+            raise IndexError(f"Cycle index out of range for {self.num_cycles} cycles")
+        return slice(self.split_index[k], self.split_index[k + 1])
+    
+    def __getitem__(self, k: int) -> ndarray:
+        """Get the data for cycle k.
+        
+        Returns a view of the underlying data when unscale is False. 
+        Otherwise, only the records of cycle k are copied and unscaled.
+        """
+        cycle_data = self.data[self._cycle_slice(k)]
+        if self.unscale:
+            return unscale_data(cycle_data)
+        return cycle_data
+    
+    def __iter__(self):
+        for k in range(self.num_cycles):
+            yield self[k]
+            
+    def _get_field(self, column: str):
+        try:
+            return self._fields[column]
+        except KeyError:
+            raise ValueError(f"Column {column} not found. Available columns: {self.columns}")
+            
+    def get_column(self, k: int, column: str) -> ndarray:
+        """Get a single column for cycle k.
+        
+        :param int k: Cycle index
+        :param str column: Column name
+        :return: Column values. A view of the underlying data if no 
+            unscaling is required
+        :rtype: ndarray
+        """
+        fieldname, scale = self._get_field(column)
+        values = self.data[fieldname][self._cycle_slice(k)]
+        if scale != 1:
+            return values * scale
+        return values
+    
+    def reduce(self, column: str, agg: str = 'mean') -> ndarray:
+        """Compute a per-cycle reduction of a column.
+        
+        Uses ufunc.reduceat over the cycle boundaries, such that no 
+        per-cycle arrays are created. Empty cycles yield NaN 
+        (0 for 'sum' and 'count').
+        
+        :param str column: Column name
+        :param str agg: Reduction to apply. Options: 'sum', 'min', 'max', 
+            'mean', 'first', 'last', 'range', 'count'. Defaults to 'mean'
+        :return: Array of reduced values with one entry per cycle
+        :rtype: ndarray
+        """
+        lengths = self.lengths
+        if agg == 'count':
+            return lengths
+        
+        fieldname, scale = self._get_field(column)
+        x = self.data[fieldname]
+        
+        nonempty = lengths > 0
+        starts = self.starts[nonempty]
+        out = np.full(self.num_cycles, np.nan)
+        
+        if agg in self._reducers:
+            out[nonempty] = self._reducers[agg].reduceat(x, starts, dtype=float)
+            if agg == 'sum':
+                out[~nonempty] = 0
+        elif agg == 'mean':
+            out[nonempty] = np.add.reduceat(x, starts, dtype=float) / lengths[nonempty]
+        elif agg == 'range':
+            out[nonempty] = (np.maximum.reduceat(x, starts, dtype=float) 
+                             - np.minimum.reduceat(x, starts, dtype=float))
+        elif agg == 'first':
+            out[nonempty] = x[starts]
+        elif agg == 'last':
+            out[nonempty] = x[self.ends[nonempty] - 1]
+        else:
+            raise ValueError(f"Invalid agg {agg}. Options: "
+                             f"{list(self._reducers) + ['mean', 'range', 'first', 'last', 'count']}")
+        
+        return out * scale
+    
+    def cycle_of(self, index: Union[int, ndarray]) -> Union[int, ndarray]:
+        """Get the cycle containing the record(s) at the given data index.
+        
+        :param index: Data index or array of indices
+        :type index: int or ndarray
+        :return: Cycle index or array of cycle indices
+        :rtype: int or ndarray
+        """
+        return np.searchsorted(self.split_index, index, side='right') - 1
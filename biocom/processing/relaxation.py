@@ -0,0 +1,277 @@
+"""Lightweight relaxation-time fitting of step responses.
+
+Fits the response of a system to stepped input as an ohmic term plus a
+discrete distribution of relaxation times on a fixed log-tau grid, using
+regularized (non-negative) least squares. This provides a fast estimate of
+the low-frequency impedance and baseline of chrono data without the
+hybrid-drt package. Step response matrices depend only on the time grid,
+step times, step sizes, and tau grid, and are cached for reuse across
+repeated fits.
+"""
+
+import hashlib
+import threading
+import numpy as np
+from numpy import ndarray
+from collections import OrderedDict
+from scipy.optimize import nnls
+from typing import Optional
+
+from .sampling import segment_reduce, _step_bounds
+
+
+# Cache of step response matrices, keyed by (time grid, step times, step sizes, tau grid).
+# Bounded by total size, since matrix sizes scale with the number of samples
+_kernel_cache = OrderedDict()
+_kernel_cache_lock = threading.Lock()
+_kernel_cache_max_bytes = 256 * 2 ** 20
+_kernel_cache_nbytes = 0
+# Max number of elements of temporary arrays when building step response matrices
+_kernel_block_size = 2 ** 20
+
+
+def clear_kernel_cache():
+    """Clear the cache of step response matrices."""
+    global _kernel_cache_nbytes
+    with _kernel_cache_lock:
+        _kernel_cache.clear()
+        _kernel_cache_nbytes = 0
+
+
+def get_tau_grid(times: ndarray, ppd: int = 10, tau_min: Optional[float] = None,
+                 tau_max: Optional[float] = None) -> ndarray:
+    """Get a log-spaced grid of relaxation times spanning the measurement.
+
+    Grid limits are rounded outward to whole decades, such that data with
+    similar time scales share the same grid (and cached kernels).
+
+    :param times: Time array
+    :type times: ndarray
+    :param int ppd: Points per decade. Defaults to 10
+    :param tau_min: Minimum relaxation time. If None, use the smallest
+        sample interval. Defaults to None
+    :type tau_min: Optional[float]
+    :param tau_max: Maximum relaxation time. If None, use the measurement
+        duration. Defaults to None
+    :type tau_max: Optional[float]
+    :return: Relaxation times
+    :rtype: ndarray
+    """
+    if tau_min is None:
+        dt = np.diff(times)
+        tau_min = np.min(dt[dt > 0])
+    if tau_max is None:
+        tau_max = times[-1] - times[0]
+
+    log_min = np.floor(np.log10(tau_min))
+    log_max = np.ceil(np.log10(tau_max))
+    num_decades = int(log_max - log_min)
+    return np.logspace(log_min, log_max, num_decades * ppd + 1)
+
+
+def get_step_sizes(x: ndarray, step_index: ndarray):
+    """Get the size of each step in a stepped input signal.
+
+    Step sizes are determined from the median signal value in each step.
+
+    :param x: Input signal array
+    :type x: ndarray
+    :param step_index: Step indices
+    :type step_index: ndarray
+    :return: Tuple of (step_sizes, x_ref), where x_ref is the input value
+        before the first step
+    :rtype: Tuple[ndarray, float]
+    """
+    bounds = _step_bounds(len(x), step_index)
+    levels = segment_reduce(x, bounds[:-1], bounds[1:], "median")
+    return np.diff(levels), levels[0]
+
+
+def _array_key(*arrays) -> str:
+    hasher = hashlib.blake2b(digest_size=16)
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr, dtype=float)
+        hasher.update(str(arr.shape).encode())
+        hasher.update(arr)
+    return hasher.hexdigest()
+
+
+def step_response_matrix(times: ndarray, step_times: ndarray, step_sizes: ndarray, tau: ndarray) -> ndarray:
+    """Get the response of each relaxation time to the stepped input.
+
+    The unit step responses are weighted by the step sizes and summed over
+    steps while building the matrix, in blocks of samples, such that memory
+    use does not grow with the number of steps. Results are cached by time
+    grid, step times, step sizes, and tau grid, up to a total cache size of
+    256 MiB. Times are taken relative to the first sample, such that
+    measurements with the same sampling schedule share cached matrices.
+
+    :param times: Time array
+    :type times: ndarray
+    :param step_times: Step times
+    :type step_times: ndarray
+    :param step_sizes: Step sizes
+    :type step_sizes: ndarray
+    :param tau: Relaxation times
+    :type tau: ndarray
+    :return: Array of shape (len(times), len(tau)) with entries
+        sum_k step_sizes[k] * (1 - exp(-(t - step_times[k]) / tau)) over steps
+        with step_times[k] <= t. The returned array is read-only
+    :rtype: ndarray
+    """
+    global _kernel_cache_nbytes
+
+    # Round relative times so that float noise in the time origin does not prevent cache hits
+    t_rel = np.round(np.asarray(times, dtype=float) - times[0], 9)
+    step_rel = np.round(np.asarray(step_times, dtype=float) - times[0], 9)
+    step_sizes = np.asarray(step_sizes, dtype=float)
+    tau = np.asarray(tau, dtype=float)
+    key = _array_key(t_rel, step_rel, step_sizes, tau)
+
+    with _kernel_cache_lock:
+        kernel = _kernel_cache.get(key)
+        if kernel is not None:
+            _kernel_cache.move_to_end(key)
+            return kernel
+
+    # Limit temporaries to _kernel_block_size elements
+    kernel = np.empty((len(t_rel), len(tau)))
+    block = max(_kernel_block_size // max(len(step_rel) * len(tau), 1), 1)
+    for start in range(0, len(t_rel), block):
+        # Response is zero before each step
+        dt = np.maximum(t_rel[start:start + block, None] - step_rel[None, :], 0)
+        response = -np.expm1(-dt[:, None, :] / tau[None, :, None])
+        # Sum over steps: (block, tau, steps) @ (steps,) -> (block, tau)
+        kernel[start:start + block] = response @ step_sizes
+    kernel.flags.writeable = False
+
+    # Matrices larger than the cache are returned without caching
+    if kernel.nbytes > _kernel_cache_max_bytes:
+        return kernel
+
+    with _kernel_cache_lock:
+        # Another thread may have cached the same matrix in the meantime
+        previous = _kernel_cache.pop(key, None)
+        if previous is not None:
+            _kernel_cache_nbytes -= previous.nbytes
+        _kernel_cache[key] = kernel
+        _kernel_cache_nbytes += kernel.nbytes
+        while _kernel_cache_nbytes > _kernel_cache_max_bytes:
+            _, evicted = _kernel_cache.popitem(last=False)
+            _kernel_cache_nbytes -= evicted.nbytes
+
+    return kernel
+
+
+class RelaxationFit(object):
+    """Result of a step response fit.
+
+    The modeled response is
+    y(t) = baseline + r_inf * (x(t) - x_ref) + sum_k g_k * sum_j dx_j * (1 - exp(-(t - t_j) / tau_k)),
+    where dx_j and t_j are the size and time of step j.
+
+    :ivar baseline: Steady-state output at input x_ref
+    :ivar x_ref: Input value before the first step
+    :ivar r_inf: Instantaneous (ohmic) transfer coefficient
+    :ivar tau: Relaxation times
+    :ivar g: Relaxation coefficients
+    """
+    def __init__(self, baseline: float, x_ref: float, r_inf: float, tau: ndarray, g: ndarray):
+        self.baseline = baseline
+        self.x_ref = x_ref
+        self.r_inf = r_inf
+        self.tau = tau
+        self.g = g
+
+    @property
+    def r_dc(self) -> float:
+        """DC (zero-frequency) transfer coefficient."""
+        return self.r_inf + np.sum(self.g)
+
+    def predict_z(self, freq: ndarray) -> ndarray:
+        """Predict the complex transfer function at the given frequencies.
+
+        :param freq: Frequencies in Hz
+        :type freq: ndarray
+        :return: Complex transfer function (impedance for current input,
+            admittance for voltage input)
+        :rtype: ndarray
+        """
+        omega = 2 * np.pi * np.atleast_1d(freq)
+        return self.r_inf + np.sum(self.g[None, :] / (1 + 1j * omega[:, None] * self.tau[None, :]), axis=1)
+
+    def predict_steady_state(self, x: float) -> float:
+        """Predict the steady-state output at input value x.
+
+        :param float x: Input value
+        :return: Steady-state output
+        :rtype: float
+        """
+        return self.baseline + self.r_dc * (x - self.x_ref)
+
+
+def fit_step_relaxation(
+        times: ndarray,
+        x_signal: ndarray,
+        y_signal: ndarray,
+        step_times: ndarray,
+        step_sizes: ndarray,
+        x_ref: float,
+        tau: Optional[ndarray] = None,
+        ppd: int = 10,
+        l2_lambda: float = 1e-4,
+        nonneg: bool = True) -> RelaxationFit:
+    """Fit the response to stepped input with a distribution of relaxation times.
+
+    Solves min ||A g - y||^2 + lambda * ||g||^2 for the baseline, ohmic term,
+    and relaxation coefficients, with g >= 0 if nonneg is True. The baseline
+    is eliminated by centering, and the regularization strength is scaled to
+    the kernel magnitude.
+
+    :param times: Time array
+    :type times: ndarray
+    :param x_signal: Input signal array
+    :type x_signal: ndarray
+    :param y_signal: Output signal array
+    :type y_signal: ndarray
+    :param step_times: Times of input steps
+    :type step_times: ndarray
+    :param step_sizes: Sizes of input steps
+    :type step_sizes: ndarray
+    :param float x_ref: Input value before the first step
+    :param tau: Relaxation times. If None, determined with get_tau_grid. Defaults to None
+    :type tau: Optional[ndarray]
+    :param int ppd: Points per decade of the tau grid if tau is None. Defaults to 10
+    :param float l2_lambda: Relative L2 regularization strength. Defaults to 1e-4
+    :param bool nonneg: If True, constrain the ohmic and relaxation
+        coefficients to be non-negative. Defaults to True
+    :return: Fit result
+    :rtype: RelaxationFit
+    """
+    times = np.asarray(times, dtype=float)
+    if tau is None:
+        tau = get_tau_grid(times, ppd)
+
+    a_relax = step_response_matrix(times, np.atleast_1d(step_times), np.atleast_1d(step_sizes), tau)
+    a_mat = np.column_stack([np.asarray(x_signal, dtype=float) - x_ref, a_relax])
+
+    # Eliminate baseline by centering
+    a_mean = np.mean(a_mat, axis=0)
+    y_mean = np.mean(y_signal)
+    a_c = a_mat - a_mean
+    y_c = np.asarray(y_signal, dtype=float) - y_mean
+
+    # Regularize relaxation coefficients only
+    lam = l2_lambda * np.sum(a_c[:, 1:] ** 2) / len(tau)
+    penalty = np.zeros((len(tau), a_mat.shape[1]))
+    penalty[:, 1:] = np.sqrt(lam) * np.eye(len(tau))
+    a_aug = np.vstack([a_c, penalty])
+    y_aug = np.concatenate([y_c, np.zeros(len(tau))])
+
+    if nonneg:
+        coef, _ = nnls(a_aug, y_aug)
+    else:
+        coef = np.linalg.lstsq(a_aug, y_aug, rcond=None)[0]
+
+    baseline = y_mean - a_mean @ coef
+    return RelaxationFit(baseline, x_ref, coef[0], tau, coef[1:])
@@ -10,15 +10,16 @@ import scipy.ndimage as ndi
 import warnings
 from typing import Optional, Union, List
 
-from ..filters import nonuniform_gaussian_filter1d
-from ..utils import nearest_value
+from ..filters.filters import _nonuniform_filter_plan, _apply_filter_plan
+from ..utils import nearest_value, is_sorted
 from . import stats
+from . import kernels
 
 
 # =======================
 # Basic signal processing
 # =======================
-def find_steps(y, allow_consecutive=True, rthresh=20, athresh=1e-10):
+def find_steps(y, allow_consecutive=True, rthresh=20, athresh=1e-10, use_jit=None):
     """Identify step changes in a signal.
     
     Detects indices where the signal derivative exceeds threshold values,
@@ -33,9 +34,15 @@ def find_steps(y, allow_consecutive=True, rthresh=20, athresh=1e-10):
     :type rthresh: float
     :param athresh: Absolute threshold for step size
     :type athresh: float
+    :param use_jit: If True, use the JIT-compiled kernel (requires numba). If None, 
+        use the JIT-compiled kernel if numba is installed. Defaults to None
+    :type use_jit: Optional[bool]
     :return: Array of step indices
     :rtype: ndarray
     """
+    if kernels.resolve_use_jit(use_jit):
+        return kernels.find_steps(y, allow_consecutive, rthresh, athresh)
+    
     dy = np.diff(y)
     # Identify indices where diff exceeds threshold
     # athresh defaults to 1e-10 in case median diff is zero
@@ -44,8 +51,7 @@ def find_steps(y, allow_consecutive=True, rthresh=20, athresh=1e-10):
     if not allow_consecutive:
         # eliminate consecutive steps - these arise due to finite rise time and do not represent 
         # distinct program steps
-        idx_diff = np.diff(step_idx)
-        idx_diff = np.concatenate(([2], idx_diff))
+        idx_diff = np.diff(step_idx, prepend=-2)
         step_idx = step_idx[idx_diff > 1]
 
     return step_idx
@@ -71,6 +77,66 @@ def split_steps(x, step_index):
     return [x[start:end] for start, end in zip(step_index[:-1], step_index[1:])]
 
 
+def segment_reduce(x, starts, ends, agg: str = "median"):
+    """Aggregate values within each of a set of index segments.
+    
+    Sum, mean, min, and max are computed for all segments at once with 
+    ufunc.reduceat, and median is computed for all segments of equal 
+    length at once. Other numpy aggregation functions are applied 
+    segment by segment. Empty segments give NaN.
+    
+    :param x: Signal array. If multidimensional, segments are taken along the last axis
+    :type x: ndarray
+    :param starts: Start index of each segment
+    :type starts: ndarray
+    :param ends: End index (exclusive) of each segment
+    :type ends: ndarray
+    :param agg: Aggregation function name ('median', 'mean', 'sum', 'min', 'max', 
+        or other numpy function)
+    :type agg: str
+    :return: Aggregated values with shape x.shape[:-1] + (len(starts),)
+    :rtype: ndarray
+    """
+    x = np.asarray(x)
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    counts = ends - starts
+    valid = counts > 0
+    
+    out = np.full(x.shape[:-1] + (len(starts),), np.nan)
+    if not np.any(valid):
+        return out
+    
+    v_starts, v_ends, v_counts = starts[valid], ends[valid], counts[valid]
+    
+    if agg in ('sum', 'mean', 'min', 'max'):
+        ufunc = {'sum': np.add, 'mean': np.add, 'min': np.minimum, 'max': np.maximum}[agg]
+        if np.any(v_ends == x.shape[-1]):
+            # reduceat indices must be within the array
+            x = np.concatenate((x, np.zeros(x.shape[:-1] + (1,), dtype=x.dtype)), axis=-1)
+        # Interleave start and end indices: every other output is the reduction over a segment
+        bounds = np.stack((v_starts, v_ends), axis=-1).ravel()
+        values = ufunc.reduceat(x, bounds, axis=-1)[..., ::2]
+        if agg == 'mean':
+            values = values / v_counts
+    elif agg == 'median':
+        # Gather segments of equal length into 2D arrays and take the median along rows.
+        # The number of distinct lengths is at most sqrt(2 * N)
+        values = np.empty(x.shape[:-1] + (len(v_starts),))
+        order = np.argsort(v_counts, kind='stable')
+        group_bounds = np.flatnonzero(np.diff(v_counts[order], prepend=-1, append=-1))
+        for a, b in zip(group_bounds[:-1], group_bounds[1:]):
+            index = order[a:b]
+            length = v_counts[index[0]]
+            values[..., index] = np.median(x[..., v_starts[index, None] + np.arange(length)], axis=-1)
+    else:
+        func = getattr(np, agg)
+        values = np.stack([func(x[..., start:end], axis=-1) for start, end in zip(v_starts, v_ends)], axis=-1)
+        
+    out[..., valid] = values
+    return out
+
+
 def get_step_values(x, step_index, agg: str = "median"):
     """Get aggregated value for each step.
     
@@ -83,8 +149,8 @@ def get_step_values(x, step_index, agg: str = "median"):
     :return: List of aggregated values per step
     :rtype: List[float]
     """
-    splits = split_steps(x, step_index)
-    return [getattr(np, agg)(s) for s in splits]
+    bounds = _step_bounds(len(x), step_index)
+    return list(segment_reduce(x, bounds[:-1], bounds[1:], agg))
 
 
 def segment_step_values(x, step_index, rel_precision: float = 0.05):
@@ -118,7 +184,9 @@ def segment_step_values(x, step_index, rel_precision: float = 0.05):
 def step_times2index(times: ndarray, step_times: Union[list, ndarray]) -> ndarray:
     """Convert step times to array indices.
     
-    Finds the sample index at or immediately after each step time.
+    Finds the sample index at or immediately after each step time, using
+    binary search on the sample times. If times are not sorted, they are 
+    sorted first. Step times after the last sample map to index 0.
     
     :param times: Sample times array
     :type times: ndarray
@@ -129,13 +197,19 @@ def step_times2index(times: ndarray, step_times: Union[list, ndarray]) -> ndarra
     """
     # Determine step index by getting measurement time closest to step time
     # Each step_index must start at or after step time - cannot start before
-    def pos_delta(x, x0):
-        out = np.empty(len(x))
-        out[x < x0] = np.inf
-        out[x >= x0] = x[x >= x0] - x0
-        return out
-
-    step_index = np.array([np.argmin(pos_delta(times, st)) for st in step_times])
+    times = np.asarray(times)
+    step_times = np.asarray(step_times, dtype=float).ravel()
+    
+    if is_sorted(times):
+        step_index = np.searchsorted(times, step_times, side='left')
+    else:
+        # Stable sort so that the first of any repeated times maps to the lowest index
+        order = np.argsort(times, kind='stable')
+        step_index = np.searchsorted(times[order], step_times, side='left')
+        step_index = np.append(order, 0)[step_index]
+    
+    # No sample at or after step time
+    step_index[step_index == len(times)] = 0
 
     return step_index
 
@@ -176,11 +250,13 @@ def remove_short_samples(
 # Downsampling & filtering
 # ========================
 def select_decimation_interval(times, step_index, t_sample, init_samples, decimation_factor, max_t_sample,
-                               target_size):
+                               target_size, min_interval: int = 2, max_interval: int = 1000):
     """Select decimation interval to achieve target data size.
     
     Automatically determines the initial decimation interval needed to reduce
-    data to approximately the target size.
+    data to approximately the target size. The output size for a given interval 
+    is obtained from count_decimation_index without building the index, and 
+    the interval is found by bisection.
     
     :param times: Time array
     :type times: ndarray
@@ -196,31 +272,151 @@ def select_decimation_interval(times, step_index, t_sample, init_samples, decima
     :type max_t_sample: float
     :param target_size: Target number of output points
     :type target_size: int
+    :param min_interval: Smallest decimation interval to consider
+    :type min_interval: int
+    :param max_interval: Largest decimation interval to consider
+    :type max_interval: int
     :return: Selected decimation interval
     :rtype: int
     """
-    intervals = np.logspace(np.log10(2), np.log10(1000), 12).astype(int)
-    sizes = [len(get_decimation_index(times, step_index, t_sample, init_samples,
+    def size(interval):
+        return count_decimation_index(times, step_index, t_sample, init_samples,
                                       interval, decimation_factor, max_t_sample)
-                 )
-             for interval in intervals]
-    if target_size > sizes[-1]:
+    
+    lo, hi = min_interval, max_interval
+    size_lo, size_hi = size(lo), size(hi)
+    if target_size > size_hi:
         warnings.warn(f'Cannot achieve target size of {target_size} with selected decimation factor of '
                       f'{decimation_factor}. Decrease the decimation factor and/or decrease the maximum period')
-    if target_size < sizes[0]:
+        return hi
+    if target_size < size_lo:
         warnings.warn(f'Cannot achieve target size of {target_size} with selected decimation factor of '
                       f'{decimation_factor}. Increase the decimation factor and/or increase the maximum period'
                       )
-    return int(np.interp(target_size, sizes, intervals))
+        return lo
+    
+    # Output size increases with decimation interval. 
+    # Find the pair of consecutive intervals that bracket the target size
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        size_mid = size(mid)
+        if size_mid < target_size:
+            lo, size_lo = mid, size_mid
+        else:
+            hi, size_hi = mid, size_mid
+            
+    # Return the interval whose size is closest to the target
+    if target_size - size_lo <= size_hi - target_size:
+        return lo
+    return hi
+
+
+def _ragged_arange(starts: ndarray, steps: ndarray, counts: ndarray) -> ndarray:
+    # Concatenation of np.arange(start, start + step * count, step) for each segment,
+    # without Python-level iteration
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.cumsum(counts) - counts
+    pos = np.arange(np.sum(counts), dtype=np.int64) - np.repeat(offsets, counts)
+    return np.repeat(np.asarray(starts, dtype=np.int64), counts) + np.repeat(np.asarray(steps, dtype=np.int64), counts) * pos
+
+
+def _decimation_blocks(decimation_interval, decimation_factor, max_sample_interval, max_length):
+    # Sample interval of each decimation block, up to the block that either covers max_length
+    # samples or reaches max_sample_interval. The number of blocks grows logarithmically with
+    # max_length, and the block sequence is shared by all steps
+    intervals = []
+    covered = 0
+    j = 1
+    while covered < max_length:
+        sample_interval = min(int(decimation_factor ** j), max_sample_interval)
+        intervals.append(sample_interval)
+        if sample_interval == max_sample_interval:
+            break
+        covered += decimation_interval * sample_interval
+        j += 1
+    return np.array(intervals, dtype=np.int64)
+
+
+def _decimation_plan(num_samples, step_index, t_sample, init_samples, decimation_interval, decimation_factor,
+                     max_t_sample):
+    # Describe the decimation grid of each step with a few arrays, from which the
+    # decimation index or its size can be obtained without Python-level iteration
+    step_index = np.asarray(step_index, dtype=np.int64)
+    if init_samples is not None:
+        # Get evenly spaced samples from period before first step
+        init_index = np.unique(np.linspace(0, step_index[0] - 1, init_samples).round(0).astype(int))
+    else:
+        # Treat initial data (prior to first step) as if it is a step
+        if step_index[0] > 0:
+            step_index = np.insert(step_index, 0, 0)
+        init_index = np.array([], dtype=int)
+
+    # Limit sample interval to max_t_sample
+    if max_t_sample is None:
+        max_sample_interval = np.inf
+    else:
+        max_sample_interval = int(max_t_sample / t_sample)
+        
+    starts = step_index
+    ends = np.append(step_index[1:], num_samples)
+    
+    # Keep first decimation_interval points of each step without decimation
+    last_undec = np.minimum(starts + decimation_interval, ends - 1)
+    
+    plan = {
+        "init_index": init_index,
+        "starts": starts,
+        "ends": ends,
+        "last_undec": last_undec,
+    }
+    
+    # Number of samples remaining in each step after the undecimated samples
+    remaining = ends - 1 - last_undec
+    has_remaining = remaining > 0
+    
+    if np.any(has_remaining):
+        intervals = _decimation_blocks(decimation_interval, decimation_factor, max_sample_interval, 
+                                       np.max(remaining))
+        # Samples covered by the end of each block (if the block is not truncated)
+        block_end = decimation_interval * np.cumsum(intervals)
+        block_start = block_end - decimation_interval * intervals
+        if intervals[-1] == max_sample_interval:
+            # Final block continues through the end of the step
+            block_end[-1] = np.iinfo(np.int64).max
+        
+        # The final block in each step is the first block that reaches the end of the step.
+        # Preceding blocks contain decimation_interval samples each
+        remaining = remaining[has_remaining]
+        final_block = np.searchsorted(block_end, remaining, side='left')
+        
+        plan.update({
+            "intervals": intervals,
+            "block_start": block_start,
+            "block_end": block_end,
+            "dec_last_undec": last_undec[has_remaining],
+            "dec_ends": ends[has_remaining],
+            "final_block": final_block,
+            "final_start": last_undec[has_remaining] + block_start[final_block],
+            "final_interval": intervals[final_block],
+        })
+    
+    return plan
 
 
 def get_decimation_index(times, step_index, t_sample, init_samples, decimation_interval, decimation_factor,
-                         max_t_sample):
+                         max_t_sample, use_jit=None):
     """Generate decimation indices for data downsampling.
     
     Creates indices for roughly log-time downsampling that preserves early 
     transients while aggressively decimating later steady-state data.
     
+    Within each step, the first decimation_interval samples are kept. The
+    following samples are kept in blocks of decimation_interval samples, where
+    the sample interval of the jth block is int(decimation_factor ** j), capped 
+    at the maximum sample interval. The last sample of each step is always kept.
+    Since the block grid is known in closed form, the indices for all steps are
+    computed with array operations.
+    
     :param times: Time array
     :type times: ndarray
     :param step_index: Step indices
@@ -235,74 +431,90 @@ def get_decimation_index(times, step_index, t_sample, init_samples, decimation_i
     :type decimation_factor: float
     :param max_t_sample: Maximum sampling interval in seconds
     :type max_t_sample: float
+    :param use_jit: If True, use the JIT-compiled kernel (requires numba). If None, 
+        use the JIT-compiled kernel if numba is installed. Defaults to None
+    :type use_jit: Optional[bool]
     :return: Array of indices to keep
     :rtype: ndarray
     """
-    if init_samples is not None:
-        # Get evenly spaced samples from period before first step
-        init_index = np.unique(np.linspace(0, step_index[0] - 1, init_samples).round(0).astype(int))
-        keep_indices = [init_index]
-    else:
-        # Treat initial data (prior to first step) as if it is a step
-        if step_index[0] > 0:
-            step_index = np.insert(step_index, 0, 0)
-        keep_indices = []
-
-    # Limit sample interval to max_t_sample
-    if max_t_sample is None:
-        max_sample_interval = np.inf
-    else:
-        max_sample_interval = int(max_t_sample / t_sample)
-
-    # Build array of indices to keep
-    # print("step_index:", step_index)
-    for i, start_index in enumerate(step_index):
-        # Decimate samples after each step
-        if start_index == step_index[-1]:
-            next_step_index = len(times)
-        else:
-            next_step_index = step_index[i + 1]
-
-        # Keep first decimation_interval points without decimation
-        undec_index = np.arange(start_index, min(start_index + decimation_interval + 1, next_step_index), dtype=int)
-
-        keep_indices.append(undec_index)
-        # sample_interval = 1
-        last_index = undec_index[-1]
-        j = 1
-        while last_index < next_step_index - 1:
-            # Increment sample_interval
-            # sample_interval = min(int(sample_interval * decimation_factor), max_sample_interval)
-            sample_interval = min(int(decimation_factor ** j), max_sample_interval)
-            # print('sample_interval:', sample_interval)
-
-            if sample_interval == max_sample_interval:
-                # Sample interval has reached maximum. Continue through end of step
-                interval_end_index = next_step_index #- 1
-            else:
-                # Continue with current sampling rate until decimation_interval points acquired
-                interval_end_index = min(last_index + decimation_interval * sample_interval + 1,
-                                         next_step_index)
-
-            keep_index = np.arange(last_index + sample_interval, interval_end_index, sample_interval, dtype=int)
-
-            if len(keep_index) == 0:
-                # sample_interval too large - runs past end of step. Keep last sample
-                keep_index = [interval_end_index - 1]
-
-            # If this is the final interval, ensure that last point before next step is included
-            if interval_end_index == next_step_index and keep_index[-1] < next_step_index - 1:
-                keep_index = np.append(keep_index, next_step_index - 1)
-
-            keep_indices.append(keep_index)
+    plan = _decimation_plan(len(times), step_index, t_sample, init_samples, decimation_interval,
+                            decimation_factor, max_t_sample)
+    
+    if kernels.resolve_use_jit(use_jit):
+        # Generate indices in order in a single pass. Falls back to the array implementation
+        # if steps overlap
+        decimate_index = kernels.decimation_index(plan, decimation_interval)
+        if decimate_index is not None:
+            return decimate_index
+    
+    starts = plan["starts"]
+    keep_indices = [
+        plan["init_index"],
+        _ragged_arange(starts, np.ones_like(starts), plan["last_undec"] - starts + 1)
+    ]
+    
+    if "final_block" in plan:
+        intervals = plan["intervals"]
+        final_block = plan["final_block"]
+        final_start = plan["final_start"]
+        final_interval = plan["final_interval"]
+        ends = plan["dec_ends"]
+        
+        # Full blocks: decimation_interval samples each
+        step_num = np.repeat(np.arange(len(final_block)), final_block)
+        block_num = _ragged_arange(np.zeros_like(final_block), np.ones_like(final_block), final_block)
+        keep_indices.append(
+            _ragged_arange(
+                plan["dec_last_undec"][step_num] + plan["block_start"][block_num] + intervals[block_num],
+                intervals[block_num],
+                np.full(len(block_num), decimation_interval)
+            )
+        )
+        
+        # Final block: continue at the block interval through the end of the step
+        keep_indices.append(
+            _ragged_arange(final_start + final_interval, final_interval, 
+                           (ends - 1 - final_start) // final_interval)
+        )
+        # Ensure that last point before next step is included
+        keep_indices.append(ends - 1)
+
+    # Sort and drop duplicates. Segments are nearly sorted already, which makes a 
+    # stable sort much faster than np.unique
+    decimate_index = np.sort(np.concatenate(keep_indices), kind='stable')
+    if len(decimate_index) > 1:
+        decimate_index = decimate_index[np.concatenate(([True], np.diff(decimate_index) != 0))]
 
-            # Increment last_index
-            last_index = keep_index[-1]
-            j += 1
+    return decimate_index
 
-    decimate_index = np.unique(np.concatenate(keep_indices))
 
-    return decimate_index
+def count_decimation_index(times, step_index, t_sample, init_samples, decimation_interval, decimation_factor,
+                           max_t_sample) -> int:
+    """Count the indices that get_decimation_index would return.
+    
+    Computes the output size from the decimation grid without building 
+    the index. Takes the same arguments as get_decimation_index.
+    
+    :return: Number of indices to keep
+    :rtype: int
+    """
+    plan = _decimation_plan(len(times), step_index, t_sample, init_samples, decimation_interval,
+                            decimation_factor, max_t_sample)
+    
+    # Initial samples that fall within the first step are counted with the step
+    init_index = plan["init_index"]
+    size = np.sum(init_index < plan["starts"][0])
+    
+    size += np.sum(plan["last_undec"] - plan["starts"] + 1)
+    
+    if "final_block" in plan:
+        final_offset = plan["dec_ends"] - 1 - plan["final_start"]
+        size += np.sum(plan["final_block"]) * decimation_interval
+        size += np.sum(final_offset // plan["final_interval"])
+        # Last sample of the step is added if not on the final block's grid
+        size += np.sum(final_offset % plan["final_interval"] != 0)
+        
+    return int(size)
 
 
 def filter_chrono_signals(
@@ -321,7 +533,11 @@ def filter_chrono_signals(
     """Apply adaptive anti-aliasing filter to chronoamperometry signals.
     
     Uses spatially-varying Gaussian filtering to smooth data before decimation,
-    with filter scale adapted to local transient time scales.
+    with filter scale adapted to local transient time scales. All signals are 
+    stacked and filtered together, and step boundaries and filter scales are 
+    computed only once. When removing outliers, the outlier estimate and the 
+    final output are obtained from a single filter pass; only the ranges 
+    around replaced outliers are filtered again.
     
     :param times: Time array
     :type times: ndarray
@@ -350,76 +566,124 @@ def filter_chrono_signals(
     :rtype: List[ndarray]
     """
 
-    signals_out = [s.copy() for s in signals]
+    # Stack signals such that all signals are filtered together
+    signals_in = np.array(signals, dtype=float)
+    num_signals = len(signals_in)
     
-    if remove_outliers:
-        # First, remove obvious extreme values
-        # ext_index = identify_extreme_values(y, qr_size=0.8)
-        # print('extreme value indices:', np.where(ext_index))
-        # y[ext_index] = ndimage.median_filter(y, size=31)[ext_index]
-
-        # Find outliers with difference from filtered signal
-        # Use median prefilter to avoid spread of outliers
-        signals_filt = filter_chrono_signals(times, signals_out, step_index=step_index, decimate_index=decimate_index,
-                                      sigma_factor=sigma_factor, max_sigma=max_sigma,
-                                      remove_outliers=False,
-                                      median_prefilter=True, **kw)
+    # Step boundaries and filter sigmas are shared by all signals and both filter passes
+    step_bounds = _step_bounds(len(times), step_index)
+    sigmas = _chrono_filter_sigmas(times, step_bounds, step_index, decimate_index, sigma_factor, max_sigma,
+                                   first_step_steady)
+    
+    if median_prefilter:
+        signals_base = _median_steps(signals_in, step_bounds)
+    else:
+        signals_base = signals_in
+        
+    # Filter node ranges and weights are computed once per step and shared by all filter passes
+    plans = _step_filter_plans(step_bounds, sigmas, **kw)
+    
+    if not remove_outliers:
+        return list(_filter_steps(signals_base, step_bounds, plans))
+    
+    # First, remove obvious extreme values
+    # ext_index = identify_extreme_values(y, qr_size=0.8)
+    # print('extreme value indices:', np.where(ext_index))
+    # y[ext_index] = ndimage.median_filter(y, size=31)[ext_index]
+
+    # Find outliers with difference from filtered signal.
+    # Use median prefilter to avoid spread of outliers
+    if median_prefilter:
+        # Both passes filter the median-prefiltered signals
+        signals_filt = signals_out = _filter_steps(signals_base, step_bounds, plans)
+    else:
+        # Filter the prefiltered and raw signals in a single pass
+        signals_filt = _filter_steps(np.concatenate([_median_steps(signals_in, step_bounds), signals_in]),
+                                     step_bounds, plans)
+        signals_filt, signals_out = signals_filt[:num_signals], signals_filt[num_signals:]
+
+    outlier_flags = np.array([
+        flag_outliers(signals_in[i], signals_filt[i], outlier_thresh, outlier_prior) for i in range(num_signals)
+    ])
+    
+    if np.any(outlier_flags):
+        # Replace outliers with filtered values. The filter is linear, such that only the 
+        # change in the filter input needs to be filtered. The change is zero except near 
+        # outliers, so only the ranges around outliers are filtered again
+        signals_rep = np.where(outlier_flags, signals_filt, signals_in)
+        if median_prefilter:
+            signals_rep = _median_steps(signals_rep, step_bounds)
+        signals_out = signals_out + _filter_steps(signals_rep - signals_base, step_bounds, plans, skip_zero=True)
+        
+    return list(signals_out)
 
-        outlier_flags = [
-            flag_outliers(si, sfi, outlier_thresh, outlier_prior)
-            for si, sfi in zip(signals_out, signals_filt)
-        ]
 
-        for i in range(len(signals_out)):
-            print(f'Num outliers in signal {i}:', np.sum(outlier_flags[i]))
-            # Replace outliers with filtered values
-            signals_out[i][outlier_flags[i]] = signals_filt[i][outlier_flags[i]]
+def _step_bounds(num_samples, step_index):
+    # Start and end indices of all steps (consistent with split_steps)
+    step_index = np.array(step_index, dtype=int)
+    if len(step_index) == 0:
+        # Treat as a single step
+        return np.array([0, num_samples])
+    if step_index[0] > 0:
+        step_index = np.insert(step_index, 0, 0)
+    if step_index[-1] < num_samples:
+        step_index = np.append(step_index, num_samples)
+    return step_index
+    
 
-    t_steps = split_steps(times, step_index)
+def _chrono_filter_sigmas(times, step_bounds, step_index, decimate_index, sigma_factor, max_sigma, 
+                          first_step_steady):
+    # Get filter sigma (in samples) for every sample
     t_sample = np.median(np.diff(times))
     
     if max_sigma is None:
         max_sigma = sigma_factor / t_sample
         
-    # Get sigmas corresponding to decimation index
+    # Ideal sigma from inverse sqrt of maximum curvature of RC relaxation
+    step_lengths = np.diff(step_bounds)
+    t_start = np.repeat(times[np.minimum(step_bounds[:-1], len(times) - 1)], step_lengths)
+    sigma_ideal = np.exp(1) * (times - (t_start - t_sample)) / 2
+    sigmas = sigma_factor * (sigma_ideal / t_sample)
+    sigmas[sigmas > max_sigma] = max_sigma
+    
+    if first_step_steady:
+        # Assume the initial step is at steady state and thus can be filtered with a uniform length scale
+        sigmas[:step_lengths[0]] = min(max_sigma, step_lengths[0] / 10)
+    
+    # Use decimation index to cap sigma
     if decimate_index is not None:
-        decimate_sigma = sigma_from_decimate_index(signals[0], step_index, decimate_index)
-        step_dec_sigmas = split_steps(decimate_sigma, step_index)
-    else:
-        step_dec_sigmas = None
-            
-    # Filter each signal
-    for i in range(len(signals)):
-        signal = signals_out[i]
-        s_steps = split_steps(signal, step_index)
-
-        s_filt = []
-        n = 0
-        for j, (t_step, s_step) in enumerate(zip(t_steps, s_steps)):
-            if first_step_steady and j == 0:
-                # Assume the initial step is at steady state and thus can be filtered with a uniform length scale
-                sigmas = np.full(len(t_step), min(max_sigma, len(t_step) / 10))
-            else:
-                # Ideal sigma from inverse sqrt of maximum curvature of RC relaxation
-                sigma_ideal = np.exp(1) * (t_step - (t_step[0] - t_sample)) / 2
-                sigmas = sigma_factor * (sigma_ideal / t_sample)
-                sigmas[sigmas > max_sigma] = max_sigma
-
-            # Use decimation index to cap sigma
-            if step_dec_sigmas is not None:
-                sigmas = np.minimum(step_dec_sigmas[j], sigmas)
-
-            if median_prefilter:
-                s_step = ndi.median_filter(s_step, 3, mode='nearest')
-
-            # if j == 0:
-            dec_index = decimate_index[(decimate_index < n + len(t_step)) & (decimate_index >= n)]
-            s_filt.append(nonuniform_gaussian_filter1d(s_step, sigmas, **kw))
-            n += len(t_step)
-
-        signals_out[i] = np.concatenate(s_filt)
+        decimate_sigma = sigma_from_decimate_index(times, step_index, decimate_index)
+        sigmas = np.minimum(decimate_sigma, sigmas)
+        
+    return sigmas
+    
+
+def _median_steps(signals, step_bounds):
+    # Median prefilter stacked signals within each step
+    signals_med = np.empty_like(signals)
+    for start, end in zip(step_bounds[:-1], step_bounds[1:]):
+        if end > start:
+            signals_med[:, start:end] = ndi.median_filter(signals[:, start:end], size=(1, 3), mode='nearest')
+    return signals_med
+    
+
+def _step_filter_plans(step_bounds, sigmas, **kw):
+    # Nonuniform filter plan for each step (see filters._nonuniform_filter_plan)
+    return [
+        _nonuniform_filter_plan(sigmas[start:end], **kw) if end > start else None
+        for start, end in zip(step_bounds[:-1], step_bounds[1:])
+    ]
+
+
+def _filter_steps(signals, step_bounds, plans, skip_zero=False):
+    # Filter stacked signals within each step. If skip_zero, ranges in which the signals are
+    # zero are skipped. Steps without filtering are copied
+    signals_filt = signals.copy()
+    for start, end, plan in zip(step_bounds[:-1], step_bounds[1:], plans):
+        if plan is not None:
+            signals_filt[:, start:end] = _apply_filter_plan(signals[:, start:end], plan, skip_zero=skip_zero)
         
-    return signals_out
+    return signals_filt
 
 
 def sigma_from_decimate_index(y, step_index, decimate_index, truncate=4.0):
@@ -5,7 +5,8 @@ for signal processing.
 """
 
 import numpy as np
-from scipy.stats import norm
+from numpy import ndarray
+from scipy.special import expit, logit
 
 
 def robust_std(x):
@@ -44,10 +45,231 @@ def outlier_prob(x, mu_in, sigma_in, sigma_out, p_prior):
     :return: Posterior outlier probability for each point
     :rtype: ndarray
     """
-    pdf_in = norm.pdf(x, mu_in, sigma_in)
-    pdf_out = norm.pdf(x, mu_in, sigma_out)
-    p_out = p_prior * pdf_out / ((1 - p_prior) * pdf_in + p_prior * pdf_out)
+    p_out = expit(outlier_log_odds(x, mu_in, sigma_in, sigma_out, p_prior))
     dev = np.abs(x - mu_in)
     # Don't consider data points with smaller deviations than sigma_in to be outliers
     p_out[dev <= sigma_in] = 0
-    return p_out
\ No newline at end of file
+    return p_out
+
+
+def outlier_log_odds(x, mu_in, sigma_in, sigma_out, p_prior):
+    """Get the posterior log-odds that each point is an outlier.
+    
+    Closed-form log-space equivalent of the mixture model in outlier_prob,
+    which does not underflow for large deviations.
+    
+    :param x: Data array
+    :type x: ndarray
+    :param mu_in: Mean of inlier distribution
+    :type mu_in: ndarray or float
+    :param sigma_in: Standard deviation of inlier distribution
+    :type sigma_in: ndarray or float
+    :param sigma_out: Standard deviation of outlier distribution
+    :type sigma_out: ndarray or float
+    :param p_prior: Prior probability of any point being an outlier
+    :type p_prior: float
+    :return: Log-odds of outlier vs. inlier for each point
+    :rtype: ndarray
+    """
+    z2_in = ((x - mu_in) / sigma_in) ** 2
+    z2_out = ((x - mu_in) / sigma_out) ** 2
+    return logit(p_prior) + 0.5 * (z2_in - z2_out) + np.log(sigma_in) - np.log(sigma_out)
+
+
+class QuantileSketch(object):
+    """Mergeable streaming quantile sketch with relative accuracy.
+    
+    Values are counted in logarithmically spaced buckets (separately for 
+    positive and negative values), such that quantile estimates are within 
+    a relative error of relative_accuracy of the exact value. Adding values 
+    is O(1) per value and memory grows only with the logarithm of the 
+    range of values.
+    
+    :param float relative_accuracy: Relative accuracy of quantile estimates. 
+        Defaults to 0.005
+    :param float min_value: Values with magnitude at or below min_value are 
+        counted as zero. Defaults to 1e-300
+    """
+    def __init__(self, relative_accuracy: float = 0.005, min_value: float = 1e-300):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self._gamma)
+        self.reset()
+        
+    def reset(self):
+        """Remove all values."""
+        # Bucket counts and key of first bucket for positive and negative values
+        self._stores = {1: [np.zeros(0, dtype=np.int64), 0], -1: [np.zeros(0, dtype=np.int64), 0]}
+        self._zero_count = 0
+        self.count = 0
+        
+    def _add_keys(self, sign: int, keys: ndarray):
+        if len(keys) == 0:
+            return
+        counts, offset = self._stores[sign]
+        k_min, k_max = keys.min(), keys.max()
+        if len(counts) == 0:
+            offset = k_min
+        new_offset = min(offset, k_min)
+        new_size = max(offset + len(counts), k_max + 1) - new_offset
+        if new_offset != offset or new_size != len(counts):
+            grown = np.zeros(new_size, dtype=np.int64)
+            grown[offset - new_offset:offset - new_offset + len(counts)] = counts
+            counts, offset = grown, new_offset
+        counts += np.bincount(keys - offset, minlength=len(counts))
+        self._stores[sign] = [counts, offset]
+        
+    def add(self, values: ndarray):
+        """Add values to the sketch.
+        
+        :param values: Values to add
+        :type values: ndarray
+        """
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        mag = np.abs(values)
+        nonzero = mag > self.min_value
+        keys = np.ceil(np.log(mag[nonzero]) / self._log_gamma).astype(np.int64)
+        positive = values[nonzero] > 0
+        self._add_keys(1, keys[positive])
+        self._add_keys(-1, keys[~positive])
+        self._zero_count += len(values) - np.count_nonzero(nonzero)
+        self.count += len(values)
+        
+    def merge(self, other):
+        """Add all values from another sketch with the same relative accuracy.
+        
+        :param QuantileSketch other: Sketch to merge
+        """
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+        for sign in (1, -1):
+            counts, offset = other._stores[sign]
+            self._add_keys(sign, np.repeat(np.arange(offset, offset + len(counts)), counts))
+        self._zero_count += other._zero_count
+        self.count += other.count
+        
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile of the values added so far.
+        
+        :param float q: Quantile between 0 and 1
+        :return: Estimated quantile, or NaN if the sketch is empty
+        :rtype: float
+        """
+        if self.count == 0:
+            return np.nan
+        rank = q * (self.count - 1)
+        
+        # Buckets in ascending order of value: negative (descending magnitude), zero, positive
+        neg_counts, neg_offset = self._stores[-1]
+        pos_counts, pos_offset = self._stores[1]
+        counts = np.concatenate((neg_counts[::-1], [self._zero_count], pos_counts))
+        index = np.searchsorted(np.cumsum(counts), rank, side='right')
+        
+        if index < len(neg_counts):
+            key = neg_offset + len(neg_counts) - 1 - index
+            sign = -1
+        elif index == len(neg_counts):
+            return 0.0
+        else:
+            key = pos_offset + index - len(neg_counts) - 1
+            sign = 1
+        # Midpoint (in relative terms) of bucket (gamma^(key-1), gamma^key]
+        return sign * 2 * self._gamma ** key / (self._gamma + 1)
+    
+    def robust_std(self) -> float:
+        """Estimate standard deviation from the interquartile range (see robust_std).
+        
+        :return: Estimated standard deviation
+        :rtype: float
+        """
+        return (self.quantile(0.75) - self.quantile(0.25)) / 1.349
+
+
+class StreamingOutlierDetector(object):
+    """Online equivalent of sampling.flag_outliers.
+    
+    Flags outliers chunk by chunk based on the deviation of the raw signal 
+    from a filtered signal. The inlier standard deviation is estimated from 
+    the interquartile range of all deviations received so far, which is 
+    tracked approximately with a QuantileSketch, and outlier probabilities 
+    are evaluated in log space (see outlier_log_odds). Once enough data has 
+    been received, results match flag_outliers applied to the full signal.
+    
+    :param float thresh: Probability threshold for flagging outliers. Defaults to 0.75
+    :param float p_prior: Prior probability of outliers. Defaults to 0.01
+    :param float relative_accuracy: Relative accuracy of the quantile sketch. 
+        Defaults to 0.005
+    :param int min_samples: Minimum number of samples received before any 
+        points are flagged. Defaults to 20
+    """
+    def __init__(
+            self, 
+            thresh: float = 0.75, 
+            p_prior: float = 0.01, 
+            relative_accuracy: float = 0.005,
+            min_samples: int = 20):
+        self.thresh = thresh
+        self.p_prior = p_prior
+        self.min_samples = min_samples
+        self.sketch = QuantileSketch(relative_accuracy)
+        
+    def reset(self):
+        """Clear all received data."""
+        self.sketch.reset()
+        
+    @property
+    def std(self) -> float:
+        """Current estimate of the inlier standard deviation."""
+        return self.sketch.robust_std()
+        
+    def flag(self, y_raw: ndarray, y_filt: ndarray) -> ndarray:
+        """Flag outliers using the current deviation statistics, without 
+        adding the data to them.
+        
+        :param y_raw: Raw signal array
+        :type y_raw: ndarray
+        :param y_filt: Filtered signal array
+        :type y_filt: ndarray
+        :return: Boolean array of outlier flags
+        :rtype: ndarray
+        """
+        dev = np.asarray(y_filt, dtype=float) - np.asarray(y_raw, dtype=float)
+        if self.sketch.count < self.min_samples:
+            return np.zeros(dev.shape, dtype=bool)
+        
+        std = self.std
+        abs_dev = np.abs(dev)
+        sigma_out = np.maximum(abs_dev, 0.01 * std)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_odds = outlier_log_odds(dev, 0, std, sigma_out, self.p_prior)
+        return (log_odds > logit(self.thresh)) & (abs_dev > std)
+    
+    def update(self, y_raw: ndarray, y_filt: ndarray) -> ndarray:
+        """Add a chunk of data and flag outliers within it.
+        
+        :param y_raw: Raw signal array
+        :type y_raw: ndarray
+        :param y_filt: Filtered signal array
+        :type y_filt: ndarray
+        :return: Boolean array of outlier flags
+        :rtype: ndarray
+        """
+        self.sketch.add(np.asarray(y_filt, dtype=float) - np.asarray(y_raw, dtype=float))
+        return self.flag(y_raw, y_filt)
+    
+    def clean(self, y_raw: ndarray, y_filt: ndarray) -> ndarray:
+        """Add a chunk of data and replace outliers with filtered values.
+        
+        :param y_raw: Raw signal array
+        :type y_raw: ndarray
+        :param y_filt: Filtered signal array
+        :type y_filt: ndarray
+        :return: Cleaned signal
+        :rtype: ndarray
+        """
+        flags = self.update(y_raw, y_filt)
+        return np.where(flags, y_filt, y_raw)
@@ -0,0 +1,388 @@
+"""Online step detection and downsampling of chrono data.
+
+Provides a streaming counterpart to chrono.downsample_data for monitoring
+running chronoamperometry/chronopotentiometry measurements. Data is
+processed chunk by chunk with bounded memory, and decimated samples are
+emitted as soon as they are final.
+"""
+
+import numpy as np
+from numpy import ndarray
+from typing import Optional, Tuple, List
+
+from .chrono import ControlMode, get_io_signals
+
+
+class StreamingDownsampler(object):
+    """Incremental step detector and downsampler for live chrono data.
+
+    Chunks of (times, i, v) are passed to update as they are acquired. Steps
+    in the input signal are detected online with the same criterion as
+    sampling.find_steps (with allow_consecutive=False), using the median
+    absolute difference over a bounded window of recent samples. Within each
+    step, samples are kept on the same log-spaced grid as
+    sampling.get_decimation_index (with init_samples=None): the first
+    decimation_interval + 1 samples, then blocks of decimation_interval
+    samples with sample interval int(decimation_factor ** j), plus the last
+    sample of the step.
+
+    If antialiased, each kept sample is smoothed with a Gaussian whose width
+    is determined as in sampling.filter_chrono_signals: limited by the
+    distance to neighboring kept samples and by the time since the step, and
+    capped at max_sigma. A kept sample is emitted once the data within its
+    filter radius has been received. Only the look-back needed for pending
+    samples is buffered, such that memory is bounded by truncate * max_sigma
+    plus the chunk size.
+
+    :param mode: Control mode, which determines the input signal used for step detection
+    :type mode: ControlMode
+    :param t_sample: Sample period. If None, estimated from the first chunk. Defaults to None
+    :type t_sample: Optional[float]
+    :param decimation_interval: Number of samples per decimation block. Defaults to 10
+    :type decimation_interval: int
+    :param decimation_factor: Factor by which the sample interval increases in each block.
+        Defaults to 2.0
+    :type decimation_factor: float
+    :param max_interval: Maximum sampling interval in seconds. Defaults to None
+    :type max_interval: Optional[float]
+    :param antialiased: Apply anti-aliasing filter to kept samples. Defaults to True
+    :type antialiased: bool
+    :param sigma_factor: Factor controlling filter strength. Defaults to 0.01
+    :type sigma_factor: float
+    :param max_sigma: Maximum filter sigma in samples. If None, set to sigma_factor / t_sample.
+        Defaults to None
+    :type max_sigma: Optional[float]
+    :param truncate: Truncate filter at this many standard deviations. Defaults to 4.0
+    :type truncate: float
+    :param min_sigma: Minimum effective sigma (below this, no filtering applied). Defaults to 0.25
+    :type min_sigma: float
+    :param rthresh: Step threshold as multiple of median absolute difference. Defaults to 20
+    :type rthresh: float
+    :param athresh: Absolute threshold for step size. Defaults to 1e-10
+    :type athresh: float
+    :param median_window: Number of recent differences used for the median. Defaults to 10000
+    :type median_window: int
+    """
+    def __init__(
+            self,
+            mode: ControlMode,
+            t_sample: Optional[float] = None,
+            decimation_interval: int = 10,
+            decimation_factor: float = 2.0,
+            max_interval: Optional[float] = None,
+            antialiased: bool = True,
+            sigma_factor: float = 0.01,
+            max_sigma: Optional[float] = None,
+            truncate: float = 4.0,
+            min_sigma: float = 0.25,
+            rthresh: float = 20,
+            athresh: float = 1e-10,
+            median_window: int = 10000):
+
+        self.mode = mode
+        self.t_sample = t_sample
+        self.decimation_interval = decimation_interval
+        self.decimation_factor = decimation_factor
+        self.max_interval = max_interval
+        self.antialiased = antialiased
+        self.sigma_factor = sigma_factor
+        self.max_sigma = max_sigma
+        self.truncate = truncate
+        self.min_sigma = min_sigma
+        self.rthresh = rthresh
+        self.athresh = athresh
+        self.median_window = median_window
+
+        self.reset()
+
+    def reset(self):
+        """Clear all state to begin a new measurement.
+        """
+        # Buffered data and global index of first buffered sample
+        self._buffer = np.empty((3, 0))
+        self._buffer_start = 0
+        self._num_samples = 0
+
+        # Step detection state
+        self._dy_window = np.empty(0)
+        self._last_input = None
+        self._last_detected = -2
+        self._step_index = []
+
+        # Decimation grid: (base offset, interval) of each block
+        self._blocks = []
+
+        # Current step state
+        self._step_start = 0
+        self._next_offset = 0
+        self._last_kept = None
+        self._pending = []
+
+        self._finalized = False
+
+    @property
+    def num_samples(self) -> int:
+        """Number of samples received."""
+        return self._num_samples
+
+    @property
+    def step_index(self) -> ndarray:
+        """Indices of detected steps."""
+        return np.array(self._step_index, dtype=int)
+
+    @property
+    def max_sample_interval(self):
+        if self.max_interval is None or self.t_sample is None:
+            return np.inf
+        return int(self.max_interval / self.t_sample)
+
+    @property
+    def buffer_size(self) -> int:
+        """Number of samples currently buffered."""
+        return self._buffer.shape[1]
+
+    def update(self, times: ndarray, i_signal: ndarray, v_signal: ndarray) \
+            -> Tuple[Tuple[ndarray, ndarray, ndarray], ndarray]:
+        """Process a chunk of data.
+
+        :param times: Time array for the chunk
+        :type times: ndarray
+        :param i_signal: Current signal for the chunk
+        :type i_signal: ndarray
+        :param v_signal: Voltage signal for the chunk
+        :type v_signal: ndarray
+        :return: Tuple of ((times, i, v), sample_indices) for samples that became final
+        :rtype: Tuple[Tuple[ndarray, ndarray, ndarray], ndarray]
+        """
+        if self._finalized:
+            raise RuntimeError('StreamingDownsampler has been finalized. Call reset to start a new measurement')
+
+        chunk = np.array([times, i_signal, v_signal], dtype=float)
+        if chunk.shape[1] == 0:
+            return self._emit([])
+
+        if self.t_sample is None and self._num_samples + chunk.shape[1] > 1:
+            all_times = np.concatenate((self._buffer[0, -1:], chunk[0]))
+            self.t_sample = float(np.median(np.diff(all_times)))
+        if self.max_sigma is None and self.t_sample is not None:
+            self.max_sigma = self.sigma_factor / self.t_sample
+
+        chunk_start = self._num_samples
+        self._buffer = np.concatenate((self._buffer, chunk), axis=1)
+        self._num_samples += chunk.shape[1]
+
+        # Detect steps
+        s_in, _ = get_io_signals(chunk[1], chunk[2], self.mode)
+        new_steps = self._detect_steps(s_in, chunk_start)
+
+        if self.t_sample is None:
+            # Need at least two samples to determine the decimation grid
+            return self._emit([])
+
+        # Close the current step at each new step, then process the open step
+        emitted = []
+        for step in new_steps:
+            emitted += self._advance(step, step_end=step)
+            self._start_step(step)
+        emitted += self._advance(self._num_samples, step_end=None)
+
+        self._trim_buffer()
+
+        return self._emit(emitted)
+
+    def finalize(self) -> Tuple[Tuple[ndarray, ndarray, ndarray], ndarray]:
+        """Mark the end of the measurement and emit all remaining samples.
+
+        :return: Tuple of ((times, i, v), sample_indices) for remaining samples
+        :rtype: Tuple[Tuple[ndarray, ndarray, ndarray], ndarray]
+        """
+        emitted = []
+        if not self._finalized and self._num_samples > 0:
+            emitted = self._advance(self._num_samples, step_end=self._num_samples)
+        self._finalized = True
+        return self._emit(emitted)
+
+    # Step detection
+    # --------------
+    def _detect_steps(self, s_in: ndarray, chunk_start: int) -> List[int]:
+        if self._last_input is not None:
+            s_in = np.concatenate(([self._last_input], s_in))
+            offset = chunk_start
+        else:
+            offset = chunk_start + 1
+        self._last_input = s_in[-1]
+
+        abs_dy = np.abs(np.diff(s_in))
+        if len(abs_dy) == 0:
+            return []
+
+        # Threshold from median over recent differences
+        self._dy_window = np.concatenate((self._dy_window, abs_dy))[-self.median_window:]
+        thresh = np.median(self._dy_window) * self.rthresh
+
+        detected = np.where((abs_dy >= thresh) & (abs_dy >= self.athresh))[0] + offset
+
+        # Eliminate consecutive steps
+        steps = []
+        for index in detected:
+            if index != self._last_detected + 1:
+                steps.append(int(index))
+            self._last_detected = index
+
+        self._step_index += steps
+        return steps
+
+    # Decimation grid
+    # ---------------
+    def _get_block(self, j: int):
+        # Get (base offset, interval) of jth decimation block (0-based), extending grid as needed
+        while len(self._blocks) <= j:
+            if len(self._blocks) == 0:
+                base = self.decimation_interval
+            else:
+                prev_base, prev_interval = self._blocks[-1]
+                base = prev_base + self.decimation_interval * prev_interval
+            interval = min(int(self.decimation_factor ** (len(self._blocks) + 1)), self.max_sample_interval)
+            self._blocks.append((base, interval))
+        return self._blocks[j]
+
+    def _block_length(self, interval):
+        # Number of samples in a block. Block at maximum interval continues indefinitely
+        if interval == self.max_sample_interval:
+            return np.inf
+        return self.decimation_interval
+
+    def _grid_offsets(self, lo: int, hi: int) -> List[int]:
+        # Grid offsets in [lo, hi) relative to step start
+        offsets = list(range(lo, min(hi, self.decimation_interval + 1)))
+        j = 0
+        while True:
+            base, interval = self._get_block(j)
+            if base >= hi - 1:
+                break
+            m_min = max(1, -(-(lo - base) // interval))
+            m_max = min(self._block_length(interval), (hi - 1 - base) // interval)
+            if m_max >= m_min:
+                offsets += list(range(base + interval * m_min, base + interval * int(m_max) + 1, interval))
+            if self._block_length(interval) == np.inf:
+                break
+            j += 1
+        return offsets
+
+    def _next_grid_offset(self, k: int) -> int:
+        # Smallest grid offset greater than k
+        if k < self.decimation_interval:
+            return k + 1
+        j = 0
+        while True:
+            base, interval = self._get_block(j)
+            m = (k - base) // interval + 1
+            if m <= self._block_length(interval):
+                return base + interval * m
+            j += 1
+
+    # Step processing
+    # ---------------
+    def _start_step(self, step: int):
+        self._step_start = step
+        self._next_offset = 0
+
+    def _advance(self, available: int, step_end: Optional[int]):
+        # Add grid samples of current step up to available (exclusive) to pending,
+        # then emit pending samples whose filter window is complete.
+        # If step_end is given, the current step ends at step_end
+        hi = available - self._step_start
+        offsets = self._grid_offsets(self._next_offset, hi)
+        if step_end is not None and hi > 0 and (len(offsets) == 0 or offsets[-1] != hi - 1):
+            # Last sample of step is always kept
+            offsets.append(hi - 1)
+        self._pending += [self._step_start + k for k in offsets]
+        self._next_offset = max(self._next_offset, hi)
+
+        emitted = []
+        while len(self._pending) > 0:
+            index = self._pending[0]
+            sigma, radius = self._get_sigma(index, step_end)
+            if step_end is None and index + radius >= available:
+                # Wait for more data
+                break
+            emitted.append((index, sigma, step_end))
+            self._last_kept = index
+            self._pending.pop(0)
+
+        # Compute values while the window is buffered
+        return [self._get_values(index, sigma, end) for index, sigma, end in emitted]
+
+    def _get_sigma(self, index: int, step_end: Optional[int]):
+        # Filter sigma and radius (in samples) for a kept sample
+        if not self.antialiased or self.max_sigma is None:
+            return 0, 0
+
+        k = index - self._step_start
+        if step_end is not None and index == step_end - 1:
+            # Last sample in step: don't consider the next step
+            rdiff = np.inf
+        else:
+            next_index = self._step_start + self._next_grid_offset(k)
+            if step_end is not None:
+                next_index = min(next_index, step_end - 1)
+            rdiff = next_index - index
+
+        ldiff = rdiff if self._last_kept is None else index - self._last_kept
+        min_diff = min(ldiff, rdiff)
+        if min_diff < 2:
+            # Don't filter undecimated regions
+            return 0, 0
+
+        # Sigma such that truncate * sigma reaches halfway to nearest sample
+        sigma = min_diff / (2 * self.truncate)
+
+        # Ideal sigma from inverse sqrt of maximum curvature of RC relaxation
+        sigma_ideal = np.exp(1) * (k + 1) / 2
+        sigma = min(sigma, self.sigma_factor * sigma_ideal, self.max_sigma)
+
+        if sigma < self.min_sigma:
+            return 0, 0
+
+        return sigma, int(self.truncate * sigma + 0.5)
+
+    def _get_values(self, index: int, sigma: float, step_end: Optional[int]):
+        # Get (filtered) time, current, and voltage at index
+        if sigma == 0:
+            return index, self._buffer[:, index - self._buffer_start]
+
+        radius = int(self.truncate * sigma + 0.5)
+        lo = self._step_start
+        hi = self._num_samples if step_end is None else step_end
+
+        # Reflect at step boundaries, consistent with filtering each step separately
+        window = np.arange(index - radius, index + radius + 1)
+        window = np.where(window < lo, 2 * lo - window - 1, window)
+        window = np.where(window >= hi, 2 * hi - window - 1, window)
+        window = np.clip(window, lo, hi - 1)
+
+        weights = np.exp(-0.5 * ((np.arange(-radius, radius + 1)) / sigma) ** 2)
+        weights /= np.sum(weights)
+
+        values = self._buffer[:, index - self._buffer_start].copy()
+        values[1:] = self._buffer[1:, window - self._buffer_start] @ weights
+
+        return index, values
+
+    def _trim_buffer(self):
+        # Discard samples that are no longer needed for pending or future samples
+        radius = 0 if self.max_sigma is None else int(self.truncate * self.max_sigma + 0.5)
+        keep_from = self._num_samples - 1
+        if len(self._pending) > 0:
+            keep_from = min(keep_from, self._pending[0])
+        keep_from = max(keep_from - radius, self._buffer_start)
+
+        self._buffer = self._buffer[:, keep_from - self._buffer_start:]
+        self._buffer_start = keep_from
+
+    def _emit(self, emitted):
+        if len(emitted) == 0:
+            return (np.empty(0), np.empty(0), np.empty(0)), np.empty(0, dtype=int)
+        index = np.array([e[0] for e in emitted], dtype=int)
+        values = np.array([e[1] for e in emitted]).T
+        return (values[0], values[1], values[2]), index
@@ -1,4 +1,7 @@
-from typing import Tuple, Optional
+import numpy as np
+from numpy import ndarray
+from bisect import bisect_right
+from typing import Tuple, Optional, List
 
 class UnitPrefix(object):
     """Handle scaling conversions.
@@ -23,6 +26,9 @@ class UnitPrefix(object):
 
     reverse_scale_map = {v: k for k, v in scale_map.items()}
 
+    # Prefixes and scales sorted by ascending scale, for fast prefix selection
+    _sorted_prefixes, _sorted_scales = zip(*sorted(scale_map.items(), key=lambda item: item[1]))
+
     chr_map = {
         'mu': 181
     }
@@ -55,29 +61,53 @@ class UnitPrefix(object):
         :return: UnitPrefix object with appropriate prefix
         :rtype: UnitPrefix
         """
-        # Get scale options from largest to smallest
-        scales = list(reversed(sorted(list(cls.reverse_scale_map.keys()))))
-        
-        # Limit available scales
-        if min_factor is not None:
-            scales = [s for s in scales if s >= min_factor]
-        if max_factor is not None:
-            scales = [s for s in scales if s <= max_factor]
+        prefixes, scales = cls._scale_options(min_factor, max_factor)
 
         if value == 0 or value is None:
-            scale = 1
+            prefix = ''
         else:
             # Set floor on magnitude to ensure that a matching scale is found
-            value = max(abs(value), min(scales))
+            value = max(abs(value), scales[0])
             
             # Get largest scale that is less than value
-            scale = next(s for s in scales if value >= s)
-
-        # Get corresponding prefix
-        prefix = cls.reverse_scale_map[scale]
+            prefix = prefixes[bisect_right(scales, value) - 1]
 
         return cls(prefix)
 
+    @classmethod
+    def _scale_options(cls, min_factor=None, max_factor=None):
+        # Get available prefixes and scales, sorted by ascending scale
+        if min_factor is None and max_factor is None:
+            return cls._sorted_prefixes, cls._sorted_scales
+        
+        options = [(p, s) for p, s in zip(cls._sorted_prefixes, cls._sorted_scales)
+                   if (min_factor is None or s >= min_factor) and (max_factor is None or s <= max_factor)]
+        if len(options) == 0:
+            raise ValueError(f"No unit prefixes between min_factor={min_factor} and max_factor={max_factor}")
+        prefixes, scales = zip(*options)
+        return prefixes, scales
+
+    @classmethod
+    def prefixes_from_values(cls, values, min_factor=None, max_factor=None) -> ndarray:
+        """Select appropriate SI prefixes for an array of values.
+        
+        Vectorized equivalent of from_value.
+        
+        :param values: Numeric values to determine prefixes for
+        :type values: array-like
+        :param float min_factor: Minimum scale factor to consider, defaults to None
+        :param float max_factor: Maximum scale factor to consider, defaults to None
+        :return: Array of prefix strings with the same shape as values
+        :rtype: ndarray
+        """
+        prefixes, scales = cls._scale_options(min_factor, max_factor)
+        prefixes = np.array(prefixes + ('',), dtype=object)
+        
+        values = np.abs(np.asarray(values, dtype=float))
+        index = np.searchsorted(scales, np.maximum(values, scales[0]), side="right") - 1
+        # Zero values have no prefix
+        index = np.where(values == 0, len(scales), index)
+        return prefixes[index]
 
     def set_prefix(self, prefix):
         """Set the unit prefix.
@@ -170,6 +200,34 @@ def get_scaled_value_and_prefix(value, min_factor: float = None, max_factor: flo
     unit = UnitPrefix.from_value(value, min_factor=min_factor, max_factor=max_factor)
     return unit.raw_to_scaled(value), unit.char
     
+def get_scaled_values_and_prefixes(values, min_factor: float = None, max_factor: float = None) -> Tuple[list, List[str]]:
+    """Get scaled values and prefix characters for a list of values.
+    
+    Vectorized equivalent of get_scaled_value and get_prefix_char applied to
+    each value. Non-numeric entries (e.g. None or strings) are returned 
+    unchanged with an empty prefix.
+    
+    :param list values: Raw values
+    :param float min_factor: Minimum scale factor to consider, defaults to None
+    :param float max_factor: Maximum scale factor to consider, defaults to None
+    :return: Tuple of (scaled_values, prefix_chars)
+    :rtype: Tuple[list, List[str]]
+    """
+    values = list(values)
+    scaled_vals = list(values)
+    chars = [""] * len(values)
+    
+    numeric_index = [k for k, v in enumerate(values) if isinstance(v, (int, float, np.integer, np.floating))]
+    if len(numeric_index) > 0:
+        numeric_vals = np.array([values[k] for k in numeric_index], dtype=float)
+        prefixes = UnitPrefix.prefixes_from_values(numeric_vals, min_factor, max_factor)
+        scales = np.array([UnitPrefix.scale_map[p] for p in prefixes], dtype=float)
+        for k, v, p in zip(numeric_index, (numeric_vals / scales).tolist(), prefixes):
+            scaled_vals[k] = v
+            chars[k] = chr(UnitPrefix.chr_map[p]) if p in UnitPrefix.chr_map else p
+        
+    return scaled_vals, chars
+    
 # Enumerate all possible prefix characters
 ALL_PREFIXES = [get_prefix_char(v) for v in UnitPrefix.scale_map.values()]
 
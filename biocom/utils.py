@@ -50,9 +50,25 @@ def isiterable(a) -> bool:
         return False
     
     
+def is_sorted(x: ndarray) -> bool:
+    """Check if an array is sorted in non-decreasing order.
+    
+    :param ndarray x: 1D array to check
+    :return: True if x is sorted
+    :rtype: bool
+    """
+    x = np.asarray(x)
+    return len(x) < 2 or bool(np.all(x[1:] >= x[:-1]))
+
+
 def nearest_index(x_array: ndarray, x_val: Union[float, ndarray], constraint: Optional[int] = None):
     """Get index of x_array corresponding to value closest to x_val.
     
+    Uses binary search (np.searchsorted), which requires O(N + M) memory 
+    and O(M log N) time for M values in an array of length N. If x_array 
+    is not sorted, it is sorted first. As with np.argmin, the first matching 
+    index is returned in case of ties.
+    
     :param ndarray x_array: Array in which to search
     :param x_val: Value(s) to match
     :type x_val: float or ndarray
@@ -61,31 +77,51 @@ def nearest_index(x_array: ndarray, x_val: Union[float, ndarray], constraint: Op
     :rtype: int or ndarray
     :raises ValueError: If no index satisfies the constraint
     """
-    if constraint is None:
-        def func(arr, x):
-            return np.abs(arr - x)
-    elif constraint in [-1, 1]:
-        def func(arr, x):
-            out = np.zeros_like(arr) + np.inf
-            constraint_index = constraint * arr >= constraint * x
-            out[constraint_index] = constraint * (arr - x)[constraint_index]
-            return out
-    else:
+    if constraint not in [None, -1, 1]:
         raise ValueError(f'Invalid constraint argument {constraint}. Options: None, -1, 1')
-
-    if np.isscalar(x_val):
-        obj_func = func(x_array, x_val)
-        index = np.argmin(obj_func)
-        max_of = obj_func
+    
+    x_array = np.asarray(x_array).ravel()
+    x = np.atleast_1d(np.asarray(x_val)).ravel()
+    n = len(x_array)
+    
+    if is_sorted(x_array):
+        order = None
+        xs = x_array
     else:
-        aa, bb = np.meshgrid(x_array, np.array(x_val))
-        obj_func = func(aa, bb)
-        index = np.argmin(obj_func, axis=1)
-        max_of = np.max(obj_func[index])
+        # Stable sort so that the first of any repeated values maps to the lowest index
+        order = np.argsort(x_array, kind='stable')
+        xs = x_array[order]
         
+    def first_occurrence(k):
+        # Position of the first entry in xs equal to xs[k]
+        return np.searchsorted(xs, xs[k], side='left')
+    
+    def to_index(k):
+        return k if order is None else order[k]
+        
+    if constraint == 1:
+        # Smallest value >= x_val
+        k = np.searchsorted(xs, x, side='left')
+        valid = k < n
+        index = to_index(np.minimum(k, n - 1))
+    elif constraint == -1:
+        # Largest value <= x_val
+        k = np.searchsorted(xs, x, side='right') - 1
+        valid = k >= 0
+        index = to_index(first_occurrence(np.maximum(k, 0)))
+    else:
+        # Closest value on either side of x_val
+        hi = np.minimum(np.searchsorted(xs, x, side='left'), n - 1)
+        lo = first_occurrence(np.maximum(hi - 1, 0))
+        d_lo = np.abs(xs[lo] - x)
+        d_hi = np.abs(xs[hi] - x)
+        index_lo = to_index(lo)
+        index_hi = to_index(hi)
+        index = np.where(d_hi < d_lo, index_hi, np.where(d_lo < d_hi, index_lo, np.minimum(index_lo, index_hi)))
+        valid = None
 
     # Validate index
-    if max_of == np.inf:
+    if valid is not None and not np.all(valid):
         if constraint == -1:
             min_val = np.min(x_array)
             raise ValueError(f'No index satisfying {constraint} constraint: minimum array value {min_val} '
@@ -95,6 +131,8 @@ def nearest_index(x_array: ndarray, x_val: Union[float, ndarray], constraint: Op
             raise ValueError(f'No index satisfying {constraint} constraint: maximum array value {max_val} '
                              f'is less than target value {x_val}')
 
+    if np.isscalar(x_val):
+        return index[0]
     return index
 
 
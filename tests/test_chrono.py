@@ -0,0 +1,113 @@
+"""Equivalence tests for steady-state step aggregation and batched I-V processing."""
+import numpy as np
+import pytest
+
+from biocom.processing import chrono
+from biocom.processing.chrono import ControlMode
+from biocom.processing.sampling import (
+    find_steps, step_times2index, split_steps, segment_step_values
+)
+
+
+def reference_dc_step_values(times, i_signal, v_signal, mode, step_times=None, window_fraction=0.1,
+                             min_agg_points=5, agg='median', use_longest_step=True):
+    # Per-step loop implementation of get_dc_step_values
+    s_in, _ = chrono.get_io_signals(i_signal, v_signal, mode)
+    if step_times is None:
+        step_index = find_steps(s_in, allow_consecutive=False)
+    else:
+        step_index = step_times2index(times, step_times)
+
+    long_step_index = None
+    if use_longest_step:
+        step_durations = np.array([ts[-1] - ts[0] for ts in split_steps(times, step_index)])
+        sin_rnd_vals = segment_step_values(s_in, step_index)
+        long_step_index = []
+        for si in np.unique(sin_rnd_vals):
+            index = np.where(sin_rnd_vals == si)[0]
+            long_step_index.append(index[np.argmax(step_durations[index])])
+
+    step_agg_vals = []
+    for sig in (i_signal, v_signal):
+        s_split = split_steps(sig, step_index)
+        if long_step_index is not None:
+            s_split = [s_split[k] for k in long_step_index]
+        step_agg_vals.append(np.array([
+            getattr(np, agg)(x[-max(min_agg_points, int(len(x) * window_fraction)):]) for x in s_split
+        ]))
+    return step_agg_vals
+
+
+def make_staircase(rng, mode, levels, step_lengths, t_sample=1e-2):
+    # Stepped input with repeated levels and a linear, relaxing response
+    num_samples = np.sum(step_lengths)
+    times = np.arange(num_samples) * t_sample
+    s_in = np.repeat(levels, step_lengths) + rng.normal(0, 1e-4 * np.ptp(levels), num_samples)
+    s_out = 0.8 + 2.5 * s_in + rng.normal(0, 1e-4, num_samples)
+    starts = np.cumsum(step_lengths)[:-1]
+    for k in starts:
+        s_out[k:] += 0.3 * (s_in[k] - s_in[k - 1]) * np.exp(-(times[k:] - times[k]) / 0.05)
+    step_times = times[starts]
+    if mode == ControlMode.GALV:
+        return times, s_in, s_out, step_times
+    return times, s_out, s_in, step_times
+
+
+def random_staircase(rng, mode, num_samples=None):
+    # Repeated levels, with adjacent steps always differing
+    values = np.array([-2e-3, -1e-3, 0, 1e-3, 2e-3])
+    levels = [rng.choice(values)]
+    for _ in range(7):
+        levels.append(rng.choice(values[values != levels[-1]]))
+    if num_samples is None:
+        # Equal step lengths produce ties in step duration
+        step_lengths = rng.choice([40, 80], len(levels))
+    else:
+        step_lengths = np.diff(np.linspace(0, num_samples, len(levels) + 1).astype(int))
+    return make_staircase(rng, mode, levels, step_lengths)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("mode", [ControlMode.GALV, ControlMode.POT])
+@pytest.mark.parametrize("use_longest_step", [True, False])
+@pytest.mark.parametrize("use_step_times", [True, False])
+def test_get_dc_step_values_matches_reference(seed, mode, use_longest_step, use_step_times):
+    rng = np.random.default_rng(seed)
+    times, i_signal, v_signal, step_times = random_staircase(rng, mode)
+    step_times = step_times if use_step_times else None
+
+    result = chrono.get_dc_step_values(times, i_signal, v_signal, mode, step_times,
+                                       use_longest_step=use_longest_step)
+    expected = reference_dc_step_values(times, i_signal, v_signal, mode, step_times,
+                                        use_longest_step=use_longest_step)
+    for r, e in zip(result, expected):
+        np.testing.assert_array_equal(r, e)
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("mode", [ControlMode.GALV, ControlMode.POT])
+@pytest.mark.parametrize("common_time", [True, False])
+def test_process_ivt_simple_batch_matches_single(seed, mode, common_time):
+    rng = np.random.default_rng(seed)
+    num_samples = 400 if common_time else None
+    datasets = [random_staircase(rng, mode, num_samples) for _ in range(6)]
+    if common_time:
+        # Common time base and steps, different signals
+        times = datasets[0][0]
+        step_times = datasets[0][3]
+        i_signals = np.array([d[1] for d in datasets])
+        v_signals = np.array([d[2] for d in datasets])
+        times_list = [times] * len(datasets)
+    else:
+        step_times = None
+        times = times_list = [d[0] for d in datasets]
+        i_signals = [d[1] for d in datasets]
+        v_signals = [d[2] for d in datasets]
+
+    for st in (step_times, None):
+        result = chrono.process_ivt_simple_batch(times, i_signals, v_signals, mode, st)
+        expected = [chrono.process_ivt_simple(t, i, v, mode, st)
+                    for t, i, v in zip(times_list, i_signals, v_signals)]
+        for attr in ("i_mid", "v_mid", "dvdi"):
+            np.testing.assert_allclose(getattr(result, attr), [getattr(e, attr) for e in expected],
+                                       rtol=1e-9, atol=1e-12)
@@ -0,0 +1,83 @@
+"""Equivalence tests for the nonuniform Gaussian filter and its full-array counterpart."""
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from biocom.filters import nonuniform_gaussian_filter1d
+
+
+def reference_nonuniform_gaussian_filter1d(a, sigma, axis=-1, mode='reflect', cval=0.0, truncate=4, order=0,
+                                           sigma_node_factor=1.5, min_sigma=0.25):
+    # Filter the full array at every sigma node and average with node weights
+    sigma = np.maximum(np.broadcast_to(sigma, a.shape), 1e-8)
+    if np.max(sigma) <= 1e-8:
+        return a
+
+    min_ls = max(np.min(np.log10(sigma)), np.log10(min_sigma))
+    max_ls = max(np.max(np.log10(sigma)), np.log10(min_sigma))
+    num_nodes = int(np.ceil((max_ls - min_ls) / np.log10(sigma_node_factor))) + 1
+    sigma_nodes = np.logspace(min_ls, max_ls, num_nodes)
+
+    if np.min(sigma) < min_sigma:
+        factor = sigma_nodes[-1] / sigma_nodes[-2] if len(sigma_nodes) > 1 else sigma_node_factor
+        sigma = np.maximum(sigma, min_sigma / (factor ** 2))
+        while sigma_nodes[0] > np.min(sigma) * 1.001:
+            sigma_nodes = np.insert(sigma_nodes, 0, sigma_nodes[0] / factor)
+
+    node_delta = np.log(sigma_nodes[-1] / sigma_nodes[-2]) if len(sigma_nodes) > 1 else 1
+
+    out = np.zeros(a.shape)
+    for node in sigma_nodes:
+        if node < min_sigma:
+            node_output = a
+        else:
+            node_output = ndimage.gaussian_filter1d(a, node, axis=axis, mode=mode, cval=cval, truncate=truncate,
+                                                    order=order)
+        out += node_output * (1 - np.minimum(np.abs(np.log(sigma / node)) / node_delta, 1))
+    return out
+
+
+def make_sigma(rng, num_samples):
+    # Piecewise log-linear sigma spanning unfiltered and heavily filtered ranges
+    knots = np.sort(rng.integers(0, num_samples, 4))
+    log_sigma = np.interp(np.arange(num_samples), knots, rng.uniform(-2, 1.7, 4))
+    return 10 ** log_sigma
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("mode", ['reflect', 'nearest', 'constant', 'mirror', 'wrap'])
+@pytest.mark.parametrize("order", [0, 1])
+def test_direct_matches_reference_1d(seed, mode, order):
+    rng = np.random.default_rng(seed)
+    num_samples = int(rng.integers(50, 2000))
+    a = np.cumsum(rng.normal(size=num_samples))
+    sigma = make_sigma(rng, num_samples)
+
+    result = nonuniform_gaussian_filter1d(a, sigma, mode=mode, cval=0.5, order=order, method='direct')
+    expected = reference_nonuniform_gaussian_filter1d(a, sigma, mode=mode, cval=0.5, order=order)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-10 * np.max(np.abs(expected)))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_direct_matches_reference_2d(seed):
+    rng = np.random.default_rng(seed)
+    a = np.cumsum(rng.normal(size=(3, 500)), axis=-1)
+
+    # Sigma shared across rows
+    sigma = make_sigma(rng, a.shape[-1])
+    result = nonuniform_gaussian_filter1d(a, sigma, method='direct')
+    expected = reference_nonuniform_gaussian_filter1d(a, sigma)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-10 * np.max(np.abs(expected)))
+
+    # Sigma for each element
+    sigma = np.array([make_sigma(rng, a.shape[-1]) for _ in range(len(a))])
+    result = nonuniform_gaussian_filter1d(a, sigma, method='direct')
+    expected = reference_nonuniform_gaussian_filter1d(a, sigma)
+    np.testing.assert_allclose(result, expected, rtol=0, atol=1e-10 * np.max(np.abs(expected)))
+
+
+def test_constant_sigma_matches_gaussian_filter1d():
+    rng = np.random.default_rng(0)
+    a = rng.normal(size=300)
+    result = nonuniform_gaussian_filter1d(a, np.full(len(a), 3.0), method='direct')
+    np.testing.assert_allclose(result, ndimage.gaussian_filter1d(a, 3.0, truncate=4), rtol=0, atol=1e-12)
@@ -0,0 +1,43 @@
+"""Equivalence tests for the numba kernels and their NumPy counterparts."""
+import numpy as np
+import pytest
+
+pytest.importorskip("numba")
+
+from biocom.processing import sampling
+
+
+def make_step_signal(rng):
+    # Piecewise-constant signal with noise
+    levels = rng.normal(size=8) * 5
+    y = np.repeat(levels, rng.integers(1, 50, len(levels))).astype(float)
+    return y + rng.normal(size=len(y)) * 1e-3
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("allow_consecutive", [True, False])
+def test_find_steps_jit_matches_numpy(seed, allow_consecutive):
+    rng = np.random.default_rng(seed)
+    for _ in range(100):
+        y = make_step_signal(rng)
+        expected = sampling.find_steps(y, allow_consecutive, use_jit=False)
+        result = sampling.find_steps(y, allow_consecutive, use_jit=True)
+        np.testing.assert_array_equal(result, expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_get_decimation_index_jit_matches_numpy(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(100):
+        num_samples = int(rng.integers(5, 3000))
+        step_index = np.unique(rng.integers(1, num_samples, int(rng.integers(1, 8))))
+        init_samples = None if rng.random() < 0.5 else int(rng.integers(2, 30))
+        decimation_interval = int(rng.integers(1, 40))
+        decimation_factor = float(rng.choice([1.3, 1.5, 2.0, 3.0]))
+        max_t_sample = None if rng.random() < 0.5 else float(rng.choice([0.02, 0.05, 0.3]))
+        times = np.arange(num_samples) * 0.01
+
+        args = (times, step_index, 0.01, init_samples, decimation_interval, decimation_factor, max_t_sample)
+        expected = sampling.get_decimation_index(*args, use_jit=False)
+        result = sampling.get_decimation_index(*args, use_jit=True)
+        np.testing.assert_array_equal(result, expected)
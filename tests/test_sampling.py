@@ -0,0 +1,140 @@
+"""Equivalence tests for step and decimation indexing and chrono filtering."""
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from biocom.processing import sampling
+from biocom.filters import nonuniform_gaussian_filter1d
+
+
+def reference_decimation_index(times, step_index, t_sample, init_samples, decimation_interval,
+                               decimation_factor, max_t_sample):
+    # Step-by-step loop implementation of get_decimation_index
+    if init_samples is not None:
+        keep_indices = [np.unique(np.linspace(0, step_index[0] - 1, init_samples).round(0).astype(int))]
+    else:
+        if step_index[0] > 0:
+            step_index = np.insert(step_index, 0, 0)
+        keep_indices = []
+
+    max_sample_interval = np.inf if max_t_sample is None else int(max_t_sample / t_sample)
+
+    for i, start_index in enumerate(step_index):
+        next_step_index = len(times) if start_index == step_index[-1] else step_index[i + 1]
+        undec_index = np.arange(start_index, min(start_index + decimation_interval + 1, next_step_index))
+        keep_indices.append(undec_index)
+        last_index = undec_index[-1]
+        j = 1
+        while last_index < next_step_index - 1:
+            sample_interval = min(int(decimation_factor ** j), max_sample_interval)
+            if sample_interval == max_sample_interval:
+                interval_end_index = next_step_index
+            else:
+                interval_end_index = min(last_index + decimation_interval * sample_interval + 1, next_step_index)
+            keep_index = np.arange(last_index + sample_interval, interval_end_index, sample_interval)
+            if len(keep_index) == 0:
+                keep_index = [interval_end_index - 1]
+            if interval_end_index == next_step_index and keep_index[-1] < next_step_index - 1:
+                keep_index = np.append(keep_index, next_step_index - 1)
+            keep_indices.append(keep_index)
+            last_index = keep_index[-1]
+            j += 1
+
+    return np.unique(np.concatenate(keep_indices)).astype(int)
+
+
+def reference_step_times2index(times, step_times):
+    # First sample at or after each step time, by exhaustive search
+    def pos_delta(x, x0):
+        return np.where(x >= x0, x - x0, np.inf)
+    return np.array([np.argmin(pos_delta(times, st)) for st in step_times])
+
+
+def random_decimation_args(rng):
+    num_samples = int(rng.integers(5, 3000))
+    step_index = np.unique(rng.integers(1, num_samples, int(rng.integers(1, 8))))
+    init_samples = None if rng.random() < 0.5 else int(rng.integers(2, 30))
+    decimation_interval = int(rng.integers(1, 40))
+    decimation_factor = float(rng.choice([1.3, 1.5, 2.0, 3.0]))
+    max_t_sample = None if rng.random() < 0.5 else float(rng.choice([0.02, 0.05, 0.3]))
+    times = np.arange(num_samples) * 0.01
+    return times, step_index, 0.01, init_samples, decimation_interval, decimation_factor, max_t_sample
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_get_decimation_index_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(100):
+        args = random_decimation_args(rng)
+        expected = reference_decimation_index(*args)
+        np.testing.assert_array_equal(sampling.get_decimation_index(*args, use_jit=False), expected)
+        assert sampling.count_decimation_index(*args) == len(expected)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_step_times2index_matches_reference(seed):
+    rng = np.random.default_rng(seed)
+    # Repeated sample times produce ties
+    times = np.round(np.sort(rng.uniform(0, 10, 500)), 1)
+    step_times = np.concatenate([rng.uniform(-1, 9.9, 20), times[rng.integers(0, 500, 10)]])
+
+    np.testing.assert_array_equal(sampling.step_times2index(times, step_times),
+                                  reference_step_times2index(times, step_times))
+
+    shuffled = rng.permutation(times)
+    np.testing.assert_array_equal(sampling.step_times2index(shuffled, step_times),
+                                  reference_step_times2index(shuffled, step_times))
+
+
+def make_chrono_data(rng, num_samples=20000, num_steps=5):
+    # Stepped current with relaxing voltage response and sparse outliers
+    times = np.arange(num_samples) * 1e-3
+    step_index = np.linspace(0, num_samples, num_steps + 2).astype(int)[1:-1]
+    levels = rng.normal(0, 1e-3, num_steps + 1)
+    i_signal = np.repeat(levels, np.diff(np.concatenate(([0], step_index, [num_samples]))))
+    v_signal = 0.1 + i_signal + rng.normal(0, 1e-6, num_samples)
+    for k in step_index:
+        v_signal[k:] += 0.5 * (i_signal[k] - i_signal[k - 1]) * (1 - np.exp(-(times[k:] - times[k]) / 0.3))
+    outliers = rng.choice(num_samples, num_samples // 1000, replace=False)
+    v_signal[outliers] += rng.normal(0, 1e-3, len(outliers))
+    return times, step_index, [i_signal, v_signal]
+
+
+def reference_filter_chrono_signals(times, signals, step_index, decimate_index, remove_outliers, median_prefilter,
+                                    **kw):
+    # Two separate filter passes over each signal
+    bounds = sampling._step_bounds(len(times), step_index)
+    sigmas = sampling._chrono_filter_sigmas(times, bounds, step_index, decimate_index, 0.01, None, False)
+
+    def filter_steps(y, median):
+        out = np.empty_like(y)
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            y_step = ndimage.median_filter(y[start:end], size=3, mode='nearest') if median else y[start:end]
+            out[start:end] = nonuniform_gaussian_filter1d(y_step, sigmas[start:end], **kw)
+        return out
+
+    signals_out = []
+    for y in signals:
+        y = np.array(y, dtype=float)
+        if remove_outliers:
+            y_filt = filter_steps(y, True)
+            flags = sampling.flag_outliers(y, y_filt)
+            y[flags] = y_filt[flags]
+        signals_out.append(filter_steps(y, median_prefilter))
+    return signals_out
+
+
+@pytest.mark.parametrize("remove_outliers", [False, True])
+@pytest.mark.parametrize("median_prefilter", [False, True])
+def test_filter_chrono_signals_matches_two_pass(remove_outliers, median_prefilter):
+    rng = np.random.default_rng(0)
+    times, step_index, signals = make_chrono_data(rng)
+    decimate_index = sampling.get_decimation_index(times, step_index, 1e-3, 10, 10, 2.0, None)
+
+    result = sampling.filter_chrono_signals(times, signals, step_index, decimate_index,
+                                            remove_outliers=remove_outliers, median_prefilter=median_prefilter,
+                                            method='direct')
+    expected = reference_filter_chrono_signals(times, signals, step_index, decimate_index, remove_outliers,
+                                               median_prefilter, method='direct')
+    for r, e in zip(result, expected):
+        np.testing.assert_allclose(r, e, rtol=0, atol=1e-12 * np.ptp(e))
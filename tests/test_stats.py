@@ -0,0 +1,38 @@
+"""Equivalence tests for the streaming outlier detector and flag_outliers."""
+import numpy as np
+import pytest
+
+from biocom.processing import stats
+from biocom.processing.sampling import flag_outliers
+
+
+def make_outlier_data(rng, num_samples):
+    # Smooth signal with Gaussian noise and well-separated spikes. Noise is clipped such that
+    # no inlier lies near the decision boundary, where sketch approximation error could flip flags
+    y_filt = np.sin(np.linspace(0, 10, num_samples))
+    y_raw = y_filt + np.clip(rng.normal(0, 1e-3, num_samples), -3e-3, 3e-3)
+    outliers = rng.choice(num_samples, max(num_samples // 100, 1), replace=False)
+    y_raw[outliers] += rng.choice([-1, 1], len(outliers)) * rng.uniform(0.05, 0.5, len(outliers))
+    return y_raw, y_filt, outliers
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("num_samples", [200, 5000])
+def test_streaming_detector_matches_flag_outliers(seed, num_samples):
+    rng = np.random.default_rng(seed)
+    y_raw, y_filt, outliers = make_outlier_data(rng, num_samples)
+
+    detector = stats.StreamingOutlierDetector()
+    flags = detector.update(y_raw, y_filt)
+    expected = flag_outliers(y_raw, y_filt)
+
+    np.testing.assert_array_equal(flags, expected)
+    assert np.all(flags[outliers])
+    np.testing.assert_allclose(detector.std, stats.robust_std(y_filt - y_raw), rtol=0.02)
+
+
+def test_streaming_detector_min_samples():
+    rng = np.random.default_rng(0)
+    y_raw, y_filt, _ = make_outlier_data(rng, 10)
+    detector = stats.StreamingOutlierDetector(min_samples=20)
+    assert not np.any(detector.update(y_raw, y_filt))
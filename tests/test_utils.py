@@ -0,0 +1,52 @@
+"""Equivalence tests for nearest_index and its exhaustive-search counterpart."""
+import numpy as np
+import pytest
+
+from biocom import utils
+
+
+def reference_nearest_index(x_array, x_val, constraint=None):
+    # Exhaustive search over all pairs of array and query values
+    if constraint is None:
+        def cfunc(arr, x):
+            return np.abs(arr - x)
+    else:
+        def cfunc(arr, x):
+            out = np.zeros_like(arr) + constraint * (arr - x)
+            out[constraint * arr < constraint * x] = np.inf
+            return out
+
+    arr_mesh, x_mesh = np.meshgrid(x_array, np.atleast_1d(x_val))
+    delta = cfunc(arr_mesh, x_mesh)
+    if np.min(np.min(delta, axis=1)) == np.inf:
+        raise ValueError('No index satisfies constraint')
+    index = np.argmin(delta, axis=1)
+    return index[0] if np.isscalar(x_val) else index
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("constraint", [None, -1, 1])
+@pytest.mark.parametrize("sort", [True, False])
+def test_nearest_index_matches_reference(seed, constraint, sort):
+    rng = np.random.default_rng(seed)
+    # Rounding produces repeated values and exact matches
+    x_array = np.round(rng.uniform(0, 10, 200), 1)
+    if sort:
+        x_array = np.sort(x_array)
+    lo, hi = np.min(x_array), np.max(x_array)
+    x_val = np.concatenate([rng.uniform(lo, hi, 50), x_array[rng.integers(0, 200, 20)],
+                            # Midpoints between grid values are equidistant from two values
+                            np.round(rng.uniform(lo, hi, 20), 1) + 0.05])
+    # Keep all queries within range such that every constraint can be satisfied
+    x_val = np.clip(x_val, lo, hi)
+
+    np.testing.assert_array_equal(utils.nearest_index(x_array, x_val, constraint),
+                                  reference_nearest_index(x_array, x_val, constraint))
+    assert utils.nearest_index(x_array, x_val[0], constraint) \
+        == reference_nearest_index(x_array, x_val[0], constraint)
+
+
+@pytest.mark.parametrize("constraint, x_val", [(-1, -1.0), (1, 10.0)])
+def test_nearest_index_unsatisfiable_constraint(constraint, x_val):
+    with pytest.raises(ValueError):
+        utils.nearest_index(np.arange(10.0), x_val, constraint)